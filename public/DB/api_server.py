@@ -1,15 +1,41 @@
-from fastapi import FastAPI, HTTPException, Response
+from fastapi import FastAPI, HTTPException, Request, Response
+from fastapi.responses import JSONResponse, StreamingResponse, FileResponse, RedirectResponse
 from fastapi.middleware.cors import CORSMiddleware
 import uvicorn
-from db_config import execute_query
-import base64
+import asyncio
+from db_backend import get_dialect
+from db_config import (execute_query_async, run_in_db_executor, get_pool_stats, close_pool,
+                       shutdown_executor, DatabaseBusyError)
+from media import (fetch_media_async, fetch_first_media_async, get_media_info,
+                   iter_media_chunks, media_content_type)
+from query_cache import cached_execute_query_async, get_cache_stats
+from facet_index import get_facet_index
+from search_index import get_search_index, MAX_ID_FILTER
+from pagination import parse_fields, decode_cursor, clamp_page_size, page_envelope
+from thumbnails import (get_or_create_thumbnail_async, thumbnail_content_type, NotAnImageError,
+                        ImageTooLargeError, shutdown_image_executor)
+from sample_ids import ensure_all_sample_id_keys, sample_id_condition
+from spatial_index import get_spatial_index, feature_summary
+from relation_graph import get_relation_graph, MAX_GRAPH_NODES
+from xrf_analytics import get_xrf_store, XRF_STATS, DEFAULT_PERCENTILES
+from similarity_index import get_similarity_index, MAX_SIMILAR_RESULTS
+from http_cache import ConditionalRequestMiddleware, get_http_cache_stats, mark_degraded
+from compression import CompressionMiddleware, get_compression_stats
+from json_response import FastJSONResponse
 import logging
 
 # 配置日志
 logging.basicConfig(level=logging.DEBUG)
 logger = logging.getLogger(__name__)
 
-app = FastAPI()
+# 默认用orjson序列化响应；大列表接口直接返回FastJSONResponse，跳过jsonable_encoder
+app = FastAPI(default_response_class=FastJSONResponse)
+
+# 条件请求（ETag/304）和Cache-Control；先添加的中间件在内层，304响应也会带上CORS头
+app.add_middleware(ConditionalRequestMiddleware)
+
+# 响应压缩（brotli/gzip），在条件请求中间件外层，ETag按编码加后缀
+app.add_middleware(CompressionMiddleware)
 
 # 配置CORS
 app.add_middleware(
@@ -20,31 +46,196 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
+@app.exception_handler(DatabaseBusyError)
+async def database_busy_handler(request: Request, exc: DatabaseBusyError):
+    logger.warning(f"Database busy for {request.url.path}: {str(exc)}")
+    return JSONResponse(status_code=503, content={"detail": str(exc)}, headers={"Retry-After": "1"})
+
+@app.on_event("startup")
+async def prepare_sample_id_keys():
+    # 确保已有数据库中的编号列都有规范化列和索引；失败的表按原编号列查询（见sample_id_condition）
+    try:
+        await run_in_db_executor(ensure_all_sample_id_keys)
+    except Exception as e:
+        logger.error(f"Error preparing sample id keys, lookups fall back to the raw id columns: {str(e)}")
+
+@app.on_event("shutdown")
+async def shutdown_db_pool():
+    shutdown_executor()
+    shutdown_image_executor()
+    close_pool()
+
+@app.get("/api/cache/stats")
+async def get_query_cache_stats():
+    """查询结果缓存命中率统计"""
+    return get_cache_stats()
+
+@app.get("/api/http-cache/stats")
+async def get_conditional_request_stats():
+    """ETag条件请求统计（304命中次数）和响应压缩统计"""
+    return {**get_http_cache_stats(), "compression": get_compression_stats()}
+
+@app.get("/api/db-pool/stats")
+async def get_db_pool_stats():
+    """连接池借出耗时与饱和度计数器"""
+    return get_pool_stats()
+
+def media_url(request: Request, media_id):
+    """多媒体文件的访问地址"""
+    return str(request.url_for("get_media", media_id=media_id))
+
+def parse_range_header(range_header, size):
+    """解析单段Range请求头，返回(start, end)闭区间；无法满足时返回None"""
+    unit, _, spec = range_header.partition("=")
+    if unit.strip().lower() != "bytes" or "," in spec:
+        return None
+    start_text, _, end_text = spec.strip().partition("-")
+    try:
+        if start_text == "":
+            # bytes=-N 表示最后N个字节
+            length = int(end_text)
+            if length <= 0:
+                return None
+            return max(size - length, 0), size - 1
+        start = int(start_text)
+        end = int(end_text) if end_text else size - 1
+    except ValueError:
+        return None
+    if start >= size or start > end:
+        return None
+    return start, min(end, size - 1)
+
+@app.get("/api/media/{media_id}", name="get_media")
+async def get_media(media_id: int, request: Request):
+    """流式返回多媒体文件BLOB，支持ETag和Range请求"""
+    try:
+        info = await run_in_db_executor(get_media_info, media_id)
+        if not info or not info.get('文件大小'):
+            raise HTTPException(status_code=404, detail=f"Media not found: {media_id}")
+        
+        size = info['文件大小']
+        etag = f'"{info["哈希"].lower()}"'
+        headers = {
+            'ETag': etag,
+            'Accept-Ranges': 'bytes',
+            'Cache-Control': 'public, max-age=86400'
+        }
+        
+        if_none_match = request.headers.get('if-none-match')
+        if if_none_match and etag in [t.strip() for t in if_none_match.split(',')]:
+            return Response(status_code=304, headers=headers)
+        
+        content_type = media_content_type(info.get('媒体类型'), info.get('文件名'))
+        start, end = 0, size - 1
+        status_code = 200
+        range_header = request.headers.get('range')
+        # If-Range与ETag不一致时忽略Range，返回完整内容
+        if range_header and request.headers.get('if-range', etag) == etag:
+            byte_range = parse_range_header(range_header, size)
+            if byte_range is None:
+                return Response(status_code=416, headers={**headers, 'Content-Range': f'bytes */{size}'})
+            start, end = byte_range
+            status_code = 206
+            headers['Content-Range'] = f'bytes {start}-{end}/{size}'
+        headers['Content-Length'] = str(end - start + 1)
+        
+        logger.debug(f"Streaming media {media_id} bytes {start}-{end}/{size} as {content_type}")
+        return StreamingResponse(
+            iter_media_chunks(media_id, start, end),
+            status_code=status_code,
+            media_type=content_type,
+            headers=headers
+        )
+    except HTTPException as he:
+        raise he
+    except DatabaseBusyError:
+        raise
+    except Exception as e:
+        logger.error(f"Error in get_media: {str(e)}")
+        raise HTTPException(status_code=500, detail=str(e))
+
+def thumbnail_url(request: Request, media_id):
+    """多媒体文件缩略图的访问地址"""
+    return str(request.url_for("get_media_thumbnail", media_id=media_id))
+
+@app.get("/api/media/{media_id}/thumbnail", name="get_media_thumbnail")
+async def get_media_thumbnail(media_id: int, request: Request):
+    """返回多媒体文件的缩略图，首次访问时生成并缓存到磁盘"""
+    try:
+        try:
+            thumbnail = await get_or_create_thumbnail_async(media_id)
+        except ImageTooLargeError as e:
+            # 原图同样不宜在浏览器中解码，不做重定向
+            raise HTTPException(status_code=415, detail=str(e))
+        except NotAnImageError:
+            # 无法生成缩略图时直接使用原文件
+            return RedirectResponse(media_url(request, media_id))
+        if thumbnail is None:
+            raise HTTPException(status_code=404, detail=f"Media not found: {media_id}")
+        
+        path, key = thumbnail
+        etag = f'"{key}"'
+        headers = {
+            'ETag': etag,
+            'Cache-Control': 'public, max-age=86400'
+        }
+        if_none_match = request.headers.get('if-none-match')
+        if if_none_match and etag in [t.strip() for t in if_none_match.split(',')]:
+            return Response(status_code=304, headers=headers)
+        return FileResponse(path, media_type=thumbnail_content_type(), headers=headers)
+    except HTTPException as he:
+        raise he
+    except DatabaseBusyError:
+        raise
+    except Exception as e:
+        logger.error(f"Error in get_media_thumbnail: {str(e)}")
+        raise HTTPException(status_code=500, detail=str(e))
+
+# 三维模型列表可返回的字段
+MODEL_COLUMNS = ['ID', '地理地名', '文字介绍', '大地坐标X', '大地坐标Y', '盆地', '所处方位', 'URL']
+
 @app.get("/api/3d-models")
-async def get_3d_models():
+async def get_3d_models(limit: int = None, cursor: str = None, fields: str = None):
+    """三维模型列表，分页和字段选择参数与/api/rock-samples相同"""
     try:
         logger.debug("Fetching all 3D models")
-        query = """
-        SELECT 
-            ID,
-            地理地名,
-            文字介绍,
-            大地坐标X,
-            大地坐标Y,
-            盆地,
-            所处方位,
-            URL
-        FROM 三维模型
-        """
-        results = execute_query(query)
+        try:
+            columns = parse_fields(fields, MODEL_COLUMNS)
+            after_id = decode_cursor(cursor) if cursor else None
+        except ValueError as e:
+            raise HTTPException(status_code=400, detail=str(e))
+        select_list = ", ".join(f"[{c}]" for c in columns)
+        
+        if limit is None and cursor is None:
+            query = f"SELECT {select_list} FROM 三维模型"
+            results = await cached_execute_query_async(query, tables=('三维模型',))
+            logger.debug(f"Found {len(results)} 3D models")
+            return FastJSONResponse(results)
+        
+        page_size = clamp_page_size(limit)
+        count_results = await cached_execute_query_async(
+            "SELECT COUNT(*) AS total FROM 三维模型", tables=('三维模型',)
+        )
+        where = ""
+        params = ()
+        if after_id is not None:
+            where = " WHERE [ID] > ?"
+            params = (after_id,)
+        dialect = get_dialect()
+        query = f"SELECT {dialect.top(page_size + 1)}{select_list} FROM 三维模型{where} ORDER BY [ID]{dialect.limit(page_size + 1)}"
+        results = await cached_execute_query_async(query, params, tables=('三维模型',))
         logger.debug(f"Found {len(results)} 3D models")
-        return results
+        return FastJSONResponse(page_envelope(results, page_size, count_results[0]['total']))
+    except HTTPException as he:
+        raise he
+    except DatabaseBusyError:
+        raise
     except Exception as e:
         logger.error(f"Error in get_3d_models: {str(e)}")
         raise HTTPException(status_code=500, detail=str(e))
 
 @app.get("/api/3d-models/{model_id}")
-async def get_3d_model(model_id: int):
+async def get_3d_model(model_id: int, request: Request):
     try:
         logger.debug(f"Fetching 3D model with ID: {model_id}")
         # 获取三维模型数据
@@ -61,7 +252,7 @@ async def get_3d_model(model_id: int):
         FROM 三维模型
         WHERE ID = ?
         """
-        model_results = execute_query(model_query, (model_id,))
+        model_results = await execute_query_async(model_query, (model_id,))
         logger.debug(f"3D model query results: {model_results}")
         
         if not model_results:
@@ -73,20 +264,11 @@ async def get_3d_model(model_id: int):
         logger.debug(f"Found 3D model with 地理地名: {geographic_name}")
         
         # 获取相关的多媒体文件
-        media_query = """
-        SELECT 
-            ID,
-            关联类型,
-            关联id,
-            媒体类型,
-            文件名,
-            文件,
-            url
-        FROM 多媒体文件
-        WHERE 关联id = ?
-        """
         logger.debug(f"Executing media query with 地理地名: {geographic_name}")
-        media_results = execute_query(media_query, (geographic_name,))
+        media_map = await fetch_media_async(
+            [geographic_name], columns=('ID', '关联类型', '关联id', '媒体类型', '文件名', '文件大小', 'url')
+        )
+        media_results = media_map.get(str(geographic_name), [])
         logger.debug(f"Media query found {len(media_results)} results")
         
         # 处理多媒体文件数据
@@ -109,26 +291,22 @@ async def get_3d_model(model_id: int):
                     if not media_info['url'].startswith('/'):
                         media_info['url'] = '/' + media_info['url']
                     logger.debug(f"Processed video URL: {media_info['url']}")
-                elif media.get('文件'):
-                    logger.debug("Found video BLOB data")
-                    # 这里可以处理二进制视频数据如果需要
+                elif media.get('文件大小'):
+                    # 视频存储为BLOB时通过媒体接口流式播放
+                    media_info['url'] = media_url(request, media['ID'])
+                    logger.debug(f"Found video BLOB data, serving from {media_info['url']}")
             
-            # 如果是图片类型，转换二进制数据为base64
-            elif media_info['type'] in ['png', 'jpg', 'jpeg'] and media.get('文件'):
-                binary_data = media['文件']
-                if isinstance(binary_data, memoryview):
-                    binary_data = binary_data.tobytes()
-                base64_data = base64.b64encode(binary_data).decode('utf-8')
-                media_info['data'] = f"data:image/{media_info['type']};base64,{base64_data}"
-                logger.debug(f"Processed image data for ID: {media_info['id']}")
+            # 如果是图片类型，返回媒体接口地址
+            elif media_info['type'] in ['png', 'jpg', 'jpeg'] and media.get('文件大小'):
+                media_info['url'] = media_url(request, media['ID'])
+                logger.debug(f"Processed image URL for ID: {media_info['id']}")
             
             media_files.append(media_info)
         
         logger.debug(f"Final processed media files: {[{
             'id': m['id'],
             'type': m['type'],
-            'url': m.get('url'),
-            'hasData': 'data' in m
+            'url': m.get('url')
         } for m in media_files]}")
         
         # 将多媒体数据添加到返回结果中
@@ -138,32 +316,26 @@ async def get_3d_model(model_id: int):
             
     except HTTPException as he:
         raise he
+    except DatabaseBusyError:
+        raise
     except Exception as e:
         logger.error(f"Unexpected error in get_3d_model: {str(e)}")
         raise HTTPException(status_code=500, detail=f"Unexpected server error: {str(e)}")
 
+async def get_fresh_relation_graph():
+    """获取关联图，表版本变化后先在后台线程中重建"""
+    graph = get_relation_graph()
+    if graph.is_stale():
+        await run_in_db_executor(graph.refresh)
+    return graph
+
 @app.get("/api/relations/{entity_id}")
 async def get_relations(entity_id: str):
     try:
         logger.debug(f"Fetching relations for entity_id: {entity_id}")
-        # 首先查询关联关系
-        query = """
-        SELECT 
-            关联关系.ID,
-            关联关系.关联类型,
-            关联关系.关联实体ID1,
-            关联关系.关联实体ID2,
-            关联关系.关联程度,
-            关联关系.文件,
-            岩石样品1.名称 AS 实体1名称,
-            岩石样品2.名称 AS 实体2名称
-        FROM 关联关系
-        LEFT JOIN 岩石样品 AS 岩石样品1 ON 关联关系.关联实体ID1 = 岩石样品1.编号
-        LEFT JOIN 岩石样品 AS 岩石样品2 ON 关联关系.关联实体ID2 = 岩石样品2.编号
-        WHERE 关联实体ID1 = ? OR 关联实体ID2 = ?
-        ORDER BY 关联程度 DESC
-        """
-        results = execute_query(query, (entity_id, entity_id))
+        # 直接关联从内存关联图中读取，关联关系或岩石样品表变化后重建
+        graph = await get_fresh_relation_graph()
+        results = graph.relations(entity_id)
         logger.debug(f"Found {len(results)} relations")
         
         # 处理文件路径，添加url字段
@@ -174,16 +346,19 @@ async def get_relations(entity_id: str):
                 result['url'] = None
                 
         return results
+    except DatabaseBusyError:
+        raise
     except Exception as e:
         logger.error(f"Error in get_relations: {str(e)}")
         raise HTTPException(status_code=500, detail=str(e))
 
 @app.get("/api/rock-sample/{sample_id}")
-async def get_rock_sample_details(sample_id: str):
+async def get_rock_sample_details(sample_id: str, request: Request):
     try:
         logger.debug(f"Fetching rock sample details for sample_id: {sample_id}")
-        # 查询岩石样品基本信息
-        sample_query = """
+        # 查询岩石样品基本信息（按规范化编号列索引查找）
+        condition, params = sample_id_condition("岩石样品", "编号", sample_id)
+        sample_query = f"""
         SELECT 
             编号,
             名称,
@@ -195,11 +370,13 @@ async def get_rock_sample_details(sample_id: str):
             采样位置,
             采样时间
         FROM 岩石样品
-        WHERE 编号 = ?
+        WHERE {condition}
         """
         try:
-            sample_results = execute_query(sample_query, (sample_id,))
+            sample_results = await execute_query_async(sample_query, params)
             logger.debug(f"Sample query executed. Results: {sample_results}")
+        except DatabaseBusyError:
+            raise
         except Exception as e:
             logger.error(f"Error executing sample query: {str(e)}")
             raise HTTPException(status_code=500, detail=f"Database error in sample query: {str(e)}")
@@ -212,38 +389,26 @@ async def get_rock_sample_details(sample_id: str):
         logger.debug(f"Sample info retrieved: {sample_info}")
         
         # 查询相关的多媒体文件
-        media_query = """
-        SELECT 
-            ID,
-            文件,
-            文件类型,  -- 添加文件类型字段
-            描述      -- 添加描述字段
-        FROM 多媒体文件
-        WHERE 关联id = ? AND 关联类型 = '岩石样品'
-        """
         try:
-            media_results = execute_query(media_query, (sample_id,))
+            media_map = await fetch_media_async([sample_id], '岩石样品', ('ID', '文件大小', '文件类型', '描述'))
+            media_results = media_map.get(str(sample_id), [])
             logger.debug(f"Media query executed. Found {len(media_results)} results")
             
-            # 处理二进制图片数据
+            # 图片通过媒体接口获取
             media_files = []
             for media in media_results:
                 try:
-                    if media.get('文件'):
-                        # 将二进制数据转换为base64字符串
-                        binary_data = media['文件']
-                        if isinstance(binary_data, memoryview):
-                            binary_data = binary_data.tobytes()
-                        base64_data = base64.b64encode(binary_data).decode('utf-8')
+                    if media.get('文件大小'):
                         media_files.append({
                             'id': media['ID'],
-                            'data': f"data:image/png;base64,{base64_data}",
+                            'url': media_url(request, media['ID']),
                             'type': media.get('文件类型'),
                             'description': media.get('描述')
                         })
                         logger.debug(f"Successfully processed media file ID: {media['ID']}")
                 except Exception as e:
                     logger.error(f"Error processing media file {media.get('ID', 'unknown')}: {str(e)}")
+                    mark_degraded(request)
                     continue
             
             # 组合返回数据
@@ -254,9 +419,12 @@ async def get_rock_sample_details(sample_id: str):
             logger.debug(f"Returning response data with {len(media_files)} media files")
             
             return response_data
+        except DatabaseBusyError:
+            raise
         except Exception as e:
             logger.error(f"Error executing media query: {str(e)}")
-            # 如果多媒体查询失败，我们仍然返回基本信息
+            # 如果多媒体查询失败，我们仍然返回基本信息，但该结果不能被缓存
+            mark_degraded(request)
             return {
                 **sample_info,
                 'media_files': []
@@ -264,16 +432,19 @@ async def get_rock_sample_details(sample_id: str):
     except HTTPException as he:
         # 重新抛出HTTP异常
         raise he
+    except DatabaseBusyError:
+        raise
     except Exception as e:
         logger.error(f"Unexpected error in get_rock_sample_details: {str(e)}")
         raise HTTPException(status_code=500, detail=f"Unexpected server error: {str(e)}")
 
 @app.get("/api/thin-section/{sample_id}")
-async def get_thin_section_details(sample_id: str):
+async def get_thin_section_details(sample_id: str, request: Request):
     try:
         logger.debug(f"Fetching thin section details for sample_id: {sample_id}")
-        # 查询薄片鉴定报告基本信息
-        report_query = """
+        # 查询薄片鉴定报告基本信息（按规范化编号列索引查找）
+        condition, params = sample_id_condition("薄片鉴定报告", "编号", sample_id)
+        report_query = f"""
         SELECT 
             编号,
             岩类,
@@ -291,9 +462,9 @@ async def get_thin_section_details(sample_id: str):
             长石含量,
             石英含量
         FROM 薄片鉴定报告
-        WHERE 编号 = ?
+        WHERE {condition}
         """
-        report_results = execute_query(report_query, (sample_id,))
+        report_results = await execute_query_async(report_query, params)
         logger.debug(f"Report query results: {report_results}")
         
         if not report_results:
@@ -303,34 +474,24 @@ async def get_thin_section_details(sample_id: str):
         report_info = report_results[0]
         
         # 查询相关的多媒体文件
-        media_query = """
-        SELECT 
-            ID,
-            文件
-        FROM 多媒体文件
-        WHERE 关联id = ? AND 关联类型 = '薄片鉴定报告'
-        """
         try:
-            media_results = execute_query(media_query, (sample_id,))
+            media_map = await fetch_media_async([sample_id], '薄片鉴定报告', ('ID', '文件大小'))
+            media_results = media_map.get(str(sample_id), [])
             logger.debug(f"Media query executed. Found {len(media_results)} results")
             
-            # 处理二进制图片数据
+            # 图片通过媒体接口获取
             media_files = []
             for media in media_results:
                 try:
-                    if media.get('文件'):
-                        # 将二进制数据转换为base64字符串
-                        binary_data = media['文件']
-                        if isinstance(binary_data, memoryview):
-                            binary_data = binary_data.tobytes()
-                        base64_data = base64.b64encode(binary_data).decode('utf-8')
+                    if media.get('文件大小'):
                         media_files.append({
                             'id': media['ID'],
-                            'data': f"data:image/png;base64,{base64_data}"
+                            'url': media_url(request, media['ID'])
                         })
                         logger.debug(f"Successfully processed media file ID: {media['ID']}")
                 except Exception as e:
                     logger.error(f"Error processing media file {media.get('ID', 'unknown')}: {str(e)}")
+                    mark_degraded(request)
                     continue
             
             # 组合返回数据
@@ -341,9 +502,12 @@ async def get_thin_section_details(sample_id: str):
             logger.debug(f"Returning response data with {len(media_files)} media files")
             
             return response_data
+        except DatabaseBusyError:
+            raise
         except Exception as e:
             logger.error(f"Error executing media query: {str(e)}")
-            # 如果多媒体查询失败，我们仍然返回基本信息
+            # 如果多媒体查询失败，我们仍然返回基本信息，但该结果不能被缓存
+            mark_degraded(request)
             return {
                 **report_info,
                 'media_files': []
@@ -351,6 +515,8 @@ async def get_thin_section_details(sample_id: str):
             
     except HTTPException as he:
         raise he
+    except DatabaseBusyError:
+        raise
     except Exception as e:
         logger.error(f"Unexpected error in get_thin_section_details: {str(e)}")
         raise HTTPException(status_code=500, detail=f"Unexpected server error: {str(e)}")
@@ -359,11 +525,9 @@ async def get_thin_section_details(sample_id: str):
 async def get_xrf_test_results(sample_id: str):
     try:
         logger.debug(f"Fetching XRF test results for sample_id: {sample_id}")
-        # 移除输入sample_id中的空格，并构建两个可能的查询值
-        sample_id_no_space = sample_id.replace(" ", "")
-        sample_id_with_space = " ".join(sample_id_no_space[i:i+1] for i in range(len(sample_id_no_space)))
-        
-        query = """
+        # 编号中的空格、大小写差异由规范化编号列统一处理，一次索引查找即可
+        condition, params = sample_id_condition("XRF测试结果", "编号", sample_id)
+        query = f"""
         SELECT 
             层位,
             野外定名,
@@ -375,29 +539,10 @@ async def get_xrf_test_results(sample_id: str):
             Fe,
             Ba
         FROM XRF测试结果
-        WHERE 编号 = ? OR 编号 = ?
+        WHERE {condition}
         """
-        results = execute_query(query, (sample_id, sample_id_with_space))
+        results = await execute_query_async(query, params)
         logger.debug(f"XRF query results: {results}")
-        
-        if not results:
-            # 如果还是没有结果，尝试用不带空格的版本再查一次
-            query = """
-            SELECT 
-                层位,
-                野外定名,
-                Si,
-                Mg,
-                Al,
-                K,
-                Ca,
-                Fe,
-                Ba
-            FROM XRF测试结果
-            WHERE REPLACE(编号, ' ', '') = ?
-            """
-            results = execute_query(query, (sample_id_no_space,))
-            logger.debug(f"XRF query results with no space: {results}")
             
         if not results:
             logger.warning(f"No XRF test results found for ID: {sample_id}")
@@ -407,59 +552,318 @@ async def get_xrf_test_results(sample_id: str):
         
     except HTTPException as he:
         raise he
+    except DatabaseBusyError:
+        raise
     except Exception as e:
         logger.error(f"Unexpected error in get_xrf_test_results: {str(e)}")
         raise HTTPException(status_code=500, detail=f"Unexpected server error: {str(e)}")
 
+@app.get("/api/relation-graph/path")
+async def get_relation_path(source: str, target: str, max_depth: int = 6, strongest: bool = False):
+    """两个实体之间的最短关联路径；strongest=true时选择整体关联最强的路径"""
+    try:
+        graph = await get_fresh_relation_graph()
+        path = graph.shortest_path(source, target, max(1, min(max_depth, 12)), strongest)
+        if path is None:
+            raise HTTPException(status_code=404, detail=f"No relation path between {source} and {target}")
+        return path
+    except HTTPException:
+        raise
+    except DatabaseBusyError:
+        raise
+    except Exception as e:
+        logger.error(f"Error in get_relation_path: {str(e)}")
+        raise HTTPException(status_code=500, detail=str(e))
+
+@app.get("/api/relation-graph/top")
+async def get_top_relations(n: int = 10, entity_id: str = None, relation_type: str = None):
+    """关联程度最高的n条关联，指定entity_id时只看该实体的关联"""
+    try:
+        graph = await get_fresh_relation_graph()
+        return graph.top(max(1, min(n, 1000)), entity_id, relation_type)
+    except DatabaseBusyError:
+        raise
+    except Exception as e:
+        logger.error(f"Error in get_top_relations: {str(e)}")
+        raise HTTPException(status_code=500, detail=str(e))
+
+@app.get("/api/relation-graph/{entity_id}")
+async def get_relation_neighborhood(
+    entity_id: str,
+    depth: int = 2,
+    max_nodes: int = 500,
+    per_node: int = None,
+    min_strength: float = None,
+    relation_type: str = None
+):
+    """实体的多跳关联邻域，一次请求返回depth跳以内的所有节点和边"""
+    try:
+        graph = await get_fresh_relation_graph()
+        result = graph.neighborhood(
+            entity_id,
+            depth=max(1, min(depth, 6)),
+            max_nodes=max(1, min(max_nodes, MAX_GRAPH_NODES)),
+            per_node=per_node,
+            min_strength=min_strength,
+            relation_type=relation_type
+        )
+        if result is None:
+            raise HTTPException(status_code=404, detail=f"Entity has no relations: {entity_id}")
+        return result
+    except HTTPException:
+        raise
+    except DatabaseBusyError:
+        raise
+    except Exception as e:
+        logger.error(f"Error in get_relation_neighborhood: {str(e)}")
+        raise HTTPException(status_code=500, detail=str(e))
+
+# 标本汇总接口的各部分：名称 -> 获取函数(sample_id, request)
+SPECIMEN_SECTIONS = {
+    "sample": lambda sample_id, request: get_rock_sample_details(sample_id, request),
+    "thin_section": lambda sample_id, request: get_thin_section_details(sample_id, request),
+    "xrf": lambda sample_id, request: get_xrf_test_results(sample_id),
+    "relations": lambda sample_id, request: get_relations(sample_id)
+}
+
+def section_result(outcome):
+    """将单个部分的结果或异常转换为 {status, data, detail}"""
+    if isinstance(outcome, HTTPException):
+        status = "not_found" if outcome.status_code == 404 else "error"
+        return {"status": status, "data": None, "detail": outcome.detail}
+    if isinstance(outcome, DatabaseBusyError):
+        return {"status": "busy", "data": None, "detail": str(outcome)}
+    if isinstance(outcome, Exception):
+        return {"status": "error", "data": None, "detail": str(outcome)}
+    return {"status": "ok", "data": outcome, "detail": None}
+
+@app.get("/api/specimen/{sample_id}")
+async def get_specimen_bundle(sample_id: str, request: Request, sections: str = None):
+    """一次返回样品基本信息、薄片鉴定、XRF测试和关联关系，各部分在连接池上并发查询
+
+    某一部分缺失或出错时只影响该部分的status，不影响整个响应；有部分繁忙或出错时整个响应不缓存
+    """
+    try:
+        names = parse_fields(sections, SPECIMEN_SECTIONS, required=())
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    logger.debug(f"Fetching specimen bundle for sample_id: {sample_id}, sections: {names}")
+    outcomes = await asyncio.gather(
+        *(SPECIMEN_SECTIONS[name](sample_id, request) for name in names),
+        return_exceptions=True
+    )
+    results = {name: section_result(outcome) for name, outcome in zip(names, outcomes)}
+    for name, result in results.items():
+        if result["status"] not in ("ok", "not_found"):
+            logger.error(f"Error in specimen bundle section {name}: {result['detail']}")
+            mark_degraded(request)
+    if results and all(r["status"] == "not_found" for r in results.values()):
+        raise HTTPException(status_code=404, detail=f"Specimen not found: {sample_id}")
+    return {"id": sample_id, "sections": results}
+
+# 范围查询单次返回的最大要素数
+MAX_BBOX_RESULTS = 5000
+
+async def get_fresh_spatial_index():
+    """获取空间索引，几何文件重新导出后先在后台线程中重建"""
+    index = get_spatial_index()
+    if index.is_stale():
+        await run_in_db_executor(index.refresh)
+    return index
+
+def parse_bbox(bbox):
+    """解析 minx,miny,maxx,maxy 形式的范围参数"""
+    try:
+        values = [float(v) for v in bbox.split(",")]
+    except ValueError:
+        values = []
+    if len(values) != 4 or values[0] > values[2] or values[1] > values[3]:
+        raise HTTPException(status_code=400, detail=f"Invalid bbox: {bbox}, expected minx,miny,maxx,maxy")
+    return values
+
+@app.get("/api/specimens/bbox")
+async def get_specimens_in_bbox(bbox: str, limit: int = 1000, geometry: bool = False):
+    """外包矩形与视野范围相交的标本（用于按相机视野加载）"""
+    try:
+        box = parse_bbox(bbox)
+        index = await get_fresh_spatial_index()
+        limit = max(1, min(limit, MAX_BBOX_RESULTS))
+        entries, truncated = index.query_bbox(box, limit)
+        return {
+            "items": [feature_summary(entry, geometry) for entry in entries],
+            "count": len(entries),
+            "truncated": truncated
+        }
+    except HTTPException:
+        raise
+    except DatabaseBusyError:
+        raise
+    except Exception as e:
+        logger.error(f"Error in get_specimens_in_bbox: {str(e)}")
+        raise HTTPException(status_code=500, detail=str(e))
+
+@app.get("/api/specimens/nearest")
+async def get_nearest_specimens(lon: float, lat: float, k: int = 5, max_distance: float = None, geometry: bool = False):
+    """距离某点最近的k个标本，distance为到多边形边界的近似米数（点在多边形内时为0）"""
+    try:
+        index = await get_fresh_spatial_index()
+        results = index.nearest(lon, lat, max(1, min(k, 100)), max_distance)
+        return [{**feature_summary(entry, geometry), "distance": distance} for distance, entry in results]
+    except DatabaseBusyError:
+        raise
+    except Exception as e:
+        logger.error(f"Error in get_nearest_specimens: {str(e)}")
+        raise HTTPException(status_code=500, detail=str(e))
+
+@app.get("/api/specimens/at")
+async def pick_specimens(lon: float, lat: float, geometry: bool = False):
+    """点选：包含该点的标本多边形"""
+    try:
+        index = await get_fresh_spatial_index()
+        return [feature_summary(entry, geometry) for entry in index.pick(lon, lat)]
+    except DatabaseBusyError:
+        raise
+    except Exception as e:
+        logger.error(f"Error in pick_specimens: {str(e)}")
+        raise HTTPException(status_code=500, detail=str(e))
+
+async def get_fresh_xrf_store():
+    """获取XRF列式存储，XRF测试结果表变化后先在后台线程中重建"""
+    store = get_xrf_store()
+    if store.is_stale():
+        await run_in_db_executor(store.refresh)
+    return store
+
+def split_param(value):
+    """逗号分隔的请求参数转为列表，None表示未指定"""
+    return [v.strip() for v in value.split(",") if v.strip()] if value else None
+
+@app.get("/api/xrf/aggregate")
+async def get_xrf_aggregate(group_by: str = "层位", elements: str = None, stats: str = None):
+    """按层位或野外定名分组的元素统计（count/mean/std/min/max/median）"""
+    try:
+        store = await get_fresh_xrf_store()
+        return store.group_stats(group_by, split_param(elements), split_param(stats) or XRF_STATS)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    except DatabaseBusyError:
+        raise
+    except Exception as e:
+        logger.error(f"Error in get_xrf_aggregate: {str(e)}")
+        raise HTTPException(status_code=500, detail=str(e))
+
+@app.get("/api/xrf/histogram")
+async def get_xrf_histogram(element: str, bins: int = 20, low: float = None, high: float = None,
+                            group_by: str = None, group: str = None):
+    """单个元素的直方图，low/high指定取值范围（默认为数据范围），可按某一分组取值筛选"""
+    try:
+        if (low is None) != (high is None) or (low is not None and low >= high):
+            raise ValueError("low and high must be given together with low < high")
+        store = await get_fresh_xrf_store()
+        value_range = (low, high) if low is not None else None
+        return store.histogram(element, max(1, min(bins, 500)), value_range, group_by, group)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    except DatabaseBusyError:
+        raise
+    except Exception as e:
+        logger.error(f"Error in get_xrf_histogram: {str(e)}")
+        raise HTTPException(status_code=500, detail=str(e))
+
+@app.get("/api/xrf/percentiles")
+async def get_xrf_percentiles(element: str, q: str = None, group_by: str = None):
+    """单个元素的百分位数，指定group_by时同时返回各组的百分位数"""
+    try:
+        store = await get_fresh_xrf_store()
+        percentiles = [float(p) for p in split_param(q)] if q else DEFAULT_PERCENTILES
+        return store.percentiles(element, percentiles, group_by)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    except DatabaseBusyError:
+        raise
+    except Exception as e:
+        logger.error(f"Error in get_xrf_percentiles: {str(e)}")
+        raise HTTPException(status_code=500, detail=str(e))
+
+@app.get("/api/xrf/correlation")
+async def get_xrf_correlation(elements: str = None, method: str = "pearson", group_by: str = None, group: str = None):
+    """元素间的相关系数矩阵（pearson或spearman），可按某一分组取值筛选"""
+    try:
+        store = await get_fresh_xrf_store()
+        return store.correlation(split_param(elements), method, group_by, group)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    except DatabaseBusyError:
+        raise
+    except Exception as e:
+        logger.error(f"Error in get_xrf_correlation: {str(e)}")
+        raise HTTPException(status_code=500, detail=str(e))
+
+async def get_fresh_similarity_index(features):
+    """获取相似检索索引，来源表变化后先在后台线程中重建"""
+    index = get_similarity_index(features)
+    if index.is_stale():
+        await run_in_db_executor(index.refresh)
+    return index
+
+@app.get("/api/similar/{sample_id}")
+async def get_similar_samples(sample_id: str, k: int = 10, features: str = "xrf", metric: str = "euclidean"):
+    """成分最相似的k个样品：features为xrf（XRF元素含量）或thin_section（石英/长石/岩屑含量），
+    metric为euclidean（标准化后的欧氏距离）或cosine"""
+    try:
+        index = await get_fresh_similarity_index(features)
+        result = index.similar(sample_id, max(1, min(k, MAX_SIMILAR_RESULTS)), metric)
+        if result is None:
+            raise HTTPException(status_code=404, detail=f"No {features} data for sample: {sample_id}")
+        return result
+    except HTTPException as he:
+        raise he
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    except DatabaseBusyError:
+        raise
+    except Exception as e:
+        logger.error(f"Error in get_similar_samples: {str(e)}")
+        raise HTTPException(status_code=500, detail=str(e))
+
 @app.get("/api/rock-samples/filters")
-async def get_rock_sample_filters():
+async def get_rock_sample_filters(
+    counts: bool = False,
+    基本名称: str = None,
+    岩石类别: str = None,
+    颜色: str = None,
+    主要成分: str = None,
+    粒度: str = None,
+    特殊结构: str = None,
+    特殊矿物: str = None,
+    系: str = None,
+    组段: str = None
+):
     try:
         logger.debug("Fetching filter options for rock samples")
         
-        # 获取所有可能的选项
-        filters = {}
+        # 分面索引在内存中，只有岩石标本表变化后才需要重新查询数据库
+        index = get_facet_index()
+        if index.is_stale():
+            await run_in_db_executor(index.refresh)
         
-        try:
-            # 获取岩石类别选项
-            query = "SELECT DISTINCT [岩石类别] FROM [岩石标本] WHERE [岩石类别] IS NOT NULL"
-            results = execute_query(query)
-            logger.debug(f"岩石类别 query results: {results}")
-            filters['岩石类别'] = [r['岩石类别'] for r in results]
-            
-            # 获取颜色选项
-            query = "SELECT DISTINCT [颜色] FROM [岩石标本] WHERE [颜色] IS NOT NULL"
-            results = execute_query(query)
-            logger.debug(f"颜色 query results: {results}")
-            filters['颜色'] = [r['颜色'] for r in results]
-            
-            # 获取粒度选项
-            query = "SELECT DISTINCT [粒度（主要）] FROM [岩石标本] WHERE [粒度（主要）] IS NOT NULL"
-            results = execute_query(query)
-            logger.debug(f"粒度 query results: {results}")
-            filters['粒度'] = [r['粒度（主要）'] for r in results]
-            
-            # 获取特殊结构选项
-            query = "SELECT DISTINCT [特殊结构] FROM [岩石标本] WHERE [特殊结构] IS NOT NULL"
-            results = execute_query(query)
-            logger.debug(f"特殊结构 query results: {results}")
-            filters['特殊结构'] = [r['特殊结构'] for r in results]
-            
-            # 获取特殊矿物选项
-            query = "SELECT DISTINCT [特殊矿物] FROM [岩石标本] WHERE [特殊矿物] IS NOT NULL"
-            results = execute_query(query)
-            logger.debug(f"特殊矿物 query results: {results}")
-            filters['特殊矿物'] = [r['特殊矿物'] for r in results]
-            
-            logger.debug(f"Successfully fetched all filter options: {filters}")
-            return filters
-            
-        except Exception as query_error:
-            logger.error(f"Database query error: {str(query_error)}")
-            raise HTTPException(
-                status_code=500,
-                detail=f"Database query error: {str(query_error)}"
-            )
+        applied = {
+            '基本名称': 基本名称, '岩石类别': 岩石类别, '颜色': 颜色, '主要成分': 主要成分,
+            '粒度': 粒度, '特殊结构': 特殊结构, '特殊矿物': 特殊矿物, '系': 系, '组段': 组段
+        }
+        facets = index.facets(applied if counts else None)
+        
+        # 各分面的全部取值，与原接口格式保持一致
+        filters = dict(facets['values'])
+        if counts:
+            # 按当前已选筛选条件计算的每个取值的数量
+            filters['counts'] = facets['counts']
+            filters['total'] = facets['total']
+        logger.debug(f"Successfully fetched all filter options: {filters}")
+        return filters
             
+    except DatabaseBusyError:
+        raise
     except Exception as e:
         logger.error(f"Error in get_rock_sample_filters: {str(e)}")
         raise HTTPException(
@@ -467,8 +871,48 @@ async def get_rock_sample_filters():
             detail=f"Failed to fetch filter options: {str(e)}"
         )
 
+@app.get("/api/rock-samples/search")
+async def search_rock_samples(q: str, fields: str = None, limit: int = 20):
+    """岩石标本全文检索，按相关度排序并返回高亮片段
+
+    Args:
+        q: 查询串
+        fields: 逗号分隔的检索字段，默认基本名称、主要成分、特殊结构、特殊矿物
+        limit: 返回结果数上限
+    """
+    try:
+        logger.debug(f"Searching rock samples: q={q}, fields={fields}")
+        index = get_search_index()
+        if index.is_stale():
+            await run_in_db_executor(index.refresh)
+        field_list = [f.strip() for f in fields.split(',') if f.strip()] if fields else None
+        results = index.search(q, field_list, max(1, min(limit, 200)))
+        logger.debug(f"Search returned {len(results)} rock samples")
+        return results
+    except DatabaseBusyError:
+        raise
+    except Exception as e:
+        logger.error(f"Error in search_rock_samples: {str(e)}")
+        raise HTTPException(status_code=500, detail=str(e))
+
+# 岩石标本列表可返回的字段：字段名 -> SELECT表达式
+ROCK_SAMPLE_COLUMNS = {
+    'ID': "[ID]",
+    '系': "[系（与组并非等时对应）] as '系'",
+    '组段': "[组段]",
+    '基本名称': "[基本名称]",
+    '颜色': "[颜色]",
+    '主要成分': "[主要成分]",
+    '粒度': "[粒度（主要）] as '粒度'",
+    '特殊结构': "[特殊结构]",
+    '特殊矿物': "[特殊矿物]",
+    '岩石类别': "[岩石类别]"
+}
+ROCK_SAMPLE_IMAGE_FIELDS = ['imageUrl', 'originalImageUrl']
+
 @app.get("/api/rock-samples")
 async def get_rock_samples(
+    request: Request,
     基本名称: str = None,
     岩石类别: str = None,
     颜色: str = None,
@@ -477,96 +921,154 @@ async def get_rock_samples(
     特殊结构: str = None,
     特殊矿物: str = None,
     系: str = None,
-    组段: str = None
+    组段: str = None,
+    limit: int = None,
+    cursor: str = None,
+    fields: str = None
 ):
+    """岩石标本列表
+
+    不带limit/cursor时返回全部匹配记录的数组（兼容旧前端）；
+    带limit或cursor时按ID做游标分页，返回{items, total, limit, has_more, next_cursor}。
+    fields为逗号分隔的字段列表，只返回需要的列（ID总会返回）。
+    """
     try:
         logger.debug("Fetching rock samples with filters")
         
-        # 构建基础查询
-        query = """
-        SELECT 
-            [ID],
-            [系（与组并非等时对应）] as '系',
-            [组段],
-            [基本名称],
-            [颜色],
-            [主要成分],
-            [粒度（主要）] as '粒度',
-            [特殊结构],
-            [特殊矿物],
-            [岩石类别]
-        FROM [岩石标本]
-        WHERE 1=1
-        """
+        try:
+            columns = parse_fields(fields, list(ROCK_SAMPLE_COLUMNS) + ROCK_SAMPLE_IMAGE_FIELDS)
+            after_id = decode_cursor(cursor) if cursor else None
+        except ValueError as e:
+            raise HTTPException(status_code=400, detail=str(e))
+        paginated = limit is not None or cursor is not None
+        page_size = clamp_page_size(limit) if paginated else None
+        
+        # 构建过滤条件
+        where = " WHERE 1=1"
         
         # 构建参数列表
         params = []
         
+        # 文本包含条件由倒排索引解析为ID集合，避免无法走索引的LIKE '%x%'
+        text_filters = {
+            '基本名称': 基本名称, '主要成分': 主要成分, '特殊结构': 特殊结构, '特殊矿物': 特殊矿物
+        }
+        text_filters = {field: value for field, value in text_filters.items() if value}
+        if text_filters:
+            index = get_search_index()
+            if index.is_stale():
+                await run_in_db_executor(index.refresh)
+            matched_ids = None
+            for field, value in text_filters.items():
+                ids = index.match_ids(field, value)
+                matched_ids = ids if matched_ids is None else matched_ids & ids
+            if not matched_ids:
+                logger.debug("No rock samples match the text filters")
+                return FastJSONResponse(page_envelope([], page_size, 0) if paginated else [])
+            if len(matched_ids) <= MAX_ID_FILTER:
+                where += f" AND [ID] IN ({', '.join('?' for _ in matched_ids)})"
+                params.extend(sorted(matched_ids, key=str))
+                基本名称 = 主要成分 = 特殊结构 = 特殊矿物 = None
+        
         # 动态添加过滤条件
         if 基本名称:
-            query += " AND [基本名称] LIKE ?"
+            where += " AND [基本名称] LIKE ?"
             params.append(f"%{基本名称}%")
         if 岩石类别:
-            query += " AND [岩石类别] = ?"
+            where += " AND [岩石类别] = ?"
             params.append(岩石类别)
         if 颜色:
-            query += " AND [颜色] = ?"
+            where += " AND [颜色] = ?"
             params.append(颜色)
         if 主要成分:
-            query += " AND [主要成分] LIKE ?"
+            where += " AND [主要成分] LIKE ?"
             params.append(f"%{主要成分}%")
         if 粒度:
-            query += " AND [粒度（主要）] = ?"
+            where += " AND [粒度（主要）] = ?"
             params.append(粒度)
         if 特殊结构:
-            query += " AND [特殊结构] LIKE ?"
+            where += " AND [特殊结构] LIKE ?"
             params.append(f"%{特殊结构}%")
         if 特殊矿物:
-            query += " AND [特殊矿物] LIKE ?"
+            where += " AND [特殊矿物] LIKE ?"
             params.append(f"%{特殊矿物}%")
         if 系:
-            query += " AND [系（与组并非等时对应）] = ?"
+            where += " AND [系（与组并非等时对应）] = ?"
             params.append(系)
         if 组段:
-            query += " AND [组段] = ?"
+            where += " AND [组段] = ?"
             params.append(组段)
+        
+        select_list = ", ".join(ROCK_SAMPLE_COLUMNS[c] for c in columns if c in ROCK_SAMPLE_COLUMNS)
+        if paginated:
+            # 总数只随数据导入变化，走查询缓存
+            count_query = f"SELECT COUNT(*) AS total FROM [岩石标本]{where}"
+            count_results = await cached_execute_query_async(count_query, tuple(params), tables=('岩石标本',))
+            total = count_results[0]['total']
+            
+            # 游标分页：按ID顺序取下一页，多取一条判断是否还有后续
+            if after_id is not None:
+                where += " AND [ID] > ?"
+                params.append(after_id)
+            dialect = get_dialect()
+            query = f"SELECT {dialect.top(page_size + 1)}{select_list} FROM [岩石标本]{where} ORDER BY [ID]{dialect.limit(page_size + 1)}"
+        else:
+            query = f"SELECT {select_list} FROM [岩石标本]{where}"
             
         logger.debug(f"Executing query: {query}")
         logger.debug(f"With parameters: {params}")
             
         # 执行查询
-        results = execute_query(query, tuple(params))
+        results = await execute_query_async(query, tuple(params))
         logger.debug(f"Found {len(results)} rock samples")
         
-        # 获取每个岩石样品的图片
-        for result in results:
-            try:
-                # 查询关联的图片
-                media_query = """
-                SELECT TOP 1 [文件]
-                FROM [多媒体文件]
-                WHERE [关联id] = ? AND [关联类型] = '岩石标本'
-                """
-                media_results = execute_query(media_query, (result['ID'],))
-                
-                if media_results and media_results[0].get('文件'):
-                    binary_data = media_results[0]['文件']
-                    if isinstance(binary_data, memoryview):
-                        binary_data = binary_data.tobytes()
-                    base64_data = base64.b64encode(binary_data).decode('utf-8')
-                    # 根据实际图片类型设置MIME类型
-                    result['imageUrl'] = f"data:image/jpeg;base64,{base64_data}"
-                else:
-                    result['imageUrl'] = None
-                    logger.debug(f"No image found for rock ID: {result['ID']}")
-            except Exception as e:
-                logger.error(f"Error processing media for rock {result['ID']}: {str(e)}")
-                result['imageUrl'] = None
+        page = page_envelope(results, page_size, total) if paginated else None
+        if page is not None:
+            results = page['items']
         
-        return results
+        if any(f in columns for f in ROCK_SAMPLE_IMAGE_FIELDS):
+            await attach_rock_sample_images(request, results, columns)
+        
+        return FastJSONResponse(page if page is not None else results)
+    except HTTPException as he:
+        raise he
+    except DatabaseBusyError:
+        raise
     except Exception as e:
         logger.error(f"Error in get_rock_samples: {str(e)}")
         raise HTTPException(status_code=500, detail=str(e))
 
+async def attach_rock_sample_images(request: Request, results, columns):
+    """为岩石标本列表批量附加缩略图和原图地址"""
+    # 一次性批量获取所有岩石样品的第一张图片
+    try:
+        media_map = await fetch_first_media_async([r['ID'] for r in results], '岩石标本', ('ID', '文件大小'))
+    except DatabaseBusyError:
+        raise
+    except Exception as e:
+        logger.error(f"Error fetching media for rock samples: {str(e)}")
+        # 图片查询失败时列表仍然返回，但不带图片的结果不能被缓存
+        mark_degraded(request)
+        media_map = {}
+    logger.debug(f"Found images for {len(media_map)} rock samples")
+    
+    for result in results:
+        image = {'imageUrl': None, 'originalImageUrl': None}
+        try:
+            media = media_map.get(str(result['ID']))
+            
+            if media and media.get('文件大小'):
+                # 列表卡片只需缩略图，原图地址供查看大图使用
+                image['imageUrl'] = thumbnail_url(request, media['ID'])
+                image['originalImageUrl'] = media_url(request, media['ID'])
+            else:
+                logger.debug(f"No image found for rock ID: {result['ID']}")
+        except Exception as e:
+            logger.error(f"Error processing media for rock {result['ID']}: {str(e)}")
+            mark_degraded(request)
+        for field in ROCK_SAMPLE_IMAGE_FIELDS:
+            if field in columns:
+                result[field] = image[field]
+
 if __name__ == "__main__":
     uvicorn.run(app, host="0.0.0.0", port=5000) 
\ No newline at end of file
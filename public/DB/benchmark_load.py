@@ -0,0 +1,79 @@
+import argparse
+import statistics
+import threading
+import time
+import urllib.error
+import urllib.request
+
+# 默认压测的接口（需先启动api_server.py）
+DEFAULT_PATHS = [
+    "/api/3d-models",
+    "/api/rock-samples/filters",
+    "/api/rock-samples",
+]
+
+def run_client(base_url, paths, deadline, latencies, errors, lock):
+    """单个客户端：在截止时间前循环请求各接口"""
+    i = 0
+    while time.monotonic() < deadline:
+        url = base_url + paths[i % len(paths)]
+        i += 1
+        start = time.monotonic()
+        try:
+            with urllib.request.urlopen(url, timeout=30) as response:
+                response.read()
+            elapsed = time.monotonic() - start
+            with lock:
+                latencies.append(elapsed)
+        except (urllib.error.URLError, OSError) as e:
+            with lock:
+                errors.append(str(e))
+
+def run_level(base_url, paths, concurrency, duration):
+    """以指定并发数压测duration秒，返回吞吐量和延迟统计"""
+    latencies = []
+    errors = []
+    lock = threading.Lock()
+    deadline = time.monotonic() + duration
+    threads = [
+        threading.Thread(target=run_client, args=(base_url, paths, deadline, latencies, errors, lock))
+        for _ in range(concurrency)
+    ]
+    start = time.monotonic()
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    elapsed = time.monotonic() - start
+
+    result = {
+        "concurrency": concurrency,
+        "requests": len(latencies),
+        "errors": len(errors),
+        "rps": len(latencies) / elapsed if elapsed else 0.0,
+        "p50_ms": 0.0,
+        "p95_ms": 0.0
+    }
+    if latencies:
+        latencies.sort()
+        result["p50_ms"] = statistics.median(latencies) * 1000
+        result["p95_ms"] = latencies[min(len(latencies) - 1, int(len(latencies) * 0.95))] * 1000
+    return result
+
+def main():
+    """压测api_server，观察吞吐量随并发客户端数的变化"""
+    parser = argparse.ArgumentParser(description="api_server并发负载测试")
+    parser.add_argument("--base-url", default="http://localhost:5000")
+    parser.add_argument("--paths", nargs="+", default=DEFAULT_PATHS)
+    parser.add_argument("--concurrency", nargs="+", type=int, default=[1, 2, 4, 8, 16, 32])
+    parser.add_argument("--duration", type=float, default=10.0, help="每个并发级别的压测秒数")
+    args = parser.parse_args()
+
+    print(f"{'并发':>6} {'请求数':>8} {'错误':>6} {'req/s':>10} {'p50(ms)':>10} {'p95(ms)':>10}")
+    for concurrency in args.concurrency:
+        r = run_level(args.base_url, args.paths, concurrency, args.duration)
+        print(f"{r['concurrency']:>6} {r['requests']:>8} {r['errors']:>6} "
+              f"{r['rps']:>10.1f} {r['p50_ms']:>10.1f} {r['p95_ms']:>10.1f}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,73 @@
+import argparse
+from db_config import execute_query
+from relation_graph import RelationGraph
+from benchmark_utils import timed
+
+# 原/api/relations接口使用的SQL（按层逐个实体查询时的做法）
+SQL_RELATIONS_QUERY = """
+SELECT
+    关联关系.ID,
+    关联关系.关联类型,
+    关联关系.关联实体ID1,
+    关联关系.关联实体ID2,
+    关联关系.关联程度,
+    关联关系.文件,
+    岩石样品1.名称 AS 实体1名称,
+    岩石样品2.名称 AS 实体2名称
+FROM 关联关系
+LEFT JOIN 岩石样品 AS 岩石样品1 ON 关联关系.关联实体ID1 = 岩石样品1.编号
+LEFT JOIN 岩石样品 AS 岩石样品2 ON 关联关系.关联实体ID2 = 岩石样品2.编号
+WHERE 关联实体ID1 = ? OR 关联实体ID2 = ?
+ORDER BY 关联程度 DESC
+"""
+
+def sql_neighborhood(entity_id, depth):
+    """用SQL逐层展开k跳邻域，返回(节点数, 查询次数)"""
+    seen = {entity_id}
+    frontier = [entity_id]
+    queries = 0
+    for _ in range(depth):
+        next_frontier = []
+        for node in frontier:
+            queries += 1
+            for row in execute_query(SQL_RELATIONS_QUERY, (node, node)):
+                for other in (row["关联实体ID1"], row["关联实体ID2"]):
+                    if other and other not in seen:
+                        seen.add(other)
+                        next_frontier.append(other)
+        frontier = next_frontier
+    return len(seen), queries
+
+def main():
+    """对比SQL逐层查询与内存关联图的多跳查询耗时（需能连接数据库）"""
+    parser = argparse.ArgumentParser(description="关联关系查询基准测试：SQL vs 内存关联图")
+    parser.add_argument("entities", nargs="*", help="起始实体编号，默认取关联最多的几个实体")
+    parser.add_argument("--depth", nargs="+", type=int, default=[1, 2, 3])
+    parser.add_argument("--repeat", type=int, default=5)
+    args = parser.parse_args()
+
+    graph = RelationGraph()
+    build_ms, _ = timed(lambda: graph.refresh(force=True), 1)
+    print(f"关联图构建: {build_ms:.1f} ms，{graph.stats()['nodes']} 个节点，{graph.stats()['edges']} 条边")
+
+    entities = args.entities
+    if not entities:
+        entities = graph.busiest(3)
+
+    print(f"{'实体':>12} {'跳数':>4} {'节点数':>6} {'SQL查询次数':>10} {'SQL(ms)':>10} {'图(ms)':>10} {'加速比':>8}")
+    for entity_id in entities:
+        for depth in args.depth:
+            sql_ms, (sql_nodes, queries) = timed(lambda: sql_neighborhood(entity_id, depth), args.repeat)
+            graph_ms, result = timed(lambda: graph.neighborhood(entity_id, depth), args.repeat)
+            nodes = len(result["nodes"]) if result else 0
+            speedup = sql_ms / graph_ms if graph_ms else float("inf")
+            print(f"{entity_id:>12} {depth:>4} {nodes:>6} {queries:>10} {sql_ms:>10.2f} {graph_ms:>10.3f} {speedup:>7.0f}x")
+            if nodes != sql_nodes:
+                print(f"{'':>12} 注意：SQL得到 {sql_nodes} 个节点（SQL按原始编号匹配，图按规范化编号合并）")
+
+    for entity_id in entities[:1]:
+        top_ms, _ = timed(lambda: graph.top(10, entity_id), args.repeat)
+        print(f"Top-10（{entity_id}）: {top_ms:.3f} ms")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,96 @@
+import argparse
+import base64
+import datetime
+import decimal
+import json
+import os
+import random
+from fastapi.encoders import jsonable_encoder
+from compression import ENCODERS
+from json_response import dumps, orjson
+from benchmark_utils import timed
+
+def synthetic_rock_samples(count, seed=0):
+    """模拟/api/rock-samples的行：中文文本字段、Decimal编号和缩略图地址"""
+    rng = random.Random(seed)
+    names = ["细粒长石砂岩", "含砾粗砂岩", "泥质粉砂岩", "鲕粒灰岩", "白云岩", "玄武岩"]
+    colors = ["灰白色", "浅灰色", "紫红色", "灰黑色"]
+    return [{
+        "ID": decimal.Decimal(i),
+        "系": rng.choice(["白垩系", "侏罗系", "三叠系"]),
+        "组段": f"第{rng.randint(1, 9)}段",
+        "基本名称": rng.choice(names),
+        "颜色": rng.choice(colors),
+        "主要成分": "石英、长石、岩屑，" * rng.randint(1, 4),
+        "粒度": rng.choice(["细粒", "中粒", "粗粒"]),
+        "特殊结构": rng.choice([None, "交错层理", "平行层理"]),
+        "特殊矿物": rng.choice([None, "海绿石", "黄铁矿"]),
+        "岩石类别": rng.choice(["沉积岩", "岩浆岩", "变质岩"]),
+        "imageUrl": f"http://localhost:5000/api/media/{i}/thumbnail",
+        "originalImageUrl": f"http://localhost:5000/api/media/{i}"
+    } for i in range(count)]
+
+def synthetic_3d_models(count, seed=0):
+    """模拟/api/3d-models的行：Decimal坐标、长文字介绍，部分记录带内嵌的base64缩略图"""
+    rng = random.Random(seed)
+    return [{
+        "ID": i,
+        "地理地名": f"剖面{i}",
+        "文字介绍": "该剖面出露完整，岩性以砂岩、泥岩互层为主。" * rng.randint(5, 40),
+        "大地坐标X": decimal.Decimal(f"{rng.uniform(100, 120):.8f}"),
+        "大地坐标Y": decimal.Decimal(f"{rng.uniform(20, 45):.8f}"),
+        "盆地": "鄂尔多斯盆地",
+        "所处方位": "东",
+        "URL": base64.b64encode(os.urandom(rng.choice([0, 0, 0, 30000]))).decode("ascii") or "http://localhost/model",
+        "更新时间": datetime.datetime(2024, 1, 1) + datetime.timedelta(minutes=i)
+    } for i in range(count)]
+
+def database_payloads():
+    """按列表接口的查询从数据库读取实际数据"""
+    from db_config import execute_query
+    from api_server import MODEL_COLUMNS, ROCK_SAMPLE_COLUMNS
+    return {
+        "/api/rock-samples": execute_query(f"SELECT {', '.join(ROCK_SAMPLE_COLUMNS.values())} FROM [岩石标本]"),
+        "/api/3d-models": execute_query(f"SELECT {', '.join(f'[{c}]' for c in MODEL_COLUMNS)} FROM 三维模型")
+    }
+
+def default_path(content):
+    """FastAPI默认路径：jsonable_encoder逐个值转换后由JSONResponse调用json.dumps"""
+    return json.dumps(
+        jsonable_encoder(content), ensure_ascii=False, allow_nan=False, indent=None, separators=(",", ":")
+    ).encode("utf-8")
+
+def main():
+    """对比各接口响应在FastAPI默认路径与orjson路径下的序列化耗时，以及gzip/brotli压缩的耗时和体积"""
+    parser = argparse.ArgumentParser(description="接口响应序列化与压缩基准测试")
+    parser.add_argument("--database", action="store_true", help="使用数据库中的实际数据代替模拟数据")
+    parser.add_argument("--rows", type=int, default=5000, help="模拟/api/rock-samples的行数")
+    parser.add_argument("--models", type=int, default=500, help="模拟/api/3d-models的行数")
+    parser.add_argument("--repeat", type=int, default=5)
+    args = parser.parse_args()
+
+    if args.database:
+        payloads = database_payloads()
+    else:
+        payloads = {
+            "/api/rock-samples": synthetic_rock_samples(args.rows),
+            "/api/3d-models": synthetic_3d_models(args.models)
+        }
+
+    print(f"序列化器: {'orjson' if orjson is not None else 'json（未安装orjson）'}，压缩: {', '.join(ENCODERS)}")
+    print(f"{'接口':<20} {'行数':>6} {'默认(ms)':>9} {'快速(ms)':>9} {'加速比':>6} {'JSON字节':>10} "
+          + " ".join(f"{e + '(ms)':>9} {e + '字节':>9}" for e in ENCODERS))
+    for path, content in payloads.items():
+        default_ms, expected = timed(lambda: default_path(content), args.repeat)
+        fast_ms, body = timed(lambda: dumps(content), args.repeat)
+        if json.loads(body) != json.loads(expected):
+            print(f"{path:<20} 注意：两种序列化结果不一致")
+        compressed = []
+        for encoding, encode in ENCODERS.items():
+            encode_ms, data = timed(lambda: encode(body), args.repeat)
+            compressed.append(f"{encode_ms:>9.1f} {len(data):>9}")
+        print(f"{path:<20} {len(content):>6} {default_ms:>9.1f} {fast_ms:>9.1f} {default_ms / fast_ms:>5.1f}x "
+              f"{len(body):>10} " + " ".join(compressed))
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,71 @@
+import argparse
+import math
+import numpy as np
+from sample_ids import normalize_sample_id
+from similarity_index import SimilarityIndex, SIMILARITY_FEATURES
+from benchmark_utils import timed
+
+def synthetic_samples(count, columns, seed=0):
+    """生成count个样品的模拟成分数据：若干岩性簇加噪声，约5%的值缺失"""
+    rng = np.random.default_rng(seed)
+    centers = rng.uniform(0.5, 60.0, size=(12, columns))
+    matrix = centers[rng.integers(0, len(centers), size=count)] * rng.normal(1.0, 0.15, size=(count, columns))
+    matrix[rng.random((count, columns)) < 0.05] = np.nan
+    return [f"S{i:07d}" for i in range(count)], matrix
+
+def python_similar(keys, vectors, sample_key, k):
+    """纯Python逐个样品计算欧氏距离的参照实现，返回最相似的k个规范化编号"""
+    vectors = vectors.tolist()
+    position = keys.index(sample_key)
+    query = vectors[position]
+    distances = []
+    for i, vector in enumerate(vectors):
+        if i != position:
+            distances.append((math.sqrt(sum((a - b) ** 2 for a, b in zip(query, vector))), i))
+    distances.sort()
+    return [keys[i] for _, i in distances[:k]]
+
+def main():
+    """对比纯Python与NumPy批量距离计算的相似样品检索耗时"""
+    parser = argparse.ArgumentParser(description="相似样品检索基准测试")
+    parser.add_argument("--features", choices=list(SIMILARITY_FEATURES), default="xrf")
+    parser.add_argument("--sizes", nargs="+", type=int, default=[1000, 10000, 100000])
+    parser.add_argument("--database", action="store_true", help="使用数据库中的实际数据代替模拟数据")
+    parser.add_argument("-k", type=int, default=10)
+    parser.add_argument("--batch", type=int, default=1000, help="批量检索的样品数")
+    parser.add_argument("--repeat", type=int, default=5)
+    args = parser.parse_args()
+
+    indexes = []
+    if args.database:
+        index = SimilarityIndex(args.features)
+        build_ms, _ = timed(lambda: index.refresh(force=True), 1)
+        indexes.append((index, build_ms))
+    else:
+        for size in args.sizes:
+            index = SimilarityIndex(args.features)
+            sample_ids, matrix = synthetic_samples(size, len(index.columns))
+            build_ms, _ = timed(lambda: index.build(sample_ids, matrix), 1)
+            indexes.append((index, build_ms))
+
+    print(f"{'样品数':>8} {'构建(ms)':>10} {'Python(ms)':>11} {'单次(ms)':>9} {'cosine(ms)':>11} "
+          f"{'批量' + str(args.batch) + '(ms)':>12} {'每次(ms)':>9} {'一致':>4}")
+    for index, build_ms in indexes:
+        if index.samples < 2:
+            print(f"{index.samples:>8} 样品数不足，跳过")
+            continue
+        keys, vectors = index.vectors()
+        sample_id = keys[len(keys) // 2]
+        python_ms, expected = timed(lambda: python_similar(keys, vectors, sample_id, args.k), 1)
+        single_ms, result = timed(lambda: index.similar(sample_id, args.k), args.repeat)
+        cosine_ms, _ = timed(lambda: index.similar(sample_id, args.k, "cosine"), args.repeat)
+        batch_ids = keys[:args.batch]
+        batch_ms, _ = timed(lambda: index.search_many(batch_ids, args.k), max(1, args.repeat // 2))
+        # float32距离在并列附近可能与参照实现顺序不同，按集合比较
+        actual = [normalize_sample_id(r["编号"]) for r in result["results"]]
+        same = "是" if set(actual) == set(expected) else "否"
+        print(f"{index.samples:>8} {build_ms:>10.1f} {python_ms:>11.1f} {single_ms:>9.3f} {cosine_ms:>11.3f} "
+              f"{batch_ms:>12.1f} {batch_ms / len(batch_ids):>9.4f} {same:>4}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,12 @@
+import statistics
+import time
+
+def timed(func, repeat):
+    """执行repeat次，返回(中位数毫秒, 最后一次的结果)"""
+    times = []
+    result = None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = func()
+        times.append((time.perf_counter() - start) * 1000)
+    return statistics.median(times), result
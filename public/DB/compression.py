@@ -0,0 +1,181 @@
+import gzip
+import re
+import threading
+
+try:
+    import brotli
+except ImportError:  # 未安装brotli时只使用gzip
+    brotli = None
+
+# 响应压缩配置
+COMPRESSION_CONFIG = {
+    "min_size": 1024,       # 小于该字节数的响应不压缩（压缩收益抵不上头部和CPU开销）
+    "gzip_level": 6,
+    "brotli_quality": 4,    # 动态压缩用较低质量，速度接近gzip且压缩率更高
+    "content_types": ("application/json", "text/", "application/geo+json")
+}
+
+def _encoders():
+    encoders = {"gzip": lambda data: gzip.compress(data, compresslevel=COMPRESSION_CONFIG["gzip_level"], mtime=0)}
+    if brotli is not None:
+        encoders["br"] = lambda data: brotli.compress(data, quality=COMPRESSION_CONFIG["brotli_quality"])
+    return encoders
+
+ENCODERS = _encoders()
+
+# 服务端的编码偏好顺序
+ENCODING_PREFERENCE = ("br", "gzip")
+
+def choose_encoding(accept_encoding):
+    """按Accept-Encoding选择压缩编码，不支持压缩时为None"""
+    if not accept_encoding:
+        return None
+    accepted = {}
+    for part in accept_encoding.split(","):
+        token, _, params = part.strip().partition(";")
+        quality = re.search(r"q=([0-9.]+)", params)
+        try:
+            accepted[token.strip().lower()] = float(quality.group(1)) if quality else 1.0
+        except ValueError:
+            continue
+    for encoding in ENCODING_PREFERENCE:
+        if encoding in ENCODERS and accepted.get(encoding, accepted.get("*", 0.0)) > 0:
+            return encoding
+    return None
+
+def _strip_etag_suffix(if_none_match, encoding):
+    """去掉If-None-Match中各ETag的编码后缀，返回(新值, 是否去掉过后缀)"""
+    suffix = f'-{encoding}"'
+    stripped = False
+    values = []
+    for value in if_none_match.split(","):
+        value = value.strip()
+        if value.endswith(suffix):
+            value = value[:-len(suffix)] + '"'
+            stripped = True
+        values.append(value)
+    return ", ".join(values), stripped
+
+class _Stats:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._counts = {"compressed": 0, "bytes_in": 0, "bytes_out": 0}
+
+    def add(self, bytes_in, bytes_out):
+        with self._lock:
+            self._counts["compressed"] += 1
+            self._counts["bytes_in"] += bytes_in
+            self._counts["bytes_out"] += bytes_out
+
+    def snapshot(self):
+        with self._lock:
+            return dict(self._counts)
+
+_stats = _Stats()
+
+def get_compression_stats():
+    """已压缩的响应数和压缩前后的总字节数"""
+    return _stats.snapshot()
+
+class CompressionMiddleware:
+    """按Accept-Encoding对JSON/文本响应做brotli或gzip压缩
+
+    只压缩超过min_size且没有Content-Encoding的GET 200响应；HEAD请求和图片、视频等多媒体流原样透传。
+    压缩后的响应ETag加上编码后缀（同一资源不同编码的字节不同，强ETag必须不同），
+    请求中带后缀的If-None-Match在交给内层的条件请求中间件前还原。
+    """
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+        headers = scope["headers"]
+        encoding = choose_encoding(next((v.decode("latin-1") for k, v in headers if k == b"accept-encoding"), None))
+        if encoding is None or scope["method"] == "HEAD":
+            # HEAD响应没有响应体，压缩改写会得到content-length: 0和不带后缀的ETag，原样透传
+            await self.app(scope, receive, self._with_vary(send))
+            return
+
+        stripped = False
+        if_none_match = next((v.decode("latin-1") for k, v in headers if k == b"if-none-match"), None)
+        if if_none_match:
+            if_none_match, stripped = _strip_etag_suffix(if_none_match, encoding)
+            headers = [(k, v) for k, v in headers if k != b"if-none-match"]
+            headers.append((b"if-none-match", if_none_match.encode("latin-1")))
+            scope = {**scope, "headers": headers}
+
+        start = None
+        chunks = []
+        buffering = False
+
+        async def compressing(message):
+            nonlocal start, buffering
+            if message["type"] == "http.response.start":
+                response_headers = message.get("headers", [])
+                if message["status"] == 304 and stripped:
+                    # 客户端缓存的是压缩版本，304中的ETag也要带上编码后缀
+                    message = {**message, "headers": [
+                        (k, self._suffixed(v, encoding) if k == b"etag" else v) for k, v in response_headers
+                    ]}
+                if message["status"] == 200 and self._compressible(response_headers):
+                    start = message
+                    buffering = True
+                    return
+                await send(message)
+                return
+            if not buffering or message["type"] != "http.response.body":
+                await send(message)
+                return
+            chunks.append(message.get("body", b""))
+            if message.get("more_body", False):
+                return
+            body = b"".join(chunks)
+            response_headers = self._add_vary([(k, v) for k, v in start.get("headers", []) if k != b"content-length"])
+            if len(body) >= COMPRESSION_CONFIG["min_size"]:
+                compressed = ENCODERS[encoding](body)
+                _stats.add(len(body), len(compressed))
+                body = compressed
+                response_headers = [
+                    (k, self._suffixed(v, encoding) if k == b"etag" else v) for k, v in response_headers
+                ]
+                response_headers.append((b"content-encoding", encoding.encode("latin-1")))
+            response_headers.append((b"content-length", str(len(body)).encode("latin-1")))
+            await send({**start, "headers": response_headers})
+            await send({"type": "http.response.body", "body": body})
+
+        await self.app(scope, receive, compressing)
+
+    def _with_vary(self, send):
+        """不压缩时也要声明响应随Accept-Encoding变化，避免共享缓存把未压缩版本发给其他客户端"""
+        async def wrapped(message):
+            if (message["type"] == "http.response.start" and message["status"] == 200
+                    and self._compressible(message.get("headers", []))):
+                message = {**message, "headers": self._add_vary(list(message.get("headers", [])))}
+            await send(message)
+        return wrapped
+
+    @staticmethod
+    def _add_vary(headers):
+        if not any(k == b"vary" and b"accept-encoding" in v.lower() for k, v in headers):
+            headers.append((b"vary", b"Accept-Encoding"))
+        return headers
+
+    @staticmethod
+    def _suffixed(etag, encoding):
+        etag = etag.decode("latin-1")
+        if etag.endswith('"'):
+            etag = f'{etag[:-1]}-{encoding}"'
+        return etag.encode("latin-1")
+
+    @staticmethod
+    def _compressible(headers):
+        content_type = ""
+        for k, v in headers:
+            if k == b"content-encoding":
+                return False
+            if k == b"content-type":
+                content_type = v.decode("latin-1").lower()
+        return any(content_type.startswith(t) for t in COMPRESSION_CONFIG["content_types"])
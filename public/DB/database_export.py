@@ -1,82 +1,85 @@
-import pyodbc
 import json
 import os
-from db_config import execute_query
+from db_config import iter_query
+from db_backend import connect
+from export_writer import write_json_array, write_feature_collection
+from geometry_output import export_region_geometry, format_geometry_report
+from table_versions import bump_table_versions
+from spatial_index import SPATIAL_VERSION_KEY
+
+# 导出文件所在目录
+MOCK_MODELS_DIR = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'mock-models')
 
 def connect_to_database():
-    """连接到SQL Server数据库
+    """按db_backend的配置连接数据库（SQL Server或SQLite，与api_server使用同一配置）
     Returns:
-        pyodbc.Connection: 数据库连接对象
+        数据库连接对象
     """
-    conn_str = (
-        "DRIVER={SQL Server};"
-        "SERVER=localhost;"
-        "DATABASE=智理名岩数据库;"
-        "UID=906898206;"
-        "PWD=6912190819"
-    )
-    return pyodbc.connect(conn_str)
+    return connect()
 
-def read_rock_samples(conn):
-    """从数据库读取岩石标本表数据
+def iter_rock_samples(conn, chunk_size=1000):
+    """逐批读取岩石标本表数据，每次产出一行字典
     Args:
-        conn (pyodbc.Connection): 数据库连接对象
-    Returns:
-        list: 包含所有岩石标本数据的列表
+        conn: 数据库连接对象
+        chunk_size (int): 每批读取的行数
     """
     cursor = conn.cursor()
-    query = "SELECT * FROM 岩石标本"
-    cursor.execute(query)
-    
+    cursor.execute("SELECT * FROM 岩石标本")
     columns = [column[0] for column in cursor.description]
-    results = []
-    for row in cursor.fetchall():
-        result = {}
-        for i, value in enumerate(row):
-            result[columns[i]] = value
-        results.append(result)
-    
-    return results
+    while True:
+        rows = cursor.fetchmany(chunk_size)
+        if not rows:
+            break
+        for row in rows:
+            yield dict(zip(columns, row))
+
+def print_export_result(result, label):
+    if result["changed"]:
+        print(f"{label}已导出到: {result['path']}（{result['count']} 条，{result['bytes'] / 1024:.1f} KB）")
+    else:
+        print(f"{label}未变化，保留原文件: {result['path']}")
 
 def update_rock_samples_json(rock_samples):
     """更新岩石标本数据到NewRegion3D.json文件
     Args:
-        rock_samples (list): 岩石标本数据列表
+        rock_samples (iterable): 岩石标本数据（列表或逐行产出的生成器）
+    Returns:
+        dict: {path, changed, count, bytes, sha256}
     
     功能：
     - 读取NewRegion3D.json文件
     - 根据ID更新features中的properties
-    - 保存更新后的数据
+    - 逐个要素紧凑地写入临时文件，内容有变化时才原子替换原文件
     """
-    json_file_path = os.path.join(os.path.dirname(os.path.dirname(__file__)), 
-                                 'mock-models', 'NewRegion3D.json')
+    json_file_path = os.path.join(MOCK_MODELS_DIR, 'NewRegion3D.json')
     
-    # 读取原始JSON文件
+    # 读取原始JSON文件（要素的几何信息只存在于该文件中）
     with open(json_file_path, 'r', encoding='utf-8') as f:
         data = json.load(f)
     
-    # 创建ID到样本数据的映射
-    sample_map = {sample['ID']: sample for sample in rock_samples}
+    # 创建ID到样本属性的映射，ID已经作为Number存在，不需要重复添加
+    sample_map = {}
+    for sample in rock_samples:
+        sample_map[sample['ID']] = {
+            key: value if value is not None else ""
+            for key, value in sample.items() if key != 'ID'
+        }
     
-    # 更新features中的properties
-    for feature in data['features']:
-        number = feature['properties']['Number']
-        if number in sample_map:
-            sample_data = sample_map[number]
-            for key, value in sample_data.items():
-                if key != 'ID':  # ID已经作为Number存在，不需要重复添加
-                    feature['properties'][key] = value if value is not None else ""
+    def features():
+        for feature in data['features']:
+            number = feature['properties']['Number']
+            if number in sample_map:
+                feature['properties'].update(sample_map[number])
+            yield feature
     
-    # 保存更新后的JSON文件
-    with open(json_file_path, 'w', encoding='utf-8') as f:
-        json.dump(data, f, ensure_ascii=False, indent=2)
+    return write_feature_collection(json_file_path, data, features())
 
 def export_relations():
     """导出关联关系数据到relations.json
     
     功能：
-    - 从关联关系表查询数据
-    - 导出到relations.json文件
+    - 从关联关系表逐批查询数据
+    - 逐条写入relations.json文件，内容有变化时才替换原文件
     - 包含关联类型、实体ID和关联程度等信息
     """
     query = """
@@ -85,15 +88,10 @@ def export_relations():
     """
     
     try:
-        results = execute_query(query)
-        output_path = os.path.join(os.path.dirname(os.path.dirname(__file__)), 
-                                 'mock-models', 'relations.json')
-        
-        with open(output_path, 'w', encoding='utf-8') as f:
-            json.dump(results, f, ensure_ascii=False, indent=2)
-            
-        print(f"关联关系数据已成功导出到: {output_path}")
-        
+        output_path = os.path.join(MOCK_MODELS_DIR, 'relations.json')
+        result = write_json_array(output_path, iter_query(query))
+        print_export_result(result, "关联关系数据")
+        return result
     except Exception as e:
         print(f"导出关联关系数据时出错: {str(e)}")
 
@@ -101,8 +99,8 @@ def export_3d_models():
     """导出三维模型数据到Bottom_sidebar.json
     
     功能：
-    - 从三维模型表查询数据
-    - 导出到Bottom_sidebar.json文件
+    - 从三维模型表逐批查询数据
+    - 逐条写入Bottom_sidebar.json文件，内容有变化时才替换原文件
     - 包含模型的基本信息和URL等
     """
     query = """
@@ -111,15 +109,10 @@ def export_3d_models():
     """
     
     try:
-        results = execute_query(query)
-        output_path = os.path.join(os.path.dirname(os.path.dirname(__file__)), 
-                                 'mock-models', 'Bottom_sidebar.json')
-        
-        with open(output_path, 'w', encoding='utf-8') as f:
-            json.dump(results, f, ensure_ascii=False, indent=2)
-            
-        print(f"三维模型数据已成功导出到: {output_path}")
-        
+        output_path = os.path.join(MOCK_MODELS_DIR, 'Bottom_sidebar.json')
+        result = write_json_array(output_path, iter_query(query))
+        print_export_result(result, "三维模型数据")
+        return result
     except Exception as e:
         print(f"导出三维模型数据时出错: {str(e)}")
 
@@ -127,7 +120,7 @@ def main():
     """主函数：执行所有数据导出任务
     
     执行顺序：
-    1. 更新岩石标本数据到NewRegion3D.json
+    1. 更新岩石标本数据到NewRegion3D.json，并生成量化/分块/预压缩的几何输出
     2. 导出关联关系数据到relations.json
     3. 导出三维模型数据到Bottom_sidebar.json
     """
@@ -136,11 +129,14 @@ def main():
         conn = connect_to_database()
         print("成功连接到数据库")
         
-        rock_samples = read_rock_samples(conn)
-        print(f"成功读取 {len(rock_samples)} 条岩石标本数据")
+        result = update_rock_samples_json(iter_rock_samples(conn))
+        print_export_result(result, "岩石标本数据")
+        if result["changed"]:
+            # 通知API服务重建空间索引
+            bump_table_versions([SPATIAL_VERSION_KEY])
         
-        update_rock_samples_json(rock_samples)
-        print("成功更新岩石标本数据到NewRegion3D.json")
+        # 生成量化、分块、预压缩的几何输出
+        print(format_geometry_report(export_region_geometry(result["path"])))
         
         # 导出关联关系和三维模型数据
         export_relations()
@@ -0,0 +1,244 @@
+import decimal
+import hashlib
+import os
+import re
+import sqlite3
+
+# 存储后端配置：sqlserver（默认）或 sqlite（嵌入式数据库，适合野外笔记本和CI，无需数据库服务器）
+BACKEND_CONFIG = {
+    "backend": os.environ.get("ZLMY_DB_BACKEND", "sqlserver"),
+    "sqlite_path": os.environ.get(
+        "ZLMY_SQLITE_PATH",
+        os.path.join(os.path.dirname(os.path.abspath(__file__)), "智理名岩数据库.sqlite3")
+    ),
+    "sqlite_timeout": 30.0  # 等待其他连接释放写锁的秒数
+}
+
+# SQL Server连接配置（api_server、excel_to_sql、database_export共用）
+DB_CONFIG = {
+    "driver": "SQL Server",
+    "server": "localhost",
+    "database": "智理名岩数据库",
+    "trusted_connection": "yes",  # 使用Windows身份验证
+    "uid": os.environ.get("ZLMY_DB_UID"),  # 设置后改用SQL Server身份验证
+    "pwd": os.environ.get("ZLMY_DB_PWD"),
+    "charset": "UTF-8"
+}
+
+def get_connection_string():
+    """获取SQL Server连接字符串"""
+    if DB_CONFIG["uid"]:
+        auth = f"UID={DB_CONFIG['uid']};PWD={DB_CONFIG['pwd'] or ''};"
+    else:
+        auth = f"Trusted_Connection={DB_CONFIG['trusted_connection']};"
+    return (
+        f"DRIVER={{{DB_CONFIG['driver']}}};"
+        f"SERVER={DB_CONFIG['server']};"
+        f"DATABASE={DB_CONFIG['database']};"
+        f"{auth}"
+        f"charset={DB_CONFIG['charset']}"
+    )
+
+def _base_type(declared):
+    """声明类型的基本类型名：NVARCHAR(255) -> nvarchar"""
+    return re.split(r"[\s(]", (declared or "").strip(), maxsplit=1)[0].lower()
+
+class SqlServerDialect:
+    """SQL Server（T-SQL）语法"""
+
+    name = "sqlserver"
+    supports_merge = True
+
+    def top(self, n):
+        return f"TOP ({int(n)}) "
+
+    def limit(self, n):
+        return ""
+
+    def byte_length(self, expr):
+        return f"DATALENGTH({expr})"
+
+    def sha256_hex(self, expr):
+        return f"CONVERT(VARCHAR(64), HASHBYTES('SHA2_256', {expr}), 2)"
+
+    def substring(self, expr, start, length):
+        return f"SUBSTRING({expr}, {start}, {length})"
+
+    def char(self, code):
+        return f"NCHAR({int(code)})"
+
+    def cast_text(self, expr, length):
+        return f"CAST({expr} AS NVARCHAR({int(length)}))"
+
+    def column_type(self, sql_type):
+        return sql_type
+
+    def create_table(self, table_name, column_definitions):
+        return f"""
+    IF NOT EXISTS (SELECT * FROM sys.tables WHERE name = '{table_name}')
+    CREATE TABLE {table_name} (
+        {', '.join(column_definitions)}
+    )
+    """
+
+    def create_index(self, index_name, table_name, columns):
+        column_list = ", ".join(f"[{c}]" for c in columns)
+        return f"""
+    IF NOT EXISTS (SELECT * FROM sys.indexes WHERE name = N'{index_name}')
+    CREATE INDEX [{index_name}] ON [{table_name}] ({column_list})
+    """
+
+    def add_computed_column(self, table_name, column, expression):
+        return f"ALTER TABLE [{table_name}] ADD [{column}] AS {expression} PERSISTED"
+
+    def savepoint(self, name):
+        # 非自动提交连接在第一条语句前还没有活动事务，SAVE TRANSACTION需要先开启事务
+        return f"IF @@TRANCOUNT = 0 BEGIN TRANSACTION; SAVE TRANSACTION [{name}]"
+
+    def rollback_to_savepoint(self, name):
+        return f"ROLLBACK TRANSACTION [{name}]"
+
+    def column_types(self, cursor, table_name):
+        """表中各列的类型：列名 -> (基本类型名, 小数位)，表不存在时为空"""
+        cursor.execute(
+            "SELECT COLUMN_NAME, DATA_TYPE, NUMERIC_SCALE FROM INFORMATION_SCHEMA.COLUMNS WHERE TABLE_NAME = ?",
+            (table_name,)
+        )
+        return {row[0]: (row[1].lower(), row[2]) for row in cursor.fetchall()}
+
+class SqliteDialect(SqlServerDialect):
+    """SQLite语法；方括号标识符、ROW_NUMBER等与T-SQL相同的部分直接沿用"""
+
+    name = "sqlite"
+    supports_merge = False
+
+    def top(self, n):
+        return ""
+
+    def limit(self, n):
+        return f" LIMIT {int(n)}"
+
+    def byte_length(self, expr):
+        return f"LENGTH(CAST({expr} AS BLOB))"
+
+    def sha256_hex(self, expr):
+        # 由连接注册的自定义函数实现
+        return f"SHA256_HEX({expr})"
+
+    def substring(self, expr, start, length):
+        return f"SUBSTR({expr}, {start}, {length})"
+
+    def char(self, code):
+        return f"CHAR({int(code)})"
+
+    def cast_text(self, expr, length):
+        return f"CAST({expr} AS TEXT)"
+
+    def column_type(self, sql_type):
+        # SQLite按类型亲和性存储，DATE/DATETIME2保存为ISO文本
+        if sql_type in ("DATE", "DATETIME2"):
+            return "TEXT"
+        return sql_type
+
+    def create_table(self, table_name, column_definitions):
+        return f"""
+    CREATE TABLE IF NOT EXISTS {table_name} (
+        {', '.join(column_definitions)}
+    )
+    """
+
+    def create_index(self, index_name, table_name, columns):
+        column_list = ", ".join(f"[{c}]" for c in columns)
+        return f"CREATE INDEX IF NOT EXISTS [{index_name}] ON [{table_name}] ({column_list})"
+
+    def add_computed_column(self, table_name, column, expression):
+        # ALTER TABLE只能添加VIRTUAL生成列，它同样可以建索引
+        return f"ALTER TABLE [{table_name}] ADD COLUMN [{column}] GENERATED ALWAYS AS ({expression}) VIRTUAL"
+
+    def savepoint(self, name):
+        # 不在事务中时SAVEPOINT会开启事务；保存点不RELEASE（最外层的RELEASE等于提交），由commit/rollback统一结束
+        return f"SAVEPOINT [{name}]"
+
+    def rollback_to_savepoint(self, name):
+        return f"ROLLBACK TO [{name}]"
+
+    def column_types(self, cursor, table_name):
+        cursor.execute(f"SELECT name, type FROM pragma_table_xinfo('{table_name}')")
+        types = {}
+        for name, declared in cursor.fetchall():
+            scale = re.search(r",\s*(\d+)\s*\)", declared or "")
+            types[name] = (_base_type(declared) or "nvarchar", int(scale.group(1)) if scale else None)
+        return types
+
+def _sha256_hex(value):
+    if value is None:
+        return None
+    if isinstance(value, str):
+        value = value.encode("utf-8")
+    return hashlib.sha256(value).hexdigest().upper()
+
+class SqlServerBackend:
+    """通过pyodbc连接SQL Server"""
+
+    dialect = SqlServerDialect()
+    supports_fast_executemany = True
+
+    def __init__(self):
+        import pyodbc
+        self._pyodbc = pyodbc
+        self.errors = (pyodbc.Error,)
+        self.operational_errors = (pyodbc.OperationalError,)
+
+    def connect(self):
+        return self._pyodbc.connect(get_connection_string())
+
+    def describe(self):
+        return f"SQL Server {DB_CONFIG['server']}/{DB_CONFIG['database']}"
+
+# sqlite3不能直接绑定Decimal参数（类型推断后的DECIMAL列会产生Decimal值）
+sqlite3.register_adapter(decimal.Decimal, float)
+
+class SqliteBackend:
+    """嵌入式SQLite数据库文件"""
+
+    dialect = SqliteDialect()
+    supports_fast_executemany = False
+    errors = (sqlite3.Error,)
+    operational_errors = ()  # 本地文件没有断线问题，连接始终可以放回池中
+
+    def __init__(self, path=None):
+        self.path = path or BACKEND_CONFIG["sqlite_path"]
+
+    def connect(self):
+        # 连接池会在不同线程间复用连接
+        conn = sqlite3.connect(self.path, timeout=BACKEND_CONFIG["sqlite_timeout"], check_same_thread=False)
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.create_function("SHA256_HEX", 1, _sha256_hex, deterministic=True)
+        return conn
+
+    def describe(self):
+        return f"SQLite {self.path}"
+
+BACKENDS = {
+    "sqlserver": SqlServerBackend,
+    "sqlite": SqliteBackend
+}
+
+_backend = None
+
+def get_backend():
+    """当前进程使用的存储后端（按BACKEND_CONFIG["backend"]在首次调用时创建）"""
+    global _backend
+    if _backend is None:
+        name = BACKEND_CONFIG["backend"]
+        if name not in BACKENDS:
+            raise ValueError(f"Unknown database backend: {name}, expected one of {', '.join(BACKENDS)}")
+        _backend = BACKENDS[name]()
+    return _backend
+
+def get_dialect():
+    return get_backend().dialect
+
+def connect():
+    """新建一个当前后端的数据库连接"""
+    return get_backend().connect()
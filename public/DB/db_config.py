@@ -1,47 +1,293 @@
-import pyodbc
 from contextlib import contextmanager
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+import asyncio
+import threading
+import time
 import logging
+from table_versions import bump_table_versions, tables_in_statement
+from db_backend import get_backend, get_dialect
 
 # 配置日志
 logging.basicConfig(level=logging.DEBUG)
 logger = logging.getLogger(__name__)
 
-# 数据库连接配置
-DB_CONFIG = {
-    "driver": "SQL Server",
-    "server": "localhost",
-    "database": "智理名岩数据库",
-    "trusted_connection": "yes",  # 使用Windows身份验证
-    "charset": "UTF-8"
+# 连接池配置
+POOL_CONFIG = {
+    "min_size": 1,                  # 池中至少保留的连接数
+    "max_size": 10,                 # 同时存在的最大连接数
+    "wait_timeout": 10.0,           # 连接耗尽时等待可用连接的最长秒数
+    "idle_timeout": 300.0,          # 空闲超过该秒数的连接会被回收（保留min_size个）
+    "health_check_interval": 30.0   # 空闲超过该秒数的连接在借出前先做健康检查
 }
 
-def get_connection_string():
-    """获取数据库连接字符串"""
-    return (
-        f"DRIVER={{{DB_CONFIG['driver']}}};"
-        f"SERVER={DB_CONFIG['server']};"
-        f"DATABASE={DB_CONFIG['database']};"
-        f"Trusted_Connection={DB_CONFIG['trusted_connection']};"
-        f"charset={DB_CONFIG['charset']}"
-    )
+# 异步查询执行器配置
+EXECUTOR_CONFIG = {
+    "max_workers": POOL_CONFIG["max_size"],  # 执行查询的线程数，不超过连接池上限
+    "max_pending": 100,                      # 排队 + 执行中的查询上限（背压）
+    "queue_timeout": 5.0                     # 排队等待的最长秒数，超时抛出DatabaseBusyError
+}
+
+def create_connection():
+    """新建一个物理数据库连接（SQL Server或SQLite，见db_backend.BACKEND_CONFIG）"""
+    backend = get_backend()
+    logger.debug(f"Attempting to connect to {backend.describe()}")
+    conn = backend.connect()
+    logger.debug("Database connection established successfully")
+    return conn
+
+class PoolTimeoutError(Exception):
+    """等待连接池中的可用连接超时"""
+    pass
+
+class ConnectionPool:
+    """有界数据库连接池
+
+    - 借出时对空闲较久的连接做健康检查，失效连接直接替换
+    - 空闲超时的连接在超过min_size的部分被回收
+    - 连接耗尽时最多等待wait_timeout秒，超时抛出PoolTimeoutError
+    - 记录借出耗时和池饱和次数，供get_pool_stats()查询
+    """
+
+    def __init__(self, connect=create_connection, min_size=1, max_size=10,
+                 wait_timeout=10.0, idle_timeout=300.0, health_check_interval=30.0):
+        if max_size < 1 or min_size < 0 or min_size > max_size:
+            raise ValueError(f"Invalid pool size: min_size={min_size}, max_size={max_size}")
+        self._connect = connect
+        self.min_size = min_size
+        self.max_size = max_size
+        self.wait_timeout = wait_timeout
+        self.idle_timeout = idle_timeout
+        self.health_check_interval = health_check_interval
+
+        self._idle = deque()  # (conn, 归还时间)，右端为最近归还的连接
+        self._size = 0        # 已创建的连接数（空闲 + 借出）
+        self._in_use = 0
+        self._closed = False
+        self._cond = threading.Condition()
+        self._stats = {
+            "checkouts": 0,
+            "checkout_time_total_ms": 0.0,
+            "checkout_time_max_ms": 0.0,
+            "saturated_checkouts": 0,  # 因连接耗尽而需要等待的借出次数
+            "timeouts": 0,
+            "created": 0,
+            "closed": 0,
+            "evicted_idle": 0,
+            "health_check_failures": 0,
+            "peak_in_use": 0
+        }
+
+    def fill(self):
+        """预先创建min_size个连接"""
+        while True:
+            with self._cond:
+                if self._closed or self._size >= self.min_size:
+                    return
+                self._size += 1
+            conn = self._open_reserved()
+            with self._cond:
+                self._idle.append((conn, time.monotonic()))
+                self._cond.notify()
+
+    def acquire(self):
+        """借出一个连接，连接耗尽时阻塞等待"""
+        start = time.monotonic()
+        deadline = start + self.wait_timeout
+        waited = False
+        to_close = []
+        conn = None
+        last_used = None
+        with self._cond:
+            while True:
+                if self._closed:
+                    raise RuntimeError("Connection pool is closed")
+                to_close.extend(self._evict_idle_locked(time.monotonic()))
+                if self._idle:
+                    conn, last_used = self._idle.pop()
+                    break
+                if self._size < self.max_size:
+                    self._size += 1
+                    break
+                if not waited:
+                    waited = True
+                    self._stats["saturated_checkouts"] += 1
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    self._stats["timeouts"] += 1
+                    raise PoolTimeoutError(
+                        f"Timed out after {self.wait_timeout}s waiting for a database connection "
+                        f"(max_size={self.max_size})"
+                    )
+                self._cond.wait(remaining)
+            self._in_use += 1
+            self._stats["peak_in_use"] = max(self._stats["peak_in_use"], self._in_use)
+
+        self._close_all(to_close)
+        try:
+            if conn is None:
+                conn = self._open_reserved()
+            elif time.monotonic() - last_used > self.health_check_interval and not self._is_healthy(conn):
+                logger.warning("Pooled connection failed health check, replacing it")
+                with self._cond:
+                    self._stats["health_check_failures"] += 1
+                self._close_all([conn])
+                conn = self._open_reserved()
+        except Exception:
+            with self._cond:
+                self._in_use -= 1
+                self._cond.notify()
+            raise
+
+        elapsed_ms = (time.monotonic() - start) * 1000
+        with self._cond:
+            self._stats["checkouts"] += 1
+            self._stats["checkout_time_total_ms"] += elapsed_ms
+            self._stats["checkout_time_max_ms"] = max(self._stats["checkout_time_max_ms"], elapsed_ms)
+        return conn
+
+    def release(self, conn, broken=False):
+        """归还连接；回滚未提交的事务，失效连接直接关闭"""
+        if not broken:
+            try:
+                conn.rollback()
+            except Exception as e:
+                logger.warning(f"Rollback on release failed, discarding connection: {str(e)}")
+                broken = True
+        with self._cond:
+            if self._in_use > 0:
+                self._in_use -= 1
+            if broken or self._closed:
+                self._size -= 1
+                discard = True
+            else:
+                self._idle.append((conn, time.monotonic()))
+                discard = False
+            self._cond.notify()
+        if discard:
+            self._close_all([conn])
+
+    def close(self):
+        """关闭连接池及所有空闲连接，借出中的连接在归还时关闭"""
+        with self._cond:
+            self._closed = True
+            idle = [conn for conn, _ in self._idle]
+            self._idle.clear()
+            self._size -= len(idle)
+            self._cond.notify_all()
+        self._close_all(idle)
+
+    def stats(self):
+        """返回连接池计数器快照"""
+        with self._cond:
+            stats = dict(self._stats)
+            stats.update({
+                "size": self._size,
+                "idle": len(self._idle),
+                "in_use": self._in_use,
+                "min_size": self.min_size,
+                "max_size": self.max_size,
+                "saturation": self._in_use / self.max_size
+            })
+        checkouts = stats["checkouts"]
+        stats["checkout_time_avg_ms"] = stats["checkout_time_total_ms"] / checkouts if checkouts else 0.0
+        return stats
+
+    def _open_reserved(self):
+        """为已预留的名额创建连接，失败时释放名额"""
+        try:
+            conn = self._connect()
+        except Exception:
+            with self._cond:
+                self._size -= 1
+                self._cond.notify()
+            raise
+        with self._cond:
+            self._stats["created"] += 1
+        return conn
+
+    def _evict_idle_locked(self, now):
+        """回收空闲超时的连接（调用方需持有锁），返回待关闭的连接"""
+        evicted = []
+        while self._idle and self._size > self.min_size:
+            conn, last_used = self._idle[0]
+            if now - last_used <= self.idle_timeout:
+                break
+            self._idle.popleft()
+            self._size -= 1
+            self._stats["evicted_idle"] += 1
+            evicted.append(conn)
+        return evicted
+
+    def _is_healthy(self, conn):
+        try:
+            cursor = conn.cursor()
+            cursor.execute("SELECT 1")
+            cursor.fetchone()
+            cursor.close()
+            return True
+        except Exception as e:
+            logger.debug(f"Health check failed: {str(e)}")
+            return False
+
+    def _close_all(self, conns):
+        for conn in conns:
+            try:
+                conn.close()
+            except Exception as e:
+                logger.debug(f"Error closing pooled connection: {str(e)}")
+        if conns:
+            with self._cond:
+                self._stats["closed"] += len(conns)
+
+_pool = None
+_pool_lock = threading.Lock()
+
+def get_pool():
+    """获取全局连接池（首次调用时按POOL_CONFIG创建）"""
+    global _pool
+    if _pool is None:
+        with _pool_lock:
+            if _pool is None:
+                pool = ConnectionPool(**POOL_CONFIG)
+                try:
+                    pool.fill()
+                except Exception as e:
+                    logger.warning(f"Failed to pre-fill connection pool: {str(e)}")
+                _pool = pool
+    return _pool
+
+def close_pool():
+    """关闭全局连接池"""
+    global _pool
+    with _pool_lock:
+        if _pool is not None:
+            _pool.close()
+            _pool = None
+
+def get_pool_stats():
+    """获取连接池的借出耗时和饱和度计数器"""
+    return get_pool().stats()
 
 @contextmanager
 def get_db_connection():
-    """获取数据库连接（上下文管理器）"""
-    conn = None
+    """从连接池借出数据库连接（上下文管理器），退出时自动归还"""
+    pool = get_pool()
     try:
-        conn_str = get_connection_string()
-        logger.debug(f"Attempting to connect with connection string: {conn_str}")
-        conn = pyodbc.connect(conn_str)
-        logger.debug("Database connection established successfully")
-        yield conn
+        conn = pool.acquire()
     except Exception as e:
         logger.error(f"Database connection error: {str(e)}")
         raise
+    broken = False
+    try:
+        yield conn
+    except get_backend().operational_errors:
+        # 连接层面的错误，该连接不再放回池中
+        broken = True
+        raise
     finally:
-        if conn:
-            conn.close()
-            logger.debug("Database connection closed")
+        pool.release(conn, broken=broken)
+        logger.debug("Database connection returned to pool")
 
 def execute_query(query, params=None):
     """执行查询并返回结果"""
@@ -79,6 +325,25 @@ def execute_query(query, params=None):
         logger.error(f"Query execution error: {str(e)}")
         raise
 
+def iter_query(query, params=None, chunk_size=1000):
+    """逐批读取查询结果，每次产出一行字典；迭代期间占用一个连接，适合导出大表"""
+    logger.debug(f"Streaming query: {query}")
+    with get_db_connection() as conn:
+        cursor = conn.cursor()
+        if params:
+            cursor.execute(query, params)
+        else:
+            cursor.execute(query)
+        if not cursor.description:
+            return
+        columns = [column[0] for column in cursor.description]
+        while True:
+            rows = cursor.fetchmany(chunk_size)
+            if not rows:
+                break
+            for row in rows:
+                yield dict(zip(columns, row))
+
 def execute_update(query, params=None):
     """执行更新操作（INSERT, UPDATE, DELETE）
     
@@ -96,7 +361,74 @@ def execute_update(query, params=None):
         else:
             cursor.execute(query)
         conn.commit()
-        return cursor.rowcount
+        rowcount = cursor.rowcount
+    # 通知缓存：被修改的表版本号递增
+    bump_table_versions(tables_in_statement(query))
+    return rowcount
+
+class DatabaseBusyError(Exception):
+    """异步查询队列已满，调用方应稍后重试"""
+    pass
+
+_executor = None
+_executor_lock = threading.Lock()
+_pending_semaphores = {}
+
+def get_executor():
+    """获取执行阻塞数据库调用的全局线程池"""
+    global _executor
+    if _executor is None:
+        with _executor_lock:
+            if _executor is None:
+                _executor = ThreadPoolExecutor(
+                    max_workers=EXECUTOR_CONFIG["max_workers"],
+                    thread_name_prefix="db-query"
+                )
+    return _executor
+
+def shutdown_executor():
+    """关闭全局查询线程池"""
+    global _executor
+    with _executor_lock:
+        if _executor is not None:
+            _executor.shutdown(wait=True)
+            _executor = None
+    _pending_semaphores.clear()
+
+def _get_pending_semaphore(loop):
+    # asyncio.Semaphore绑定到事件循环，按循环分别创建
+    semaphore = _pending_semaphores.get(loop)
+    if semaphore is None:
+        semaphore = asyncio.Semaphore(EXECUTOR_CONFIG["max_pending"])
+        _pending_semaphores[loop] = semaphore
+    return semaphore
+
+async def run_in_db_executor(func, *args):
+    """在查询线程池中执行阻塞的数据库函数，不阻塞事件循环
+
+    排队的调用数达到max_pending时等待，超过queue_timeout抛出DatabaseBusyError。
+    """
+    loop = asyncio.get_running_loop()
+    semaphore = _get_pending_semaphore(loop)
+    try:
+        await asyncio.wait_for(semaphore.acquire(), timeout=EXECUTOR_CONFIG["queue_timeout"])
+    except asyncio.TimeoutError:
+        raise DatabaseBusyError(
+            f"More than {EXECUTOR_CONFIG['max_pending']} database calls pending, "
+            f"waited {EXECUTOR_CONFIG['queue_timeout']}s"
+        )
+    try:
+        return await loop.run_in_executor(get_executor(), func, *args)
+    finally:
+        semaphore.release()
+
+async def execute_query_async(query, params=None):
+    """execute_query的异步版本，返回值相同"""
+    return await run_in_db_executor(execute_query, query, params)
+
+async def execute_update_async(query, params=None):
+    """execute_update的异步版本，返回值相同"""
+    return await run_in_db_executor(execute_update, query, params)
 
 def test_connection():
     """测试数据库连接"""
@@ -104,7 +436,8 @@ def test_connection():
         with get_db_connection() as conn:
             cursor = conn.cursor()
             # 测试查询
-            cursor.execute("SELECT TOP 1 编号 FROM 岩石样品")
+            dialect = get_dialect()
+            cursor.execute(f"SELECT {dialect.top(1)}编号 FROM 岩石样品{dialect.limit(1)}")
             result = cursor.fetchone()
             if result:
                 logger.info(f"Connection test successful. Sample ID: {result[0]}")
@@ -121,7 +454,8 @@ if __name__ == "__main__":
         
         # 测试岩石样品查询
         try:
-            query = "SELECT TOP 1 * FROM 岩石样品 WHERE 编号 = ?"
+            dialect = get_dialect()
+            query = f"SELECT {dialect.top(1)}* FROM 岩石样品 WHERE 编号 = ?{dialect.limit(1)}"
             results = execute_query(query, ("长7-2",))
             print("\n测试查询长7-2的数据:")
             for result in results:
@@ -0,0 +1,102 @@
+import csv
+import datetime
+import os
+from openpyxl import load_workbook
+
+# 每次产出的行数
+DEFAULT_CHUNK_SIZE = 1000
+
+# 多工作表文件中 工作表名 -> 表名 的显式映射，未配置的工作表使用“文件名_工作表名”
+SHEET_TABLE_MAP = {}
+
+def cell_to_str(value):
+    """将单元格值转换为字符串，与pd.read_excel(dtype=str)的结果保持一致"""
+    if value is None:
+        return None
+    if isinstance(value, float) and value.is_integer():
+        return str(int(value))
+    if isinstance(value, datetime.datetime):
+        return value.strftime("%Y-%m-%d %H:%M:%S")
+    text = str(value)
+    return text if text != "" else None
+
+def normalize_header(header):
+    """处理表头：空列名与pandas一样命名为Unnamed: i，重复列名追加序号"""
+    columns = []
+    seen = {}
+    for i, name in enumerate(header):
+        name = str(name).strip() if name is not None and str(name).strip() else f"Unnamed: {i}"
+        if name in seen:
+            seen[name] += 1
+            name = f"{name}.{seen[name]}"
+        else:
+            seen[name] = 0
+        columns.append(name)
+    return columns
+
+def is_streamable(file_path):
+    """只有xlsx/xlsm和csv支持流式读取，xls仍需使用pandas"""
+    return os.path.splitext(file_path)[1].lower() in (".xlsx", ".xlsm", ".csv")
+
+def list_sheets(file_path):
+    """列出工作表名称，CSV文件视为只有一个工作表"""
+    if file_path.lower().endswith(".csv"):
+        return [None]
+    workbook = load_workbook(file_path, read_only=True)
+    try:
+        return list(workbook.sheetnames)
+    finally:
+        workbook.close()
+
+def _iter_raw_rows(file_path, sheet_name):
+    if file_path.lower().endswith(".csv"):
+        with open(file_path, "r", encoding="utf-8-sig", newline="") as f:
+            for row in csv.reader(f):
+                yield row
+        return
+    workbook = load_workbook(file_path, read_only=True, data_only=True)
+    try:
+        sheet = workbook[sheet_name] if sheet_name else workbook.active
+        for row in sheet.iter_rows(values_only=True):
+            yield row
+    finally:
+        workbook.close()
+
+def open_sheet(file_path, sheet_name=None, chunk_size=DEFAULT_CHUNK_SIZE):
+    """以只读方式逐行读取工作表
+
+    Returns:
+        tuple: (列名列表, 产出行块的生成器)；每个行块是最多chunk_size个字符串元组，
+               整个过程只在内存中保留一个行块
+    """
+    rows = _iter_raw_rows(file_path, sheet_name)
+    header = next(rows, None)
+    if header is None:
+        return [], iter(())
+    columns = normalize_header(header)
+    width = len(columns)
+
+    def chunks():
+        chunk = []
+        for raw in rows:
+            values = tuple(cell_to_str(v) for v in raw[:width])
+            if all(v is None for v in values):
+                continue  # 跳过空行
+            if len(values) < width:
+                values = values + (None,) * (width - len(values))
+            chunk.append(values)
+            if len(chunk) >= chunk_size:
+                yield chunk
+                chunk = []
+        if chunk:
+            yield chunk
+
+    return columns, chunks()
+
+def sheet_table_name(file_stem, sheet_name, sheet_count):
+    """工作表对应的表名：单工作表文件使用文件名，多工作表文件使用映射或“文件名_工作表名”"""
+    if sheet_name in SHEET_TABLE_MAP:
+        return SHEET_TABLE_MAP[sheet_name]
+    if sheet_count <= 1 or sheet_name is None:
+        return file_stem
+    return f"{file_stem}_{sheet_name}"
@@ -1,8 +1,29 @@
 import pandas as pd
-import pyodbc
 import os
-from tkinter import Tk, filedialog
-import numpy as np
+import sys
+import glob
+import time
+import argparse
+import threading
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor, as_completed
+from table_versions import bump_table_versions
+from db_backend import BACKEND_CONFIG, BACKENDS, connect, get_backend, get_dialect
+from import_manifest import check_file_unchanged, diff_rows, load_manifest, update_manifest
+from excel_reader import is_streamable, list_sheets, open_sheet, sheet_table_name
+from sample_ids import ensure_sample_id_keys
+from schema_inference import (infer_schema, infer_schema_from_chunks, build_create_table, propose_indexes,
+                              format_schema_preview, converters_for_table, convert_rows)
+
+# 导入配置
+IMPORT_CONFIG = {
+    "bulk": True,              # 使用批量插入；False时逐行插入
+    "batch_size": 1000,        # 每批插入的行数（整个文件在一个事务中提交）
+    "fast_executemany": True,  # SQL Server后端使用pyodbc的参数数组批量发送
+    "infer_schema": True       # 新建表时按全部行推断列类型；False时除ID外均为NVARCHAR(255)
+}
+
+# 增量导入时用于比较行的主键列：表名 -> 列名，未配置的表使用ID列
+INCREMENTAL_KEYS = {}
 
 def get_sql_type(dtype, column_name):
     """根据pandas的数据类型确定SQL Server的数据类型"""
@@ -28,8 +49,12 @@ def sanitize_table_name(name):
 
 def create_table_query(df, table_name):
     """生成创建表的SQL语句"""
+    return build_create_table_query(df.dtypes.items(), table_name)
+
+def build_create_table_query(column_types, table_name):
+    """根据 (列名, pandas类型) 序列生成创建表的SQL语句"""
     columns = []
-    for col, dtype in df.dtypes.items():
+    for col, dtype in column_types:
         sql_type = get_sql_type(dtype, col)
         # 如果列名是'ID'，设置为主键
         if col.upper() == 'ID':
@@ -37,56 +62,674 @@ def create_table_query(df, table_name):
         else:
             columns.append(f"[{col}] {sql_type}")
     
+    return get_dialect().create_table(table_name, columns)
+
+def get_table_name(file_path):
+    """获取文件名（不包含扩展名）作为表名"""
+    table_name = os.path.splitext(os.path.basename(file_path))[0]
+    return sanitize_table_name(table_name)
+
+def build_insert_query(table_name, column_names):
+    """构建参数化的INSERT语句"""
+    columns = [f"[{col}]" for col in column_names]
+    placeholders = ['?' for _ in column_names]
     return f"""
-    IF NOT EXISTS (SELECT * FROM sys.tables WHERE name = '{table_name}')
-    CREATE TABLE {table_name} (
-        {', '.join(columns)}
-    )
+    INSERT INTO {table_name} ({', '.join(columns)})
+    VALUES ({', '.join(placeholders)})
     """
 
-def process_excel_file(file_path, conn, cursor):
-    """处理单个Excel文件"""
-    # 获取文件名（不包含扩展名）作为表名
-    table_name = os.path.splitext(os.path.basename(file_path))[0]
-    table_name = sanitize_table_name(table_name)
+def dataframe_rows(df):
+    """将DataFrame转换为原生Python值的行列表，nan转为None"""
+    df = df.astype(object).where(pd.notna(df), None)
+    return [tuple(row) for row in df.itertuples(index=False, name=None)]
+
+def insert_rows_one_by_one(cursor, insert_query, rows):
+    """逐行插入，跳过失败的行
+
+    Returns:
+        tuple: (成功行数, 失败行数)
+    """
+    inserted = 0
+    failed = 0
+    for row in rows:
+        try:
+            cursor.execute(insert_query, row)
+            inserted += 1
+        except get_backend().errors as e:
+            failed += 1
+            print(f"  跳过无法插入的行 {row[:3]}...: {str(e)}")
+    return inserted, failed
+
+def enable_fast_executemany(cursor):
+    """SQL Server后端按配置开启pyodbc的fast_executemany，其他后端没有该选项"""
+    if get_backend().supports_fast_executemany:
+        cursor.fast_executemany = IMPORT_CONFIG["fast_executemany"]
+
+def bulk_insert(conn, cursor, insert_query, rows, batch_size=None, commit=True):
+    """分批插入数据；某批失败时撤销该批并改为逐行插入
+
+    Args:
+        conn: 数据库连接
+        cursor: 游标
+        insert_query (str): 参数化INSERT语句
+        rows (iterable): 行数据（元组），可以是生成器
+        batch_size (int, optional): 每批行数，默认IMPORT_CONFIG["batch_size"]
+        commit (bool): True时每批提交一次；False时不提交，失败的批次通过保存点撤销，
+                       整个文件由调用方一次提交或回滚
+
+    Returns:
+        dict: inserted/failed/batches/fallback_batches/seconds/rows_per_second
+    """
+    batch_size = batch_size or IMPORT_CONFIG["batch_size"]
+    enable_fast_executemany(cursor)
+    dialect = get_dialect()
+    stats = {"inserted": 0, "failed": 0, "batches": 0, "fallback_batches": 0}
+    start = time.perf_counter()
+
+    def flush(batch):
+        if not commit:
+            cursor.execute(dialect.savepoint("excel_batch"))
+        try:
+            cursor.executemany(insert_query, batch)
+            if commit:
+                conn.commit()
+            stats["inserted"] += len(batch)
+        except get_backend().errors as e:
+            if commit:
+                conn.rollback()
+            else:
+                cursor.execute(dialect.rollback_to_savepoint("excel_batch"))
+            print(f"  第 {stats['batches']} 批插入失败，改为逐行插入: {str(e)}")
+            stats["fallback_batches"] += 1
+            # 单条INSERT失败只撤销该语句本身，不影响事务中已写入的行
+            inserted, failed = insert_rows_one_by_one(cursor, insert_query, batch)
+            if commit:
+                conn.commit()
+            stats["inserted"] += inserted
+            stats["failed"] += failed
+
+    batch = []
+    for row in rows:
+        batch.append(row)
+        if len(batch) >= batch_size:
+            stats["batches"] += 1
+            flush(batch)
+            batch = []
+    if batch:
+        stats["batches"] += 1
+        flush(batch)
+
+    stats["seconds"] = time.perf_counter() - start
+    stats["rows_per_second"] = stats["inserted"] / stats["seconds"] if stats["seconds"] > 0 else 0.0
+    return stats
+
+def read_excel_file(file_path, infer=None):
+    """读取并预处理Excel文件，不访问数据库（可在子进程中执行）
+
+    Args:
+        file_path (str): Excel文件路径
+        infer (bool, optional): 是否推断列类型，默认IMPORT_CONFIG["infer_schema"]；
+            在子进程中执行时必须显式传入（spawn方式启动的子进程重新导入模块，看不到主进程中修改的配置）
+
+    Returns:
+        dict: file_path/table_name/create_query/insert_query/rows/parse_seconds
+    """
+    start = time.perf_counter()
+    table_name = get_table_name(file_path)
+
+    # 读取Excel文件，不自动推断数据类型
+    df = pd.read_excel(file_path, dtype=str)
     
-    try:
-        # 读取Excel文件，不自动推断数据类型
-        df = pd.read_excel(file_path, dtype=str)
-        
-        # 特殊处理ID列
-        if 'ID' in df.columns:
-            # 将ID列转换为整数
-            df['ID'] = pd.to_numeric(df['ID'], errors='coerce').fillna(0).astype(int)
-        
-        # 创建表
+    # 特殊处理ID列
+    if 'ID' in df.columns:
+        # 将ID列转换为整数
+        df['ID'] = pd.to_numeric(df['ID'], errors='coerce').fillna(0).astype(int)
+    
+    rows = dataframe_rows(df)
+    columns = list(df.columns)
+    if infer is None:
+        infer = IMPORT_CONFIG["infer_schema"]
+    if infer:
+        # 行已全部在内存中，扫描所有行推断类型，保证每个值都能写入（只看前几千行会漏掉后面更长或更宽的值）
+        schema = infer_schema(columns, rows)
+        create_query = build_create_table(schema, table_name)
+        index_queries = propose_indexes(schema, table_name)
+    else:
+        schema = None
         create_query = create_table_query(df, table_name)
-        cursor.execute(create_query)
+        index_queries = []
+    
+    return {
+        "file_path": file_path,
+        "table_name": table_name,
+        "columns": columns,
+        "schema": schema,
+        "create_query": create_query,
+        "index_queries": index_queries,
+        "insert_query": build_insert_query(table_name, columns),
+        "rows": rows,
+        "parse_seconds": time.perf_counter() - start
+    }
 
-        # 准备插入数据
-        # 将所有数据转换为字符串，处理nan值
-        df = df.replace({np.nan: None})
-        
-        # 构建插入语句
-        columns = [f"[{col}]" for col in df.columns]
-        placeholders = ['?' for _ in df.columns]
-        insert_query = f"""
-        INSERT INTO {table_name} ({', '.join(columns)})
-        VALUES ({', '.join(placeholders)})
+def prepare_table(cursor, table_name, columns, create_query, index_queries=()):
+    """建表（已存在时跳过）并建立建议的索引，返回按实际列类型转换行数据的函数列表"""
+    cursor.execute(create_query)
+    for index_query in index_queries:
+        cursor.execute(index_query)
+    # 样品编号列建立规范化列和索引，使api_server按编号查询时只需一次索引查找
+    ensure_sample_id_keys(cursor, table_name, columns)
+    return converters_for_table(cursor, table_name, columns)
+
+def load_parsed_file(parsed, conn, cursor, bulk=None, batch_size=None):
+    """将read_excel_file的结果写入数据库
+
+    建表语句立即提交；数据行不提交，由调用方在整个文件写完后提交，出错时回滚
+
+    Returns:
+        dict: inserted/failed/seconds/rows_per_second
+    """
+    if bulk is None:
+        bulk = IMPORT_CONFIG["bulk"]
+
+    # 创建表
+    converters = prepare_table(
+        cursor, parsed["table_name"], parsed["columns"], parsed["create_query"], parsed.get("index_queries", ())
+    )
+    rows = convert_rows(parsed["rows"], converters, parsed["columns"])
+
+    if bulk:
+        conn.commit()
+        stats = bulk_insert(conn, cursor, parsed["insert_query"], rows, batch_size, commit=False)
+    else:
+        stats = insert_rows(cursor, parsed["insert_query"], rows)
+    return stats
+
+def insert_rows(cursor, insert_query, rows):
+    """逐行插入数据（不使用批量插入），任何一行失败即抛出异常，由调用方回滚
+
+    Returns:
+        dict: inserted/failed/seconds/rows_per_second
+    """
+    inserted = 0
+    start = time.perf_counter()
+    for row in rows:
+        cursor.execute(insert_query, row)
+        inserted += 1
+    elapsed = time.perf_counter() - start
+    return {
+        "inserted": inserted,
+        "failed": 0,
+        "seconds": elapsed,
+        "rows_per_second": inserted / elapsed if elapsed > 0 else 0.0
+    }
+
+def _executemany_batches(cursor, query, rows, batch_size=None):
+    """分批executemany，不提交（由调用方控制事务）"""
+    batch_size = batch_size or IMPORT_CONFIG["batch_size"]
+    enable_fast_executemany(cursor)
+    for i in range(0, len(rows), batch_size):
+        cursor.executemany(query, rows[i:i + batch_size])
+
+def merge_rows(cursor, table_name, columns, key_column, rows, batch_size=None):
+    """通过临时表和MERGE按主键插入或更新行（SQLite使用INSERT ... ON CONFLICT）"""
+    column_list = ', '.join(f"[{c}]" for c in columns)
+    if not get_dialect().supports_merge:
+        update_list = ', '.join(f"[{c}] = excluded.[{c}]" for c in columns if c != key_column)
+        upsert_query = f"""
+        INSERT INTO {table_name} ({column_list}) VALUES ({', '.join('?' for _ in columns)})
+        ON CONFLICT([{key_column}]) DO {f"UPDATE SET {update_list}" if update_list else "NOTHING"}
         """
+        _executemany_batches(cursor, upsert_query, rows, batch_size)
+        return
+    cursor.execute("IF OBJECT_ID('tempdb..#excel_stage') IS NOT NULL DROP TABLE #excel_stage")
+    cursor.execute(f"SELECT TOP 0 {column_list} INTO #excel_stage FROM {table_name}")
+    _executemany_batches(
+        cursor,
+        f"INSERT INTO #excel_stage ({column_list}) VALUES ({', '.join('?' for _ in columns)})",
+        rows,
+        batch_size
+    )
+    update_list = ', '.join(f"t.[{c}] = s.[{c}]" for c in columns if c != key_column)
+    merge_query = f"""
+    MERGE INTO {table_name} AS t
+    USING #excel_stage AS s ON t.[{key_column}] = s.[{key_column}]
+    {f"WHEN MATCHED THEN UPDATE SET {update_list}" if update_list else ""}
+    WHEN NOT MATCHED BY TARGET THEN INSERT ({column_list}) VALUES ({', '.join(f"s.[{c}]" for c in columns)});
+    """
+    cursor.execute(merge_query)
+    cursor.execute("DROP TABLE #excel_stage")
+
+def delete_rows(cursor, table_name, key_column, keys, chunk_size=1000):
+    """按主键删除行"""
+    for i in range(0, len(keys), chunk_size):
+        chunk = keys[i:i + chunk_size]
+        cursor.execute(
+            f"DELETE FROM {table_name} WHERE [{key_column}] IN ({', '.join('?' for _ in chunk)})",
+            tuple(chunk)
+        )
+
+def check_unique_keys(rows, key_index, key_column, limit=10):
+    """检查主键列没有空值和重复值，否则抛出ValueError
+
+    重复或为空的主键会使MERGE（或ON CONFLICT）对整个文件失败，且无法判断应保留哪一行，
+    因此在写入前拒绝该文件并列出有问题的主键。
+    """
+    seen = set()
+    duplicates = {}
+    empty = 0
+    for row in rows:
+        value = row[key_index]
+        key = str(value).strip() if value is not None else ""
+        if key in ("", "nan", "NaN", "None"):
+            empty += 1
+            continue
+        if key in seen:
+            duplicates[key] = duplicates.get(key, 1) + 1
+        seen.add(key)
+    if not duplicates and not empty:
+        return
+    problems = []
+    if empty:
+        problems.append(f"{empty} 行为空")
+    if duplicates:
+        shown = "，".join(f"{k}（{n} 次）" for k, n in list(duplicates.items())[:limit])
+        more = f" 等 {len(duplicates)} 个" if len(duplicates) > limit else ""
+        problems.append(f"重复的值: {shown}{more}")
+    raise ValueError(f"主键列 '{key_column}' 不能为空或重复，请修正后重新导入：{'；'.join(problems)}")
+
+def apply_incremental(parsed, conn, cursor, file_info, batch_size=None):
+    """增量导入：只写入新增/修改的行并删除已不存在的行，整个文件一个事务
+
+    Args:
+        parsed (dict): read_excel_file的结果
+        file_info (dict): check_file_unchanged返回的文件信息，写入清单
+
+    Returns:
+        dict: inserted/changed/deleted/unchanged/failed/seconds/rows_per_second
+    """
+    start = time.perf_counter()
+    table_name = parsed["table_name"]
+    columns = parsed["columns"]
+    rows = parsed["rows"]
+    key_column = INCREMENTAL_KEYS.get(table_name, 'ID')
+    if key_column in columns:
+        check_unique_keys(rows, columns.index(key_column), key_column)
+
+    converters = prepare_table(cursor, table_name, columns, parsed["create_query"], parsed.get("index_queries", ()))
+    if key_column not in columns:
+        # 没有主键无法逐行比较，整表替换
+        cursor.execute(f"DELETE FROM {table_name}")
+        deleted = cursor.rowcount
+        _executemany_batches(cursor, parsed["insert_query"], list(convert_rows(rows, converters, columns)), batch_size)
+        stats = {"inserted": len(rows), "changed": 0, "deleted": max(deleted, 0), "unchanged": 0}
+        hashes = None
+    else:
+        previous = load_manifest().get(table_name, {}).get("rows")
+        diff = diff_rows(rows, columns.index(key_column), previous)
+        deleted = diff["deleted"]
+        if previous is None:
+            # 首次增量导入没有行哈希记录，以数据库中现有的主键为准
+            cursor.execute(f"SELECT [{key_column}] FROM {table_name}")
+            existing = {str(row[0]) for row in cursor.fetchall()}
+            deleted = sorted(existing - set(diff["hashes"]))
+            diff["inserted"] = [r for r in diff["changed"] if str(r[columns.index(key_column)]) not in existing]
+            diff["changed"] = [r for r in diff["changed"] if str(r[columns.index(key_column)]) in existing]
+        # 行哈希基于原始字符串计算，写入前再转换为目标列类型
+        upserts = list(convert_rows(diff["inserted"] + diff["changed"], converters, columns))
+        if upserts:
+            merge_rows(cursor, table_name, columns, key_column, upserts, batch_size)
+        if deleted:
+            delete_rows(cursor, table_name, key_column, deleted)
+        stats = {
+            "inserted": len(diff["inserted"]),
+            "changed": len(diff["changed"]),
+            "deleted": len(deleted),
+            "unchanged": diff["unchanged"]
+        }
+        hashes = diff["hashes"]
+    conn.commit()
 
-        # 批量插入数据
-        for _, row in df.iterrows():
-            cursor.execute(insert_query, tuple(row))
+    update_manifest(table_name, {
+        "file": {**file_info, "path": parsed["file_path"]},
+        "key": key_column if hashes is not None else None,
+        "rows": hashes
+    })
+    elapsed = time.perf_counter() - start
+    applied = stats["inserted"] + stats["changed"] + stats["deleted"]
+    stats.update({
+        "failed": 0,
+        "seconds": elapsed,
+        "rows_per_second": applied / elapsed if elapsed > 0 else 0.0
+    })
+    return stats
 
-        print(f"成功将Excel文件 '{os.path.basename(file_path)}' 导入到数据库表 '{table_name}'")
-        return True
+def format_change_report(stats):
+    return (f"新增 {stats['inserted']} 行，修改 {stats['changed']} 行，"
+            f"删除 {stats['deleted']} 行，未变 {stats['unchanged']} 行")
+
+def process_excel_file(file_path, conn, cursor, bulk=None, batch_size=None, incremental=False):
+    """处理单个Excel文件
+
+    Args:
+        file_path (str): Excel文件路径
+        conn: 数据库连接
+        cursor: 游标
+        bulk (bool, optional): 是否批量插入，默认IMPORT_CONFIG["bulk"]
+        batch_size (int, optional): 批量插入每批行数
+        incremental (bool): 增量导入，跳过未变化的文件，只写入变化的行
+
+    Returns:
+        tuple: (是否成功, 是否写入了数据)，未变化而跳过的文件为(True, False)，调用方据此决定是否更新表版本
+    """
+    try:
+        if incremental:
+            unchanged, file_info = check_file_unchanged(get_table_name(file_path), file_path)
+            if unchanged:
+                print(f"Excel文件 '{os.path.basename(file_path)}' 自上次导入后未变化，跳过")
+                return True, False
+            parsed = read_excel_file(file_path)
+            stats = apply_incremental(parsed, conn, cursor, file_info, batch_size)
+            print(f"成功将Excel文件 '{os.path.basename(file_path)}' 增量导入到数据库表 '{parsed['table_name']}'："
+                  f"{format_change_report(stats)}，{stats['seconds']:.2f} 秒")
+            return True, True
+
+        parsed = read_excel_file(file_path)
+        stats = load_parsed_file(parsed, conn, cursor, bulk, batch_size)
+        print(f"成功将Excel文件 '{os.path.basename(file_path)}' 导入到数据库表 '{parsed['table_name']}'："
+              f"{stats['inserted']} 行，{stats['failed']} 行失败，"
+              f"{stats['seconds']:.2f} 秒，{stats['rows_per_second']:.0f} 行/秒")
+        # 已有数据提交入库即视为导入成功，失败行已在上面逐条报告
+        return stats['inserted'] > 0 or not parsed['rows'], stats['inserted'] > 0
         
     except Exception as e:
-        print(f"处理文件 '{os.path.basename(file_path)}' 时发生错误: {str(e)}")
-        return False
+        # 回滚该文件已写入的行，避免调用方随后的commit把部分数据提交
+        conn.rollback()
+        print(f"处理文件 '{os.path.basename(file_path)}' 时发生错误: {str(e)}（已回滚）")
+        return False, False
+
+def _coerce_id_column(chunks, columns):
+    """流式读取时与pandas路径一致地将ID列转换为整数（无法转换时为0）"""
+    if 'ID' not in columns:
+        yield from chunks
+        return
+    id_index = columns.index('ID')
+    for chunk in chunks:
+        converted = []
+        for row in chunk:
+            try:
+                value = int(float(row[id_index])) if row[id_index] is not None else 0
+            except (TypeError, ValueError, OverflowError):
+                # 与pd.to_numeric(errors='coerce')一致：非数字、日期、inf等都视为无法转换
+                value = 0
+            converted.append(row[:id_index] + (value,) + row[id_index + 1:])
+        yield converted
+
+def stream_excel_file(file_path, conn, cursor, batch_size=None, progress=None, bulk=None):
+    """流式导入Excel/CSV文件：逐块读取并直接批量写入，内存占用与文件大小无关
+
+    多工作表文件的每个工作表分别写入各自的表（见excel_reader.sheet_table_name）。
+    建表和数据行都不提交，由调用方在整个文件写完后提交，出错时回滚。
+
+    Args:
+        progress (dict, optional): 读取过程中更新其中的"rows"（已读取的行数），出错回滚时用于报告失败行数
+        bulk (bool, optional): 是否批量插入，默认IMPORT_CONFIG["bulk"]
+
+    Returns:
+        list: 每个工作表的导入结果（table/inserted/failed/seconds/rows_per_second）
+    """
+    batch_size = batch_size or IMPORT_CONFIG["batch_size"]
+    if bulk is None:
+        bulk = IMPORT_CONFIG["bulk"]
+    file_stem = os.path.splitext(os.path.basename(file_path))[0]
+    sheets = list_sheets(file_path)
+    results = []
+    for sheet_name in sheets:
+        table_name = sanitize_table_name(sheet_table_name(file_stem, sheet_name, len(sheets)))
+        columns, chunks = open_sheet(file_path, sheet_name, batch_size)
+        if not columns:
+            continue
+        if IMPORT_CONFIG["infer_schema"]:
+            # 先完整读一遍工作表推断列类型（只累计每列的取值特征，内存占用不变），再重新打开逐块写入；
+            # 只看第一个行块推断时，后面更长或更宽的值会写入失败或无法转换
+            schema = infer_schema_from_chunks(columns, _coerce_id_column(chunks, columns))
+            create_query = build_create_table(schema, table_name)
+            index_queries = propose_indexes(schema, table_name)
+            columns, chunks = open_sheet(file_path, sheet_name, batch_size)
+        else:
+            column_types = [(col, 'int64' if col == 'ID' else 'object') for col in columns]
+            create_query = build_create_table_query(column_types, table_name)
+            index_queries = []
+        # 不在这里提交：否则前一个工作表已写入的行会随之提交，文件无法整体回滚
+        converters = prepare_table(cursor, table_name, columns, create_query, index_queries)
+        # 将行块展开为行，bulk_insert按batch_size重新分批，不会整体载入内存
+        rows = convert_rows(_count_rows(_coerce_id_column(chunks, columns), progress), converters, columns)
+        insert_query = build_insert_query(table_name, columns)
+        if bulk:
+            stats = bulk_insert(conn, cursor, insert_query, rows, batch_size, commit=False)
+        else:
+            stats = insert_rows(cursor, insert_query, rows)
+        stats["table"] = table_name
+        stats["sheet"] = sheet_name
+        results.append(stats)
+        print(f"成功将 '{os.path.basename(file_path)}'{f' 工作表 {sheet_name}' if sheet_name else ''} "
+              f"流式导入到数据库表 '{table_name}'：{stats['inserted']} 行，{stats['failed']} 行失败，"
+              f"{stats['seconds']:.2f} 秒，{stats['rows_per_second']:.0f} 行/秒")
+    return results
+
+def _count_rows(chunks, progress):
+    """将行块展开为行，同时在progress["rows"]中累计已读取的行数"""
+    for chunk in chunks:
+        if progress is not None:
+            progress["rows"] = progress.get("rows", 0) + len(chunk)
+        yield from chunk
+
+def _stream_file_task(file_path, table_locks, bulk, batch_size):
+    """流式加载线程：读取与写入在同一线程内逐块进行，整个文件在一个事务中提交或回滚"""
+    result = {"file": os.path.basename(file_path), "table": get_table_name(file_path), "parse_seconds": 0.0}
+    progress = {"rows": 0}
+    conn = None
+    try:
+        with table_locks[get_table_name(file_path)]:
+            conn = connect_to_database()
+            cursor = conn.cursor()
+            sheet_results = stream_excel_file(file_path, conn, cursor, batch_size, progress, bulk)
+            conn.commit()
+        inserted = sum(r["inserted"] for r in sheet_results)
+        seconds = sum(r["seconds"] for r in sheet_results)
+        result.update({
+            "table": ", ".join(r["table"] for r in sheet_results) or result["table"],
+            "tables": [r["table"] for r in sheet_results],
+            "rows": inserted,
+            "inserted": inserted,
+            "failed": sum(r["failed"] for r in sheet_results),
+            "seconds": seconds,
+            "rows_per_second": inserted / seconds if seconds > 0 else 0.0,
+            "ok": inserted > 0
+        })
+    except Exception as e:
+        if conn is not None:
+            try:
+                conn.rollback()
+            except get_backend().errors:
+                pass
+        # 已读取的行随事务一起回滚，均未写入
+        result.update({"ok": False, "error": str(e), "rolled_back": True, "inserted": 0, "failed": progress["rows"]})
+    finally:
+        if conn is not None:
+            conn.close()
+    return result
+
+def preview_file_schema(file_path, stream=False):
+    """推断文件对应表的结构并打印，不访问数据库
+
+    Returns:
+        list: (表名, 列结构, 建索引语句) 列表
+    """
+    previews = []
+    if stream and is_streamable(file_path):
+        file_stem = os.path.splitext(os.path.basename(file_path))[0]
+        sheets = list_sheets(file_path)
+        for sheet_name in sheets:
+            table_name = sanitize_table_name(sheet_table_name(file_stem, sheet_name, len(sheets)))
+            columns, chunks = open_sheet(file_path, sheet_name)
+            if not columns:
+                continue
+            schema = infer_schema_from_chunks(columns, _coerce_id_column(chunks, columns))
+            previews.append((table_name, schema, propose_indexes(schema, table_name)))
+    else:
+        parsed = read_excel_file(file_path)
+        schema = parsed["schema"] or infer_schema(parsed["columns"], parsed["rows"])
+        previews.append((parsed["table_name"], schema, propose_indexes(schema, parsed["table_name"])))
+    for table_name, schema, index_queries in previews:
+        print(format_schema_preview(table_name, schema, index_queries))
+        print()
+    return previews
+
+def connect_to_database():
+    """按db_backend的配置连接数据库（与api_server使用同一配置）"""
+    return connect()
+
+def collect_excel_files(patterns):
+    """将目录、通配符和文件路径展开为Excel文件列表（去重、排序）"""
+    files = []
+    for pattern in patterns:
+        if os.path.isdir(pattern):
+            matches = glob.glob(os.path.join(pattern, '*.xlsx')) + glob.glob(os.path.join(pattern, '*.xls'))
+        else:
+            matches = glob.glob(pattern, recursive=True)
+        for path in matches:
+            # 跳过Excel打开文件时生成的临时文件
+            if os.path.basename(path).startswith('~$') or not os.path.isfile(path):
+                continue
+            files.append(os.path.abspath(path))
+    return sorted(set(files))
+
+def _load_file_task(parsed, table_locks, bulk, batch_size, file_info=None):
+    """加载线程：每个文件使用独立连接和事务，同一张表的文件串行写入
+
+    file_info不为None时按增量模式写入
+    """
+    result = {
+        "file": os.path.basename(parsed["file_path"]),
+        "table": parsed["table_name"],
+        "rows": len(parsed["rows"]),
+        "parse_seconds": parsed["parse_seconds"]
+    }
+    conn = None
+    try:
+        with table_locks[parsed["table_name"]]:
+            conn = connect_to_database()
+            cursor = conn.cursor()
+            if file_info is not None:
+                stats = apply_incremental(parsed, conn, cursor, file_info, batch_size)
+            else:
+                stats = load_parsed_file(parsed, conn, cursor, bulk, batch_size)
+            conn.commit()
+        result.update(stats)
+        result["ok"] = file_info is not None or stats["inserted"] > 0 or not parsed["rows"]
+    except Exception as e:
+        if conn is not None:
+            try:
+                conn.rollback()
+            except get_backend().errors:
+                pass
+        # 整个文件的写入已回滚，没有任何行入库
+        result.update({"ok": False, "error": str(e), "rolled_back": True, "inserted": 0, "failed": len(parsed["rows"])})
+    finally:
+        if conn is not None:
+            conn.close()
+    return result
+
+def import_files(file_paths, workers=None, concurrency=4, bulk=None, batch_size=None, incremental=False,
+                 stream=False):
+    """批量导入：进程池并行解析Excel，线程池通过多个连接并行写入
+
+    Args:
+        file_paths (list): Excel文件路径
+        workers (int, optional): 解析进程数，默认CPU核数
+        concurrency (int): 同时写入数据库的连接数
+        bulk (bool, optional): 是否批量插入
+        batch_size (int, optional): 批量插入每批行数
+        incremental (bool): 增量导入，跳过未变化的文件，只写入变化的行
+        stream (bool): 流式读取xlsx/csv并逐块写入（不经过解析进程池），xls文件仍走常规路径
+
+    Returns:
+        list: 每个文件的导入结果
+    """
+    start = time.perf_counter()
+    results = []
+    table_locks = {get_table_name(f): threading.Lock() for f in file_paths}
+    file_infos = {}
+    if incremental:
+        manifest = load_manifest()
+        pending = []
+        for file_path in file_paths:
+            unchanged, file_info = check_file_unchanged(get_table_name(file_path), file_path, manifest)
+            if unchanged:
+                results.append({
+                    "file": os.path.basename(file_path), "table": get_table_name(file_path),
+                    "ok": True, "skipped": True, "rows": 0, "inserted": 0, "failed": 0
+                })
+            else:
+                file_infos[file_path] = file_info
+                pending.append(file_path)
+        file_paths = pending
+    with ProcessPoolExecutor(max_workers=workers) as parse_pool, \
+            ThreadPoolExecutor(max_workers=concurrency) as load_pool:
+        load_futures = []
+        if stream:
+            streamed = [f for f in file_paths if is_streamable(f)]
+            file_paths = [f for f in file_paths if not is_streamable(f)]
+            load_futures.extend(load_pool.submit(_stream_file_task, f, table_locks, bulk, batch_size) for f in streamed)
+        parse_futures = {parse_pool.submit(read_excel_file, f, IMPORT_CONFIG["infer_schema"]): f for f in file_paths}
+        # 解析完成一个就提交加载，解析与写入重叠进行
+        for future in as_completed(parse_futures):
+            file_path = parse_futures[future]
+            try:
+                parsed = future.result()
+            except Exception as e:
+                results.append({
+                    "file": os.path.basename(file_path), "table": get_table_name(file_path),
+                    "ok": False, "error": f"解析失败: {str(e)}", "rows": 0, "inserted": 0, "failed": 0
+                })
+                continue
+            load_futures.append(load_pool.submit(
+                _load_file_task, parsed, table_locks, bulk, batch_size, file_infos.get(file_path)
+            ))
+        for future in as_completed(load_futures):
+            results.append(future.result())
+
+    # 通知API服务这些表的数据已变化
+    changed_tables = sorted({
+        table for r in results if r["ok"] and not r.get("skipped") for table in r.get("tables", [r["table"]])
+    })
+    if changed_tables:
+        bump_table_versions(changed_tables)
+
+    print_import_summary(results, time.perf_counter() - start)
+    return results
+
+def print_import_summary(results, elapsed):
+    """打印每个文件的耗时和吞吐量"""
+    print(f"\n{'文件':<30} {'表':<20} {'状态':<4} {'行数':>8} {'失败':>6} {'解析(秒)':>9} {'写入(秒)':>9} {'行/秒':>9}")
+    for r in sorted(results, key=lambda r: r["file"]):
+        print(f"{r['file']:<30} {r['table']:<20} {'成功' if r['ok'] else '失败':<4} "
+              f"{r.get('inserted', 0):>8} {r.get('failed', 0):>6} "
+              f"{r.get('parse_seconds', 0):>9.2f} {r.get('seconds', 0):>9.2f} {r.get('rows_per_second', 0):>9.0f}")
+        if r.get("skipped"):
+            print("    未变化，已跳过")
+        elif "changed" in r:
+            print(f"    {format_change_report(r)}")
+        if r.get("error"):
+            print(f"    错误: {r['error']}{'（已回滚，该文件没有数据写入）' if r.get('rolled_back') else ''}")
+    success_count = sum(1 for r in results if r["ok"])
+    total_rows = sum(r.get("inserted", 0) for r in results)
+    print(f"\n处理完成！成功导入 {success_count}/{len(results)} 个文件，共 {total_rows} 行，"
+          f"总耗时 {elapsed:.2f} 秒，{total_rows / elapsed if elapsed > 0 else 0:.0f} 行/秒。")
 
 def excel_to_sql():
+    from tkinter import Tk, filedialog
+
     # 创建tkinter根窗口（但不显示）
     root = Tk()
     root.withdraw()
@@ -102,17 +745,8 @@ def excel_to_sql():
         return
 
     try:
-        # 数据库连接配置
-        conn_str = (
-            "DRIVER={SQL Server};"
-            "SERVER=localhost;"
-            "DATABASE=智理名岩数据库;"
-            "UID=906898206;"
-            "PWD=6912190819"
-        )
-
         # 连接数据库
-        conn = pyodbc.connect(conn_str)
+        conn = connect_to_database()
         cursor = conn.cursor()
 
         # 处理每个选中的文件
@@ -120,11 +754,16 @@ def excel_to_sql():
         total_files = len(file_paths)
 
         for file_path in file_paths:
-            if process_excel_file(file_path, conn, cursor):
+            imported, changed = process_excel_file(file_path, conn, cursor)
+            if imported:
                 success_count += 1
             
             # 提交事务
             conn.commit()
+            
+            # 通知API服务该表数据已变化，使其缓存失效（未变化而跳过的文件不更新版本）
+            if changed:
+                bump_table_versions([get_table_name(file_path)])
 
         # 显示总体处理结果
         print(f"\n处理完成！成功导入 {success_count}/{total_files} 个文件。")
@@ -135,5 +774,62 @@ def excel_to_sql():
         if 'conn' in locals():
             conn.close()
 
+def main():
+    """命令行入口：不带参数时弹出文件选择框，带参数时以无界面批量模式导入"""
+    parser = argparse.ArgumentParser(description="将Excel文件导入SQL Server数据库")
+    parser.add_argument("paths", nargs="*", help="Excel文件、目录或通配符（如 data/*.xlsx）")
+    parser.add_argument("--workers", type=int, default=None, help="解析Excel的进程数，默认CPU核数")
+    parser.add_argument("--concurrency", type=int, default=4, help="同时写入数据库的连接数")
+    parser.add_argument("--batch-size", type=int, default=IMPORT_CONFIG["batch_size"], help="批量插入每批行数")
+    parser.add_argument("--row-by-row", action="store_true", help="逐行插入（不使用批量插入）")
+    parser.add_argument("--stream", action="store_true",
+                        help="流式读取xlsx/csv并逐块写入，内存占用恒定；多工作表文件每个工作表写入一张表")
+    parser.add_argument("--preview-schema", action="store_true",
+                        help="只推断并打印各文件对应的表结构和建议索引，不写入数据库")
+    parser.add_argument("--no-infer-schema", action="store_true",
+                        help="新建表时不推断列类型（除ID外均为NVARCHAR(255)）")
+    parser.add_argument("--backend", choices=sorted(BACKENDS), default=None,
+                        help=f"存储后端，默认{BACKEND_CONFIG['backend']}（也可用环境变量ZLMY_DB_BACKEND设置）")
+    parser.add_argument("--sqlite-path", default=None, help="SQLite后端的数据库文件")
+    parser.add_argument("--incremental", action="store_true",
+                        help="增量导入：跳过未变化的文件，按主键合并变化的行并删除已移除的行")
+    args = parser.parse_args()
+    if args.stream and args.incremental:
+        parser.error("--stream 与 --incremental 不能同时使用（增量比较需要完整读取文件）")
+
+    if not args.paths:
+        excel_to_sql()
+        return
+
+    # 通过环境变量传递，解析进程池中的子进程也使用同一后端的方言
+    if args.backend:
+        os.environ["ZLMY_DB_BACKEND"] = BACKEND_CONFIG["backend"] = args.backend
+    if args.sqlite_path:
+        os.environ["ZLMY_SQLITE_PATH"] = BACKEND_CONFIG["sqlite_path"] = os.path.abspath(args.sqlite_path)
+
+    if args.no_infer_schema:
+        IMPORT_CONFIG["infer_schema"] = False
+
+    file_paths = collect_excel_files(args.paths)
+    if not file_paths:
+        print("未找到Excel文件")
+        sys.exit(1)
+    if args.preview_schema:
+        for file_path in file_paths:
+            preview_file_schema(file_path, stream=args.stream)
+        return
+    print(f"共找到 {len(file_paths)} 个Excel文件")
+    results = import_files(
+        file_paths,
+        workers=args.workers,
+        concurrency=args.concurrency,
+        bulk=not args.row_by_row,
+        batch_size=args.batch_size,
+        incremental=args.incremental,
+        stream=args.stream
+    )
+    if not all(r["ok"] for r in results):
+        sys.exit(1)
+
 if __name__ == "__main__":
-    excel_to_sql() 
\ No newline at end of file
+    main()
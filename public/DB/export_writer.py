@@ -0,0 +1,150 @@
+import datetime
+import decimal
+import hashlib
+import json
+import os
+import threading
+
+# 导出清单：记录每个导出文件最近一次写入内容的哈希，内容未变化时不重写文件
+EXPORT_MANIFEST_FILE = os.path.join(os.path.dirname(os.path.abspath(__file__)), "export_manifest.json")
+
+# 导出的临时文件目录：位于项目根目录（public之外），开发服务器不会把写了一半的文件提供给浏览器；
+# 与mock-models在同一文件系统上，os.replace仍是原子操作
+EXPORT_TEMP_DIR = os.path.join(
+    os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__)))), ".export-tmp"
+)
+
+_lock = threading.Lock()
+
+def load_export_manifest():
+    """读取导出清单，不存在时返回空清单"""
+    try:
+        with open(EXPORT_MANIFEST_FILE, "r", encoding="utf-8") as f:
+            return json.load(f)
+    except FileNotFoundError:
+        return {}
+
+def _update_export_manifest(path, entry):
+    with _lock:
+        manifest = load_export_manifest()
+        manifest[os.path.abspath(path)] = entry
+        temp_path = f"{EXPORT_MANIFEST_FILE}.{os.getpid()}.tmp"
+        with open(temp_path, "w", encoding="utf-8") as f:
+            json.dump(manifest, f, ensure_ascii=False, indent=2)
+        os.replace(temp_path, EXPORT_MANIFEST_FILE)
+
+def export_temp_path(path):
+    """导出文件对应的临时文件路径（不同目录下的同名文件、不同进程之间不冲突）"""
+    os.makedirs(EXPORT_TEMP_DIR, exist_ok=True)
+    key = hashlib.sha1(os.path.abspath(path).encode("utf-8")).hexdigest()[:8]
+    return os.path.join(EXPORT_TEMP_DIR, f"{key}-{os.path.basename(path)}.{os.getpid()}.tmp")
+
+def json_default(value):
+    """序列化数据库返回的日期、Decimal和二进制值"""
+    if isinstance(value, (datetime.datetime, datetime.date, datetime.time)):
+        return value.isoformat()
+    if isinstance(value, decimal.Decimal):
+        return float(value)
+    if isinstance(value, (bytes, bytearray)):
+        return None
+    return str(value)
+
+def dumps_compact(value):
+    """紧凑格式的JSON（无缩进、无多余空格）"""
+    return json.dumps(value, ensure_ascii=False, separators=(",", ":"), default=json_default)
+
+class AtomicExportWriter:
+    """原子、增量地写入导出文件
+
+    内容先写入EXPORT_TEMP_DIR中的临时文件并同时计算SHA-256；关闭时若哈希与清单记录一致且目标文件
+    未被外部修改，则丢弃临时文件、保留原文件，否则用os.replace原子替换目标文件。
+    读取方（如Vite开发服务器）因此不会读到写了一半的文件，内容不变时文件的修改时间也不变。
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self.temp_path = export_temp_path(path)
+        self.changed = False
+        self.bytes_written = 0
+        self._digest = hashlib.sha256()
+        self._file = None
+
+    def __enter__(self):
+        self._file = open(self.temp_path, "w", encoding="utf-8", newline="\n")
+        return self
+
+    def write(self, text):
+        data = text.encode("utf-8")
+        self._digest.update(data)
+        self.bytes_written += len(data)
+        self._file.write(text)
+
+    @property
+    def sha256(self):
+        return self._digest.hexdigest()
+
+    def _unchanged(self):
+        previous = load_export_manifest().get(os.path.abspath(self.path))
+        if not previous or previous.get("sha256") != self.sha256:
+            return False
+        try:
+            stat = os.stat(self.path)
+        except FileNotFoundError:
+            return False
+        return stat.st_size == previous.get("size") and stat.st_mtime == previous.get("mtime")
+
+    def __exit__(self, exc_type, exc, tb):
+        self._file.close()
+        if exc_type is not None:
+            os.remove(self.temp_path)
+            return False
+        if self._unchanged():
+            os.remove(self.temp_path)
+            return False
+        os.replace(self.temp_path, self.path)
+        self.changed = True
+        stat = os.stat(self.path)
+        _update_export_manifest(self.path, {"sha256": self.sha256, "size": stat.st_size, "mtime": stat.st_mtime})
+        return False
+
+    def result(self, count):
+        return {"path": self.path, "changed": self.changed, "count": count, "bytes": self.bytes_written, "sha256": self.sha256}
+
+def write_json_array(path, items):
+    """将可迭代的记录逐条写成紧凑的JSON数组
+
+    Returns:
+        dict: {path, changed, count, bytes, sha256}
+    """
+    count = 0
+    with AtomicExportWriter(path) as writer:
+        writer.write("[")
+        for item in items:
+            writer.write(("," if count else "") + dumps_compact(item))
+            count += 1
+        writer.write("]\n")
+    return writer.result(count)
+
+def write_feature_collection(path, header, features):
+    """将GeoJSON要素逐个写成紧凑的FeatureCollection
+
+    Args:
+        path (str): 输出文件
+        header (dict): features以外的顶层字段（type、crs等）
+        features (iterable): 要素
+
+    Returns:
+        dict: {path, changed, count, bytes, sha256}
+    """
+    count = 0
+    with AtomicExportWriter(path) as writer:
+        writer.write("{")
+        for key, value in header.items():
+            if key != "features":
+                writer.write(f"{dumps_compact(key)}:{dumps_compact(value)},")
+        writer.write('"features":[')
+        for feature in features:
+            writer.write(("," if count else "") + dumps_compact(feature))
+            count += 1
+        writer.write("]}\n")
+    return writer.result(count)
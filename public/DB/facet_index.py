@@ -0,0 +1,137 @@
+import logging
+import threading
+import time
+from collections import Counter
+from db_config import execute_query
+from table_versions import get_version_key
+
+logger = logging.getLogger(__name__)
+
+# 筛选面板中的分面：接口字段名 -> 岩石标本列名
+FACET_COLUMNS = {
+    "岩石类别": "岩石类别",
+    "颜色": "颜色",
+    "粒度": "粒度（主要）",
+    "特殊结构": "特殊结构",
+    "特殊矿物": "特殊矿物"
+}
+
+# /api/rock-samples支持的筛选条件：接口字段名 -> (列名, 匹配方式)
+ROCK_SAMPLE_FILTERS = {
+    "基本名称": ("基本名称", "contains"),
+    "岩石类别": ("岩石类别", "equals"),
+    "颜色": ("颜色", "equals"),
+    "主要成分": ("主要成分", "contains"),
+    "粒度": ("粒度（主要）", "equals"),
+    "特殊结构": ("特殊结构", "contains"),
+    "特殊矿物": ("特殊矿物", "contains"),
+    "系": ("系（与组并非等时对应）", "equals"),
+    "组段": ("组段", "equals")
+}
+
+FACET_TABLES = ("岩石标本",)
+
+def _matches(value, expected, mode):
+    if value is None:
+        return False
+    if mode == "contains":
+        return expected in str(value)
+    return str(value) == expected
+
+def _distinct_values(rows, facet):
+    return {row[facet] for row in rows if row[facet] is not None}
+
+class FacetIndex:
+    """岩石标本筛选分面的内存索引
+
+    一次查询读取所有筛选相关列，在内存中统计各分面的取值和数量；
+    岩石标本表版本变化（重新导入）后下次访问时自动重建。
+    """
+
+    def __init__(self):
+        self._rows = []
+        self._version_key = None
+        self._unfiltered = None
+        self._built_at = None
+        self._lock = threading.Lock()
+
+    def is_stale(self):
+        return self._version_key is None or get_version_key(FACET_TABLES) != self._version_key
+
+    def refresh(self, force=False):
+        """重新从数据库加载索引（索引未过期且非强制时跳过）"""
+        with self._lock:
+            if not force and not self.is_stale():
+                return
+            version_key = get_version_key(FACET_TABLES)
+            start = time.monotonic()
+            columns = list(dict.fromkeys(column for column, _ in ROCK_SAMPLE_FILTERS.values()))
+            query = f"SELECT {', '.join(f'[{c}]' for c in columns)} FROM [岩石标本]"
+            rows = execute_query(query)
+            self._rows = [
+                {key: row.get(column) for key, (column, _) in ROCK_SAMPLE_FILTERS.items()}
+                for row in rows
+            ]
+            self._unfiltered = None
+            self._version_key = version_key
+            self._built_at = time.time()
+            logger.info(f"Facet index rebuilt from {len(self._rows)} rows in "
+                        f"{(time.monotonic() - start) * 1000:.1f} ms")
+
+    def facets(self, filters=None):
+        """计算分面取值及数量
+
+        每个分面的数量按除该分面自身以外的筛选条件计算，
+        这样已选中的分面仍能显示其他可选值。
+
+        Args:
+            filters (dict, optional): 接口字段名 -> 筛选值
+
+        Returns:
+            dict: {"values": {分面: [取值]}, "counts": {分面: {取值: 数量}}, "total": 匹配行数}
+        """
+        active = {k: v for k, v in (filters or {}).items() if v and k in ROCK_SAMPLE_FILTERS}
+        if not active and self._unfiltered is not None:
+            return self._unfiltered
+
+        rows = self._rows
+        # 预先计算每行满足哪些筛选条件
+        matched = [
+            {key for key, value in active.items()
+             if _matches(row[key], value, ROCK_SAMPLE_FILTERS[key][1])}
+            for row in rows
+        ]
+        total = sum(1 for m in matched if len(m) == len(active))
+
+        counts = {}
+        for facet in FACET_COLUMNS:
+            others = len(active) - (1 if facet in active else 0)
+            counter = Counter()
+            for row, m in zip(rows, matched):
+                value = row[facet]
+                if value is None:
+                    continue
+                if len(m) - (1 if facet in m else 0) == others:
+                    counter[value] += 1
+            counts[facet] = counter
+
+        result = {
+            "values": {facet: sorted(_distinct_values(rows, facet), key=str) for facet in FACET_COLUMNS},
+            "counts": {facet: dict(counter) for facet, counter in counts.items()},
+            "total": total
+        }
+        if not active and rows is self._rows:
+            self._unfiltered = result
+        return result
+
+    def stats(self):
+        return {
+            "rows": len(self._rows),
+            "built_at": self._built_at,
+            "stale": self.is_stale()
+        }
+
+_index = FacetIndex()
+
+def get_facet_index():
+    return _index
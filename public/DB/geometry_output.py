@@ -0,0 +1,242 @@
+import argparse
+import gzip
+import json
+import os
+import re
+import time
+from export_writer import AtomicExportWriter, dumps_compact, export_temp_path, write_feature_collection
+
+try:
+    import brotli
+except ImportError:  # 未安装brotli时只生成.gz
+    brotli = None
+
+# 几何输出配置
+GEOMETRY_CONFIG = {
+    "precision": 8,         # 经纬度保留的小数位（8位约1.1毫米；标本多边形边长只有厘米级，不宜再低）
+    "z_precision": 3,       # 高程保留的小数位（米）
+    "keep_z": True,         # False时丢弃高程，输出二维坐标
+    "tile_by": "Area",      # 按该属性拆分为多个分块文件，None表示不分块
+    "compress": True        # 在输出文件旁生成预压缩的.gz/.br文件
+}
+
+def quantize_coordinates(coordinates, precision, z_precision, keep_z=True):
+    """按精度舍入坐标（任意嵌套层级的坐标数组）"""
+    if coordinates and isinstance(coordinates[0], (int, float)):
+        point = [round(coordinates[0], precision), round(coordinates[1], precision)]
+        if keep_z and len(coordinates) > 2:
+            point.append(round(coordinates[2], z_precision))
+        return point
+    return [quantize_coordinates(c, precision, z_precision, keep_z) for c in coordinates]
+
+def quantize_feature(feature, config=GEOMETRY_CONFIG):
+    """返回坐标量化后的要素副本，属性不变"""
+    geometry = feature.get("geometry")
+    if not geometry or "coordinates" not in geometry:
+        return feature
+    return {
+        **feature,
+        "geometry": {
+            **geometry,
+            "coordinates": quantize_coordinates(
+                geometry["coordinates"], config["precision"], config["z_precision"], config["keep_z"]
+            )
+        }
+    }
+
+def _bbox(features):
+    xs, ys = [], []
+
+    def collect(coordinates):
+        if coordinates and isinstance(coordinates[0], (int, float)):
+            xs.append(coordinates[0])
+            ys.append(coordinates[1])
+        else:
+            for c in coordinates:
+                collect(c)
+
+    for feature in features:
+        if feature.get("geometry"):
+            collect(feature["geometry"].get("coordinates", []))
+    return [min(xs), min(ys), max(xs), max(ys)] if xs else None
+
+def _write_bytes_atomic(path, data):
+    temp_path = export_temp_path(path)
+    with open(temp_path, "wb") as f:
+        f.write(data)
+    os.replace(temp_path, path)
+
+def write_compressed_siblings(path, force=False):
+    """在文件旁生成.gz（以及安装了brotli时的.br），供支持预压缩的静态服务器直接发送
+
+    Returns:
+        dict: 扩展名 -> 压缩后字节数
+    """
+    with open(path, "rb") as f:
+        data = f.read()
+    encoders = {".gz": lambda d: gzip.compress(d, compresslevel=9, mtime=0)}
+    if brotli is not None:
+        encoders[".br"] = lambda d: brotli.compress(d, quality=11)
+    sizes = {}
+    for suffix, encode in encoders.items():
+        sibling = path + suffix
+        if not force and os.path.exists(sibling) and os.path.getmtime(sibling) >= os.path.getmtime(path):
+            sizes[suffix] = os.path.getsize(sibling)
+            continue
+        compressed = encode(data)
+        _write_bytes_atomic(sibling, compressed)
+        sizes[suffix] = len(compressed)
+    return sizes
+
+def measure_parse_seconds(path, repeat=3):
+    """解析文件所需时间（取多次中的最小值），用来近似客户端的JSON解析开销"""
+    with open(path, "rb") as f:
+        data = f.read()
+    best = None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        json.loads(data)
+        elapsed = time.perf_counter() - start
+        best = elapsed if best is None else min(best, elapsed)
+    return best
+
+def _tile_file_name(key):
+    return re.sub(r'[\\/:*?"<>|\s]+', "_", str(key)) + ".json"
+
+def write_tiles(features, header, tiles_dir, tile_by, config=GEOMETRY_CONFIG):
+    """按属性值拆分要素，每块写成一个FeatureCollection，并写出index.json描述各分块
+
+    Returns:
+        list: 各分块的 {key, url, count, bbox, bytes, changed}
+    """
+    os.makedirs(tiles_dir, exist_ok=True)
+    groups = {}
+    for feature in features:
+        key = feature.get("properties", {}).get(tile_by)
+        groups.setdefault("_" if key in (None, "") else key, []).append(feature)
+
+    tiles = []
+    for key in sorted(groups, key=str):
+        file_name = _tile_file_name(key)
+        path = os.path.join(tiles_dir, file_name)
+        result = write_feature_collection(path, header, groups[key])
+        if config["compress"] and result["changed"]:
+            write_compressed_siblings(path, force=True)
+        elif config["compress"]:
+            write_compressed_siblings(path)
+        tiles.append({
+            "key": key,
+            "url": file_name,
+            "count": result["count"],
+            "bbox": _bbox(groups[key]),
+            "bytes": result["bytes"],
+            "changed": result["changed"]
+        })
+
+    # 删除已不存在的分块
+    current = {tile["url"] for tile in tiles} | {"index.json"}
+    for name in os.listdir(tiles_dir):
+        base = name[:-3] if name.endswith((".gz", ".br")) else name
+        if base.endswith(".json") and base not in current:
+            os.remove(os.path.join(tiles_dir, name))
+
+    index = {
+        "tile_by": tile_by,
+        "precision": config["precision"],
+        "z_precision": config["z_precision"] if config["keep_z"] else None,
+        "bbox": _bbox(features),
+        "tiles": [{k: v for k, v in tile.items() if k != "changed"} for tile in tiles]
+    }
+    with AtomicExportWriter(os.path.join(tiles_dir, "index.json")) as writer:
+        writer.write(dumps_compact(index) + "\n")
+    return tiles
+
+def export_region_geometry(source_path, config=GEOMETRY_CONFIG):
+    """由完整精度的GeoJSON生成量化、分块、预压缩的输出
+
+    输出（与源文件同目录）：
+    - <name>.min.json：坐标量化后的完整FeatureCollection（及其.gz/.br）
+    - <name>_tiles/：按config["tile_by"]拆分的分块文件和index.json
+
+    Returns:
+        dict: 各输出的大小、耗时和解析时间
+    """
+    start = time.perf_counter()
+    with open(source_path, "r", encoding="utf-8") as f:
+        data = json.load(f)
+    features = [quantize_feature(feature, config) for feature in data.get("features", [])]
+
+    stem = os.path.splitext(source_path)[0]
+    min_path = f"{stem}.min.json"
+    result = write_feature_collection(min_path, data, features)
+    metrics = {
+        "source": {"path": source_path, "bytes": os.path.getsize(source_path), "parse_seconds": measure_parse_seconds(source_path)},
+        "quantized": {
+            "path": min_path,
+            "bytes": result["bytes"],
+            "changed": result["changed"],
+            "parse_seconds": measure_parse_seconds(min_path)
+        },
+        "tiles": None
+    }
+    if config["compress"]:
+        metrics["quantized"]["compressed"] = write_compressed_siblings(min_path, force=result["changed"])
+
+    if config["tile_by"]:
+        tiles = write_tiles(features, data, f"{stem}_tiles", config["tile_by"], config)
+        metrics["tiles"] = {
+            "dir": f"{stem}_tiles",
+            "count": len(tiles),
+            "largest_bytes": max((t["bytes"] for t in tiles), default=0),
+            "changed": sum(1 for t in tiles if t["changed"])
+        }
+    metrics["export_seconds"] = time.perf_counter() - start
+    return metrics
+
+def format_geometry_report(metrics):
+    """生成几何输出的对比报告"""
+    source = metrics["source"]
+    quantized = metrics["quantized"]
+
+    def kb(size):
+        return f"{size / 1024:.1f} KB"
+
+    lines = [
+        f"几何输出耗时 {metrics['export_seconds']:.2f}s",
+        f"  原始文件   {kb(source['bytes']):>10}  解析 {source['parse_seconds'] * 1000:.1f} ms",
+        f"  量化文件   {kb(quantized['bytes']):>10}  解析 {quantized['parse_seconds'] * 1000:.1f} ms"
+        f"  ({quantized['bytes'] / source['bytes']:.0%}){'' if quantized['changed'] else '  未变化'}"
+    ]
+    for suffix, size in quantized.get("compressed", {}).items():
+        lines.append(f"  量化{suffix:<6} {kb(size):>10}  ({size / source['bytes']:.0%})")
+    if metrics["tiles"]:
+        tiles = metrics["tiles"]
+        lines.append(
+            f"  分块 {tiles['count']} 个，最大 {kb(tiles['largest_bytes'])}，本次更新 {tiles['changed']} 个: {tiles['dir']}"
+        )
+    return "\n".join(lines)
+
+def main():
+    parser = argparse.ArgumentParser(description="生成量化、分块、预压缩的GeoJSON输出")
+    parser.add_argument("source", nargs="?",
+                        default=os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))),
+                                             "mock-models", "NewRegion3D.json"),
+                        help="完整精度的GeoJSON文件")
+    parser.add_argument("--precision", type=int, default=GEOMETRY_CONFIG["precision"], help="经纬度小数位")
+    parser.add_argument("--z-precision", type=int, default=GEOMETRY_CONFIG["z_precision"], help="高程小数位")
+    parser.add_argument("--drop-z", action="store_true", help="丢弃高程，输出二维坐标")
+    parser.add_argument("--tile-by", default=GEOMETRY_CONFIG["tile_by"], help="分块依据的属性，空字符串表示不分块")
+    parser.add_argument("--no-compress", action="store_true", help="不生成.gz/.br文件")
+    args = parser.parse_args()
+
+    config = {
+        "precision": args.precision,
+        "z_precision": args.z_precision,
+        "keep_z": not args.drop_z,
+        "tile_by": args.tile_by or None,
+        "compress": not args.no_compress
+    }
+    print(format_geometry_report(export_region_geometry(args.source, config)))
+
+if __name__ == "__main__":
+    main()
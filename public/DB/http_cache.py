@@ -0,0 +1,213 @@
+import glob
+import hashlib
+import logging
+import os
+import re
+import threading
+from table_versions import get_version_key
+
+logger = logging.getLogger(__name__)
+
+# 按内容哈希生成ETag时最多缓冲的响应体字节数，更大的响应直接透传
+MAX_HASHED_BODY = 8 * 1024 * 1024
+
+# 常用的Cache-Control策略
+NO_STORE = "no-store"
+REVALIDATE = "public, no-cache"  # 可以缓存，但每次使用前都要用ETag验证
+SHORT_LIVED = "public, max-age=60, must-revalidate"
+
+MEDIA_TABLES = ("多媒体文件",)
+SPECIMEN_TABLES = ("岩石样品", "薄片鉴定报告", "XRF测试结果", "关联关系") + MEDIA_TABLES
+
+# 每条路由的缓存策略：(路径正则, 依赖的表, Cache-Control)，按顺序匹配第一条
+# 依赖表不为None时ETag由表版本计算，未过期的请求不执行处理函数即可返回304；
+# 为None时（结果不只取决于表版本，如几何文件）按响应内容的哈希计算ETag
+CACHE_POLICIES = [
+    (r"^/api/media/", None, None),  # 多媒体接口自带ETag和Range处理，不经过本中间件
+    (r"^/api/(cache|db-pool|http-cache)/stats$", None, NO_STORE),
+    (r"^/api/3d-models$", ("三维模型",), SHORT_LIVED),
+    (r"^/api/3d-models/", ("三维模型",) + MEDIA_TABLES, REVALIDATE),
+    (r"^/api/rock-samples/(filters|search)$", ("岩石标本",), SHORT_LIVED),
+    (r"^/api/rock-samples$", ("岩石标本",) + MEDIA_TABLES, REVALIDATE),
+    (r"^/api/rock-sample/", ("岩石样品",) + MEDIA_TABLES, REVALIDATE),
+    (r"^/api/thin-section/", ("薄片鉴定报告",) + MEDIA_TABLES, REVALIDATE),
+    (r"^/api/xrf-test/", ("XRF测试结果",), REVALIDATE),
+    (r"^/api/specimen/", SPECIMEN_TABLES, REVALIDATE),
+    (r"^/api/(relations|relation-graph)/", ("关联关系", "岩石样品"), REVALIDATE),
+    (r"^/api/xrf/", ("XRF测试结果",), REVALIDATE),
+    (r"^/api/similar/", ("XRF测试结果", "薄片鉴定报告"), REVALIDATE),
+    (r"^/api/specimens/", None, REVALIDATE)
+]
+
+_COMPILED_POLICIES = [(re.compile(pattern), tables, cache_control) for pattern, tables, cache_control in CACHE_POLICIES]
+
+def _code_fingerprint():
+    """服务代码的指纹，部署新代码后旧ETag全部失效（多个worker进程之间保持一致）"""
+    digest = hashlib.sha256()
+    for path in sorted(glob.glob(os.path.join(os.path.dirname(os.path.abspath(__file__)), "*.py"))):
+        digest.update(f"{os.path.basename(path)}:{os.stat(path).st_mtime_ns}".encode("utf-8"))
+    return digest.hexdigest()[:16]
+
+ETAG_SALT = _code_fingerprint()
+
+def find_policy(path):
+    """返回(依赖的表, Cache-Control)，没有匹配的策略时为None"""
+    for pattern, tables, cache_control in _COMPILED_POLICIES:
+        if pattern.search(path):
+            return tables, cache_control
+    return None
+
+def etag_matches(if_none_match, etag):
+    """If-None-Match是否与etag匹配（弱比较，支持*和多个值）"""
+    if not if_none_match:
+        return False
+    candidates = [t.strip() for t in if_none_match.split(",")]
+    return "*" in candidates or etag in [t[2:] if t.startswith("W/") else t for t in candidates]
+
+def version_etag(scope, tables):
+    """由请求地址和依赖表的版本快照计算ETag（响应中的媒体地址包含主机名，所以主机名也参与计算）"""
+    host = next((v for k, v in scope["headers"] if k == b"host"), b"")
+    key = (f"{ETAG_SALT}|{host.decode('latin-1')}|{scope['path']}?{scope['query_string'].decode('latin-1')}|"
+           f"{get_version_key(tables)}")
+    return f'"v-{hashlib.sha256(key.encode("utf-8")).hexdigest()[:32]}"'
+
+def content_etag(body):
+    return f'"h-{hashlib.sha256(body).hexdigest()[:32]}"'
+
+def mark_degraded(request):
+    """标记本次响应为降级结果（如多媒体查询失败、汇总接口某部分繁忙或出错）
+
+    降级的200响应不添加ETag并禁止缓存：版本ETag在导入前不会变化，缓存后客户端会一直得到不完整的结果
+    """
+    request.state.cache_degraded = True
+
+class _Stats:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._counts = {"requests": 0, "not_modified": 0, "version_etags": 0, "content_etags": 0, "uncached": 0, "degraded": 0}
+
+    def add(self, name):
+        with self._lock:
+            self._counts[name] += 1
+
+    def snapshot(self):
+        with self._lock:
+            return dict(self._counts)
+
+_stats = _Stats()
+
+def get_http_cache_stats():
+    """条件请求统计：304次数、各类ETag的使用次数"""
+    return _stats.snapshot()
+
+def _header(headers, name):
+    return next((v.decode("latin-1") for k, v in headers if k == name), None)
+
+class ConditionalRequestMiddleware:
+    """为GET/HEAD接口响应添加ETag和Cache-Control，If-None-Match匹配时返回304
+
+    依赖表的路由在调用处理函数之前就能判断是否未变化，重复访问既不查询数据库也不序列化JSON；
+    其他路由缓冲响应体计算内容哈希，至少省去重复传输。
+    """
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or scope["method"] not in ("GET", "HEAD"):
+            await self.app(scope, receive, send)
+            return
+        tables, cache_control = find_policy(scope["path"]) or (None, None)
+        if cache_control is None:
+            await self.app(scope, receive, send)
+            return
+        # 处理函数通过request.state（即scope["state"]）标记降级响应，先创建好供内外层共享
+        state = scope.setdefault("state", {})
+        _stats.add("requests")
+        if cache_control == NO_STORE:
+            _stats.add("uncached")
+            await self.app(scope, receive, self._with_headers(send, None, cache_control, state))
+            return
+
+        if_none_match = _header(scope["headers"], b"if-none-match")
+        if tables is not None:
+            _stats.add("version_etags")
+            # 版本快照在处理请求之前获取：处理期间发生导入时ETag对应旧版本，下次请求必然重新获取
+            etag = version_etag(scope, tables)
+            if etag_matches(if_none_match, etag):
+                await self._not_modified(send, etag, cache_control)
+                return
+            await self.app(scope, receive, self._with_headers(send, etag, cache_control, state))
+            return
+
+        _stats.add("content_etags")
+        await self._hashed(scope, receive, send, if_none_match, cache_control, state)
+
+    def _with_headers(self, send, etag, cache_control, state):
+        """只给成功且自身没有ETag的响应添加缓存头；降级响应不加ETag并改为no-store"""
+        async def wrapped(message):
+            if message["type"] == "http.response.start" and message["status"] == 200:
+                headers = list(message.get("headers", []))
+                if state.get("cache_degraded"):
+                    _stats.add("degraded")
+                    headers = [(k, v) for k, v in headers if k not in (b"etag", b"cache-control")]
+                    headers.append((b"cache-control", NO_STORE.encode("latin-1")))
+                    await send({**message, "headers": headers})
+                    return
+                if etag is not None and not any(k == b"etag" for k, _ in headers):
+                    headers.append((b"etag", etag.encode("latin-1")))
+                if not any(k == b"cache-control" for k, _ in headers):
+                    headers.append((b"cache-control", cache_control.encode("latin-1")))
+                message = {**message, "headers": headers}
+            await send(message)
+        return wrapped
+
+    async def _not_modified(self, send, etag, cache_control):
+        _stats.add("not_modified")
+        await send({
+            "type": "http.response.start",
+            "status": 304,
+            "headers": [(b"etag", etag.encode("latin-1")), (b"cache-control", cache_control.encode("latin-1"))]
+        })
+        await send({"type": "http.response.body", "body": b""})
+
+    async def _hashed(self, scope, receive, send, if_none_match, cache_control, state):
+        """缓冲完整响应体后按内容哈希生成ETag；非200或超过MAX_HASHED_BODY的响应原样透传"""
+        start = None
+        chunks = []
+        size = 0
+        passthrough = False
+
+        async def buffered(message):
+            nonlocal start, size, passthrough
+            if passthrough:
+                await send(message)
+                return
+            if message["type"] == "http.response.start":
+                start = message
+                if message["status"] != 200:
+                    passthrough = True
+                    await send(message)
+                return
+            if message["type"] != "http.response.body":
+                await send(message)
+                return
+            body = message.get("body", b"")
+            chunks.append(body)
+            size += len(body)
+            if size > MAX_HASHED_BODY:
+                passthrough = True
+                await send(start)
+                await send({"type": "http.response.body", "body": b"".join(chunks), "more_body": message.get("more_body", False)})
+                return
+            if message.get("more_body", False):
+                return
+            body = b"".join(chunks)
+            etag = content_etag(body)
+            if not state.get("cache_degraded") and etag_matches(if_none_match, etag):
+                await self._not_modified(send, etag, cache_control)
+                return
+            await self._with_headers(send, etag, cache_control, state)(start)
+            await send({"type": "http.response.body", "body": body})
+
+        await self.app(scope, receive, buffered)
@@ -0,0 +1,97 @@
+import hashlib
+import json
+import os
+import threading
+
+# 增量导入清单：记录每张表最近一次导入的文件信息和每行的哈希
+MANIFEST_FILE = os.path.join(os.path.dirname(os.path.abspath(__file__)), "import_manifest.json")
+
+_lock = threading.Lock()
+
+def load_manifest():
+    """读取增量导入清单，不存在时返回空清单"""
+    try:
+        with open(MANIFEST_FILE, "r", encoding="utf-8") as f:
+            return json.load(f)
+    except FileNotFoundError:
+        return {}
+
+def update_manifest(table_name, entry):
+    """更新一张表的清单记录并原子写回文件（线程安全）"""
+    with _lock:
+        manifest = load_manifest()
+        manifest[table_name] = entry
+        temp_path = f"{MANIFEST_FILE}.{os.getpid()}.tmp"
+        with open(temp_path, "w", encoding="utf-8") as f:
+            json.dump(manifest, f, ensure_ascii=False)
+        os.replace(temp_path, MANIFEST_FILE)
+
+def file_checksum(file_path, chunk_size=1024 * 1024):
+    """计算文件内容的SHA-256"""
+    digest = hashlib.sha256()
+    with open(file_path, "rb") as f:
+        for chunk in iter(lambda: f.read(chunk_size), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+def file_signature(file_path):
+    """文件的修改时间和大小，用于在计算哈希前快速判断是否变化"""
+    stat = os.stat(file_path)
+    return {"mtime": stat.st_mtime, "size": stat.st_size}
+
+def check_file_unchanged(table_name, file_path, manifest=None):
+    """判断文件自上次导入后是否未变化
+
+    Returns:
+        tuple: (是否未变化, 当前文件信息{mtime, size, checksum})
+    """
+    if manifest is None:
+        manifest = load_manifest()
+    previous = manifest.get(table_name, {}).get("file")
+    info = file_signature(file_path)
+    if previous and previous.get("mtime") == info["mtime"] and previous.get("size") == info["size"]:
+        info["checksum"] = previous.get("checksum")
+        return True, info
+    info["checksum"] = file_checksum(file_path)
+    return bool(previous) and previous.get("checksum") == info["checksum"], info
+
+def row_hash(row):
+    """单行数据的哈希"""
+    data = json.dumps(list(row), ensure_ascii=False, default=str)
+    return hashlib.sha1(data.encode("utf-8")).hexdigest()[:16]
+
+def diff_rows(rows, key_index, previous_hashes):
+    """将本次的行与上次导入的行哈希比较
+
+    Args:
+        rows (list): 行数据（元组）
+        key_index (int): 主键所在列
+        previous_hashes (dict | None): 上次导入的 主键 -> 哈希，None表示没有记录
+
+    Returns:
+        dict: inserted/changed（行列表）、deleted（主键列表）、unchanged（数量）、hashes（本次的主键 -> 哈希）
+    """
+    hashes = {}
+    inserted = []
+    changed = []
+    unchanged = 0
+    for row in rows:
+        key = str(row[key_index])
+        h = row_hash(row)
+        hashes[key] = h
+        if previous_hashes is None:
+            changed.append(row)
+        elif key not in previous_hashes:
+            inserted.append(row)
+        elif previous_hashes[key] != h:
+            changed.append(row)
+        else:
+            unchanged += 1
+    deleted = [] if previous_hashes is None else [k for k in previous_hashes if k not in hashes]
+    return {
+        "inserted": inserted,
+        "changed": changed,
+        "deleted": deleted,
+        "unchanged": unchanged,
+        "hashes": hashes
+    }
@@ -0,0 +1,59 @@
+import base64
+import datetime
+import decimal
+import json
+import math
+import uuid
+from fastapi.responses import JSONResponse
+
+try:
+    import orjson
+except ImportError:  # 未安装orjson时退回标准库json（输出相同，速度较慢）
+    orjson = None
+
+def encode_value(value):
+    """数据库驱动返回的、JSON不能直接表示的值
+
+    与FastAPI的jsonable_encoder保持一致：整数值的Decimal输出为整数、其余为浮点数；
+    二进制值输出为base64文本。
+    """
+    if isinstance(value, decimal.Decimal):
+        return int(value) if value.is_finite() and value.as_tuple().exponent >= 0 else float(value)
+    if isinstance(value, (datetime.datetime, datetime.date, datetime.time)):
+        return value.isoformat()
+    if isinstance(value, (bytes, bytearray, memoryview)):
+        return base64.b64encode(bytes(value)).decode("ascii")
+    if isinstance(value, uuid.UUID):
+        return str(value)
+    if hasattr(value, "tolist"):  # numpy数组和标量
+        return value.tolist()
+    raise TypeError(f"Object of type {type(value).__name__} is not JSON serializable")
+
+def _finite(value):
+    """把NaN和正负无穷替换为None，与orjson的输出（null）保持一致"""
+    if isinstance(value, float):
+        return value if math.isfinite(value) else None
+    if isinstance(value, dict):
+        return {k: _finite(v) for k, v in value.items()}
+    if isinstance(value, (list, tuple)):
+        return [_finite(v) for v in value]
+    return value
+
+def dumps(content):
+    """序列化为UTF-8编码的紧凑JSON字节串，NaN和正负无穷输出为null"""
+    if orjson is not None:
+        return orjson.dumps(content, default=encode_value, option=orjson.OPT_NON_STR_KEYS | orjson.OPT_SERIALIZE_NUMPY)
+    return json.dumps(
+        _finite(content), ensure_ascii=False, allow_nan=False, separators=(",", ":"),
+        default=lambda value: _finite(encode_value(value))
+    ).encode("utf-8")
+
+class FastJSONResponse(JSONResponse):
+    """用orjson序列化的JSON响应
+
+    作为default_response_class时，普通接口的返回值仍先经过jsonable_encoder；
+    大列表接口直接返回FastJSONResponse(结果)可以跳过jsonable_encoder逐个值的转换。
+    """
+
+    def render(self, content):
+        return dumps(content)
@@ -0,0 +1,199 @@
+import logging
+import mimetypes
+from db_config import execute_query, run_in_db_executor
+from db_backend import get_dialect
+from query_cache import QueryCache
+from table_versions import add_change_listener, get_version_key
+
+logger = logging.getLogger(__name__)
+
+# SQL Server单条语句最多2100个参数，分块时留出余量
+MEDIA_CHUNK_SIZE = 1000
+
+DEFAULT_MEDIA_COLUMNS = ("ID", "关联类型", "关联id", "媒体类型", "文件名", "文件", "url")
+
+# 可以作为列名请求的计算列，避免只为判断有无文件而读取整个BLOB：列名 -> 按方言生成表达式的函数
+COMPUTED_MEDIA_COLUMNS = {
+    "文件大小": lambda dialect: dialect.byte_length("[文件]")
+}
+
+# 流式读取BLOB时每次从数据库取出的字节数
+MEDIA_STREAM_CHUNK_SIZE = 256 * 1024
+
+MEDIA_TABLES = ("多媒体文件",)
+
+# 内容哈希需要读取整个BLOB，按ID缓存；多媒体文件表版本变化或文件大小变化时重新计算
+_hash_cache = QueryCache(max_entries=4096, ttl=86400.0)
+add_change_listener(_hash_cache.invalidate)
+
+def _chunks(items, size):
+    for i in range(0, len(items), size):
+        yield items[i:i + size]
+
+def _unique_ids(related_ids):
+    """去重并保持顺序，None不参与查询"""
+    seen = set()
+    ids = []
+    for related_id in related_ids:
+        if related_id is None or related_id in seen:
+            continue
+        seen.add(related_id)
+        ids.append(related_id)
+    return ids
+
+def _column_sql(column):
+    if column in COMPUTED_MEDIA_COLUMNS:
+        return f"{COMPUTED_MEDIA_COLUMNS[column](get_dialect())} AS [{column}]"
+    return f"[{column}]"
+
+def _build_media_query(columns, count, related_type, first_only):
+    column_list = ", ".join(_column_sql(c) for c in columns)
+    placeholders = ", ".join("?" for _ in range(count))
+    where = f"[关联id] IN ({placeholders})"
+    if related_type is not None:
+        where += " AND [关联类型] = ?"
+    if not first_only:
+        return f"SELECT {column_list} FROM [多媒体文件] WHERE {where} ORDER BY [关联id], [ID]"
+    # 每个关联id只取ID最小的一条
+    outer_list = ", ".join(f"[{c}]" for c in columns)
+    return f"""
+    SELECT {outer_list} FROM (
+        SELECT {column_list},
+               ROW_NUMBER() OVER (PARTITION BY [关联id] ORDER BY [ID]) AS _rn
+        FROM [多媒体文件]
+        WHERE {where}
+    ) AS m
+    WHERE m._rn = 1
+    """
+
+def fetch_media(related_ids, related_type=None, columns=DEFAULT_MEDIA_COLUMNS,
+                first_only=False, chunk_size=MEDIA_CHUNK_SIZE):
+    """批量查询一组关联id的多媒体文件
+
+    Args:
+        related_ids (iterable): 关联id列表
+        related_type (str, optional): 关联类型过滤，如'岩石标本'
+        columns (tuple): 需要查询的列，必须包含关联id
+        first_only (bool): 每个关联id只返回第一条记录
+        chunk_size (int): 每条SQL语句包含的关联id数
+
+    Returns:
+        dict: 关联id(str) -> 记录列表（first_only时为单条记录）
+    """
+    columns = tuple(columns)
+    if "关联id" not in columns:
+        columns = columns + ("关联id",)
+    ids = _unique_ids(related_ids)
+    grouped = {}
+    for chunk in _chunks(ids, chunk_size):
+        query = _build_media_query(columns, len(chunk), related_type, first_only)
+        params = list(chunk)
+        if related_type is not None:
+            params.append(related_type)
+        rows = execute_query(query, tuple(params))
+        for row in rows:
+            row.pop("_rn", None)
+            # 关联id列可能是字符串，而调用方传入的可能是整数ID，统一按字符串匹配
+            key = str(row["关联id"])
+            if first_only:
+                grouped.setdefault(key, row)
+            else:
+                grouped.setdefault(key, []).append(row)
+    logger.debug(f"Fetched media for {len(ids)} related ids in "
+                 f"{(len(ids) + chunk_size - 1) // chunk_size if ids else 0} queries")
+    return grouped
+
+def fetch_first_media(related_ids, related_type=None, columns=DEFAULT_MEDIA_COLUMNS,
+                      chunk_size=MEDIA_CHUNK_SIZE):
+    """批量查询每个关联id的第一条多媒体文件，返回 关联id(str) -> 记录"""
+    return fetch_media(related_ids, related_type, columns, first_only=True, chunk_size=chunk_size)
+
+async def fetch_media_async(related_ids, related_type=None, columns=DEFAULT_MEDIA_COLUMNS,
+                            first_only=False, chunk_size=MEDIA_CHUNK_SIZE):
+    """fetch_media的异步版本"""
+    return await run_in_db_executor(fetch_media, related_ids, related_type, columns, first_only, chunk_size)
+
+async def fetch_first_media_async(related_ids, related_type=None, columns=DEFAULT_MEDIA_COLUMNS,
+                                  chunk_size=MEDIA_CHUNK_SIZE):
+    """fetch_first_media的异步版本"""
+    return await run_in_db_executor(fetch_media, related_ids, related_type, columns, True, chunk_size)
+
+def get_media_hash(media_id, size):
+    """文件内容的SHA-256（十六进制大写），同一表版本内按ID缓存，缓存的文件大小不一致时重新计算"""
+    hit, cached = _hash_cache.get(media_id)
+    if hit and cached[0] == size:
+        return cached[1]
+    version_key = get_version_key(MEDIA_TABLES)
+    query = f"SELECT {get_dialect().sha256_hex('[文件]')} AS [哈希] FROM [多媒体文件] WHERE [ID] = ?"
+    results = execute_query(query, (media_id,))
+    digest = results[0]["哈希"] if results else None
+    if digest is not None:
+        _hash_cache.put(media_id, (size, digest), MEDIA_TABLES, version_key=version_key)
+    return digest
+
+def get_media_info(media_id):
+    """查询单个多媒体文件的元数据（不读取BLOB内容，哈希走缓存）
+
+    Returns:
+        dict | None: 包含ID、媒体类型、文件名、url、文件大小和内容哈希，不存在时返回None
+    """
+    query = f"""
+    SELECT
+        [ID],
+        [媒体类型],
+        [文件名],
+        [url],
+        {get_dialect().byte_length("[文件]")} AS [文件大小]
+    FROM [多媒体文件]
+    WHERE [ID] = ?
+    """
+    results = execute_query(query, (media_id,))
+    if not results:
+        return None
+    info = results[0]
+    info["哈希"] = get_media_hash(media_id, info["文件大小"]) if info["文件大小"] else None
+    return info
+
+def read_media_blob(media_id):
+    """读取完整的BLOB内容，仅用于需要整体处理的场景（如生成缩略图）"""
+    results = execute_query("SELECT [文件] FROM [多媒体文件] WHERE [ID] = ?", (media_id,))
+    if not results or results[0]["文件"] is None:
+        return b""
+    data = results[0]["文件"]
+    if isinstance(data, memoryview):
+        data = data.tobytes()
+    return bytes(data)
+
+def read_media_chunk(media_id, offset, length):
+    """读取BLOB中从offset（0起）开始的length个字节"""
+    query = f"SELECT {get_dialect().substring('[文件]', '?', '?')} AS [数据] FROM [多媒体文件] WHERE [ID] = ?"
+    results = execute_query(query, (offset + 1, length, media_id))
+    if not results or results[0]["数据"] is None:
+        return b""
+    data = results[0]["数据"]
+    if isinstance(data, memoryview):
+        data = data.tobytes()
+    return bytes(data)
+
+async def iter_media_chunks(media_id, start, end, chunk_size=MEDIA_STREAM_CHUNK_SIZE):
+    """按块异步读取BLOB的[start, end]闭区间，每块单独查询，内存占用与文件大小无关"""
+    offset = start
+    while offset <= end:
+        length = min(chunk_size, end - offset + 1)
+        chunk = await run_in_db_executor(read_media_chunk, media_id, offset, length)
+        if not chunk:
+            break
+        yield chunk
+        offset += len(chunk)
+
+def media_content_type(media_type=None, file_name=None):
+    """根据媒体类型或文件名推断Content-Type"""
+    if media_type:
+        guessed, _ = mimetypes.guess_type(f"file.{media_type.strip().lower()}")
+        if guessed:
+            return guessed
+    if file_name:
+        guessed, _ = mimetypes.guess_type(file_name)
+        if guessed:
+            return guessed
+    return "application/octet-stream"
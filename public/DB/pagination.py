@@ -0,0 +1,66 @@
+import base64
+import json
+
+# 单页最大记录数
+MAX_PAGE_SIZE = 200
+DEFAULT_PAGE_SIZE = 50
+
+def encode_cursor(last_id):
+    """将本页最后一条记录的ID编码为不透明的游标字符串"""
+    raw = json.dumps({"id": last_id}, ensure_ascii=False).encode("utf-8")
+    return base64.urlsafe_b64encode(raw).decode("ascii").rstrip("=")
+
+def decode_cursor(cursor):
+    """解析游标，返回上一页最后一条记录的ID；格式错误时抛出ValueError"""
+    try:
+        padded = cursor + "=" * (-len(cursor) % 4)
+        data = json.loads(base64.urlsafe_b64decode(padded.encode("ascii")).decode("utf-8"))
+        last_id = data["id"]
+    except (ValueError, KeyError, TypeError) as e:
+        raise ValueError(f"Invalid cursor: {cursor}") from e
+    # 游标中的ID直接用于[ID] > ?比较，只接受整数
+    if isinstance(last_id, bool) or not isinstance(last_id, int):
+        raise ValueError(f"Invalid cursor: {cursor}")
+    return last_id
+
+def clamp_page_size(limit):
+    """限制每页记录数在1到MAX_PAGE_SIZE之间"""
+    if limit is None:
+        return DEFAULT_PAGE_SIZE
+    return max(1, min(int(limit), MAX_PAGE_SIZE))
+
+def parse_fields(fields, allowed, required=("ID",)):
+    """解析fields=逗号分隔的字段列表
+
+    Args:
+        fields (str | None): 请求参数，None表示全部字段
+        allowed (iterable): 允许的字段名（保持顺序）
+        required (tuple): 无论是否请求都返回的字段
+
+    Returns:
+        list: 需要返回的字段名
+
+    Raises:
+        ValueError: 请求了未知字段
+    """
+    allowed = list(allowed)
+    if not fields:
+        return allowed
+    requested = [f.strip() for f in fields.split(",") if f.strip()]
+    unknown = [f for f in requested if f not in allowed]
+    if unknown:
+        raise ValueError(f"Unknown fields: {', '.join(unknown)}")
+    selected = list(required) + [f for f in requested if f not in required]
+    return [f for f in allowed if f in selected]
+
+def page_envelope(items, limit, total, id_field="ID"):
+    """组装分页响应：items为查询到的limit+1条记录，多出的一条用于判断是否还有下一页"""
+    has_more = len(items) > limit
+    items = items[:limit]
+    return {
+        "items": items,
+        "total": total,
+        "limit": limit,
+        "has_more": has_more,
+        "next_cursor": encode_cursor(items[-1][id_field]) if has_more and items else None
+    }
@@ -0,0 +1,144 @@
+import logging
+import threading
+import time
+from collections import OrderedDict
+from db_config import execute_query, run_in_db_executor
+from table_versions import ALL_TABLES, add_change_listener, get_version_key
+
+logger = logging.getLogger(__name__)
+
+# 查询结果缓存配置
+CACHE_CONFIG = {
+    "max_entries": 512,  # LRU上限
+    "ttl": 300.0         # 默认过期秒数
+}
+
+class QueryCache:
+    """带TTL的LRU查询结果缓存
+
+    每条缓存记录依赖的表及其版本快照，表版本变化（导入、execute_update）后
+    对应记录自动失效；也可以通过invalidate()显式清除。
+    """
+
+    def __init__(self, max_entries=512, ttl=300.0):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self._entries = OrderedDict()  # key -> (value, 过期时间, 依赖表, 版本快照)
+        self._lock = threading.Lock()
+        self._stats = {
+            "hits": 0,
+            "misses": 0,
+            "expired": 0,
+            "stale": 0,
+            "evictions": 0,
+            "invalidations": 0
+        }
+
+    def get(self, key):
+        """返回(是否命中, 值)"""
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                self._stats["misses"] += 1
+                return False, None
+            value, expires_at, tables, version_key = entry
+            if time.monotonic() >= expires_at:
+                del self._entries[key]
+                self._stats["expired"] += 1
+                self._stats["misses"] += 1
+                return False, None
+        if get_version_key(tables) != version_key:
+            with self._lock:
+                self._entries.pop(key, None)
+                self._stats["stale"] += 1
+                self._stats["misses"] += 1
+            return False, None
+        with self._lock:
+            if key in self._entries:
+                self._entries.move_to_end(key)
+            self._stats["hits"] += 1
+        return True, value
+
+    def put(self, key, value, tables=(), ttl=None, version_key=None):
+        """写入缓存；version_key应在查询数据库之前获取，避免把旧数据记为新版本"""
+        tables = tuple(tables)
+        if version_key is None:
+            version_key = get_version_key(tables)
+        expires_at = time.monotonic() + (self.ttl if ttl is None else ttl)
+        with self._lock:
+            self._entries[key] = (value, expires_at, tables, version_key)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+                self._stats["evictions"] += 1
+
+    def invalidate(self, tables=None):
+        """清除依赖指定表的缓存，tables为None或包含ALL_TABLES时清空全部"""
+        with self._lock:
+            if tables is None or ALL_TABLES in tables:
+                removed = len(self._entries)
+                self._entries.clear()
+            else:
+                tables = set(tables)
+                keys = [k for k, entry in self._entries.items() if tables.intersection(entry[2])]
+                for k in keys:
+                    del self._entries[k]
+                removed = len(keys)
+            self._stats["invalidations"] += removed
+        return removed
+
+    def stats(self):
+        with self._lock:
+            stats = dict(self._stats)
+            stats["entries"] = len(self._entries)
+            stats["max_entries"] = self.max_entries
+        lookups = stats["hits"] + stats["misses"]
+        stats["hit_rate"] = stats["hits"] / lookups if lookups else 0.0
+        return stats
+
+_cache = QueryCache(**CACHE_CONFIG)
+add_change_listener(_cache.invalidate)
+
+def get_query_cache():
+    return _cache
+
+def _copy_rows(rows):
+    # 调用方会修改返回的字典，缓存中保存的结果不能被共享修改
+    return [dict(row) for row in rows]
+
+def cached_execute_query(query, params=None, tables=(), ttl=None):
+    """带缓存的execute_query
+
+    Args:
+        query (str): SQL查询语句
+        params (tuple, optional): 查询参数
+        tables (iterable): 查询依赖的表，任一表变化时缓存失效
+        ttl (float, optional): 过期秒数，默认CACHE_CONFIG["ttl"]
+    """
+    key = (query, tuple(params) if params else ())
+    hit, rows = _cache.get(key)
+    if hit:
+        return _copy_rows(rows)
+    version_key = get_version_key(tables)
+    rows = execute_query(query, params)
+    _cache.put(key, _copy_rows(rows), tables, ttl, version_key)
+    return rows
+
+async def cached_execute_query_async(query, params=None, tables=(), ttl=None):
+    """cached_execute_query的异步版本，命中时不占用查询线程"""
+    key = (query, tuple(params) if params else ())
+    hit, rows = _cache.get(key)
+    if hit:
+        return _copy_rows(rows)
+    version_key = get_version_key(tables)
+    rows = await run_in_db_executor(execute_query, query, params)
+    _cache.put(key, _copy_rows(rows), tables, ttl, version_key)
+    return rows
+
+def invalidate_cache(tables=None):
+    """显式清除缓存，返回清除的记录数"""
+    return _cache.invalidate(tables)
+
+def get_cache_stats():
+    """获取缓存命中率等统计"""
+    return _cache.stats()
@@ -0,0 +1,298 @@
+import heapq
+import logging
+import threading
+import time
+from collections import deque
+from db_config import execute_query
+from sample_ids import normalize_sample_id
+from table_versions import get_version_key
+
+logger = logging.getLogger(__name__)
+
+GRAPH_TABLES = ("关联关系", "岩石样品")
+
+# 单次邻域查询最多返回的节点数
+MAX_GRAPH_NODES = 2000
+
+def relation_strength(value):
+    """关联程度转为数值，无法转换时为0"""
+    try:
+        return float(value)
+    except (TypeError, ValueError):
+        return 0.0
+
+class _GraphSnapshot:
+    """一次构建的邻接表、边和名称，构建后不再修改
+
+    refresh整体替换RelationGraph._snapshot这一个属性；查询开始时取一次引用，
+    此后即使发生重建，读到的邻接表、名称和编号也始终属于同一版本。
+    """
+
+    def __init__(self, adjacency=None, edges=(), names=None, labels=None, version_key=None, built_at=None):
+        self.adjacency = adjacency or {}
+        self.edges = edges
+        self.names = names or {}
+        self.labels = labels or {}
+        self.version_key = version_key
+        self.built_at = built_at
+
+    def node(self, key, depth=None):
+        node = {"id": self.labels.get(key, key), "名称": self.names.get(key)}
+        if depth is not None:
+            node["depth"] = depth
+        return node
+
+class RelationGraph:
+    """关联关系的内存邻接表
+
+    一次读取关联关系和岩石样品名称构建无向图，节点按规范化编号合并，
+    每个节点的边按关联程度从高到低排序；关联关系或岩石样品表版本变化后下次访问时自动重建。
+    """
+
+    def __init__(self):
+        self._snapshot = _GraphSnapshot()
+        self._lock = threading.Lock()
+
+    def is_stale(self):
+        version_key = self._snapshot.version_key
+        return version_key is None or get_version_key(GRAPH_TABLES) != version_key
+
+    def refresh(self, force=False):
+        """重新从数据库加载关联关系（未过期且非强制时跳过）"""
+        with self._lock:
+            if not force and not self.is_stale():
+                return
+            version_key = get_version_key(GRAPH_TABLES)
+            start = time.monotonic()
+            names = {}
+            for row in execute_query("SELECT 编号, 名称 FROM 岩石样品"):
+                key = normalize_sample_id(row["编号"])
+                if key and key not in names:
+                    names[key] = row["名称"]
+            rows = execute_query(
+                "SELECT ID, 关联类型, 关联实体ID1, 关联实体ID2, 关联程度, 文件 FROM 关联关系"
+            )
+
+            adjacency = {}
+            labels = {}
+            edges = []
+            for row in rows:
+                a = normalize_sample_id(row["关联实体ID1"])
+                b = normalize_sample_id(row["关联实体ID2"])
+                if not a or not b:
+                    continue
+                edge = {
+                    **row,
+                    "实体1名称": names.get(a),
+                    "实体2名称": names.get(b),
+                    "_source": a,
+                    "_target": b,
+                    "_strength": relation_strength(row["关联程度"])
+                }
+                edges.append(edge)
+                labels.setdefault(a, row["关联实体ID1"])
+                labels.setdefault(b, row["关联实体ID2"])
+                adjacency.setdefault(a, []).append(edge)
+                if b != a:
+                    adjacency.setdefault(b, []).append(edge)
+            for neighbours in adjacency.values():
+                neighbours.sort(key=lambda e: e["_strength"], reverse=True)
+            edges.sort(key=lambda e: e["_strength"], reverse=True)
+
+            self._snapshot = _GraphSnapshot(adjacency, edges, names, labels, version_key, time.time())
+            logger.info(f"Relation graph rebuilt with {len(adjacency)} nodes and {len(edges)} edges in "
+                        f"{(time.monotonic() - start) * 1000:.1f} ms")
+
+    @staticmethod
+    def public_edge(edge):
+        """去掉内部字段后的边（与/api/relations返回的字段一致）"""
+        return {k: v for k, v in edge.items() if not k.startswith("_")}
+
+    def _accept(self, edge, min_strength, relation_type):
+        if min_strength is not None and edge["_strength"] < min_strength:
+            return False
+        return relation_type is None or edge["关联类型"] == relation_type
+
+    def relations(self, entity_id):
+        """实体的直接关联，按关联程度从高到低"""
+        return [self.public_edge(e) for e in self._snapshot.adjacency.get(normalize_sample_id(entity_id), [])]
+
+    def neighborhood(self, entity_id, depth=1, max_nodes=MAX_GRAPH_NODES, per_node=None,
+                     min_strength=None, relation_type=None):
+        """k跳邻域（广度优先）
+
+        Args:
+            entity_id (str): 起始实体编号
+            depth (int): 最大跳数
+            max_nodes (int): 最多返回的节点数
+            per_node (int | None): 每个节点最多展开的边数（取关联程度最高的）
+            min_strength (float | None): 忽略关联程度低于该值的边
+            relation_type (str | None): 只沿该关联类型的边展开
+
+        Returns:
+            dict | None: {"root", "nodes", "edges", "truncated"}，实体不存在时为None
+        """
+        snapshot = self._snapshot
+        root = normalize_sample_id(entity_id)
+        if root not in snapshot.adjacency:
+            return None
+        depths = {root: 0}
+        edge_ids = set()
+        edges = []
+        truncated = False
+        queue = deque([root])
+        while queue:
+            key = queue.popleft()
+            if depths[key] >= depth:
+                continue
+            expanded = 0
+            for edge in snapshot.adjacency.get(key, []):
+                if not self._accept(edge, min_strength, relation_type):
+                    continue
+                if per_node is not None and expanded >= per_node:
+                    break
+                expanded += 1
+                other = edge["_target"] if edge["_source"] == key else edge["_source"]
+                if other not in depths:
+                    if len(depths) >= max_nodes:
+                        truncated = True
+                        continue
+                    depths[other] = depths[key] + 1
+                    queue.append(other)
+                if id(edge) not in edge_ids:
+                    edge_ids.add(id(edge))
+                    edges.append(self.public_edge(edge))
+        return {
+            "root": snapshot.node(root, 0),
+            "nodes": [snapshot.node(key, d) for key, d in depths.items()],
+            "edges": edges,
+            "truncated": truncated
+        }
+
+    def shortest_path(self, source_id, target_id, max_depth=6, strongest=False):
+        """两个实体之间的最短关联路径
+
+        Args:
+            max_depth (int): 路径的最大跳数
+            strongest (bool): False时选择跳数最少的路径；True时选择max_depth跳以内整体关联最强的路径
+                              （每条边的代价为1/关联程度）
+
+        Returns:
+            dict | None: {"nodes", "edges", "hops"}，不连通或超过max_depth时为None
+        """
+        snapshot = self._snapshot
+        source = normalize_sample_id(source_id)
+        target = normalize_sample_id(target_id)
+        if source not in snapshot.adjacency or target not in snapshot.adjacency:
+            return None
+        if strongest:
+            return self._strongest_path(snapshot, source, target, max_depth)
+        previous = {source: None}
+        queue = deque([(source, 0)])
+        while queue:
+            key, d = queue.popleft()
+            if key == target or d >= max_depth:
+                continue
+            for edge in snapshot.adjacency[key]:
+                other = edge["_target"] if edge["_source"] == key else edge["_source"]
+                if other not in previous:
+                    previous[other] = (key, edge)
+                    if other == target:
+                        queue.clear()
+                        break
+                    queue.append((other, d + 1))
+        if target not in previous:
+            return None
+        nodes = [target]
+        edges = []
+        key = target
+        while previous[key] is not None:
+            key, edge = previous[key]
+            nodes.append(key)
+            edges.append(edge)
+        return self._path(snapshot, nodes[::-1], edges[::-1])
+
+    def _strongest_path(self, snapshot, source, target, max_depth):
+        """限定跳数的最强路径：在 (节点, 已走跳数) 状态上做Dijkstra
+
+        只按节点记录最小代价时，代价低但跳数多的路径会挡住代价稍高、跳数更少的路径，
+        后者才可能在max_depth内到达目标；按状态搜索则能找到限定跳数内的最优解。
+        同一节点上代价更低且跳数不多于当前状态的已出堆状态支配当前状态，可以跳过，
+        所以每个节点最多出堆max_depth+1次。
+        """
+        start = (source, 0)
+        costs = {start: 0.0}
+        previous = {start: None}
+        settled_hops = {}
+        heap = [(0.0, 0, start)]
+        counter = 0
+        found = None
+        while heap:
+            cost, _, state = heapq.heappop(heap)
+            key, hops = state
+            if cost > costs[state] or settled_hops.get(key, max_depth + 1) <= hops:
+                continue
+            settled_hops[key] = hops
+            if key == target:
+                found = state
+                break
+            if hops >= max_depth:
+                continue
+            for edge in snapshot.adjacency[key]:
+                other = edge["_target"] if edge["_source"] == key else edge["_source"]
+                next_state = (other, hops + 1)
+                new_cost = cost + 1.0 / max(edge["_strength"], 1e-6)
+                if new_cost < costs.get(next_state, float("inf")):
+                    costs[next_state] = new_cost
+                    previous[next_state] = (state, edge)
+                    counter += 1
+                    heapq.heappush(heap, (new_cost, counter, next_state))
+        if found is None:
+            return None
+        nodes = [found[0]]
+        edges = []
+        state = found
+        while previous[state] is not None:
+            state, edge = previous[state]
+            nodes.append(state[0])
+            edges.append(edge)
+        return self._path(snapshot, nodes[::-1], edges[::-1])
+
+    def _path(self, snapshot, keys, edges):
+        return {"nodes": [snapshot.node(k) for k in keys], "edges": [self.public_edge(e) for e in edges], "hops": len(edges)}
+
+    def top(self, n=10, entity_id=None, relation_type=None):
+        """关联程度最高的n条关联；指定entity_id时只看该实体的关联"""
+        snapshot = self._snapshot
+        if entity_id is not None:
+            candidates = snapshot.adjacency.get(normalize_sample_id(entity_id), [])
+        else:
+            candidates = snapshot.edges
+        results = []
+        for edge in candidates:
+            if relation_type is not None and edge["关联类型"] != relation_type:
+                continue
+            results.append(self.public_edge(edge))
+            if len(results) >= n:
+                break
+        return results
+
+    def busiest(self, n=10):
+        """关联数最多的n个实体编号（按关联数从多到少）"""
+        snapshot = self._snapshot
+        ranked = heapq.nlargest(n, snapshot.adjacency.items(), key=lambda item: len(item[1]))
+        return [snapshot.labels.get(key, key) for key, _ in ranked]
+
+    def stats(self):
+        snapshot = self._snapshot
+        return {
+            "nodes": len(snapshot.adjacency),
+            "edges": len(snapshot.edges),
+            "built_at": snapshot.built_at,
+            "stale": self.is_stale()
+        }
+
+_graph = RelationGraph()
+
+def get_relation_graph():
+    return _graph
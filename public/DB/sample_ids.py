@@ -0,0 +1,116 @@
+import logging
+from db_config import get_db_connection
+from db_backend import get_dialect
+
+logger = logging.getLogger(__name__)
+
+# 需要按样品编号查询的表及其编号列；每列对应一个持久化的规范化计算列并建立索引
+SAMPLE_ID_COLUMNS = {
+    "岩石样品": ("编号",),
+    "薄片鉴定报告": ("编号",),
+    "XRF测试结果": ("编号",),
+    "关联关系": ("关联实体ID1", "关联实体ID2")
+}
+
+# 规范化时去掉的空白字符：半角空格、全角空格、制表符
+_WHITESPACE = (" ", "　", "\t")
+
+# 规范化列的长度上限，保证可以建索引
+KEY_LENGTH = 255
+
+# 服务启动时确认已有规范化列的 (表名, 编号列)；不在其中的按原编号列比较（较慢但结果正确）
+_available_keys = set()
+
+def normalize_sample_id(sample_id):
+    """样品编号的规范形式：去掉所有空白并转为大写，与key_expression()的SQL表达式保持一致
+
+    例如 "Y 2 0 1 9" / "y2019" / "Y2019" 都规范化为 "Y2019"
+    """
+    if sample_id is None:
+        return None
+    text = str(sample_id)
+    for ch in _WHITESPACE:
+        text = text.replace(ch, "")
+    return text.upper()[:KEY_LENGTH]
+
+def key_column(column):
+    """编号列对应的规范化列名"""
+    return f"{column}_规范"
+
+def key_expression(column, dialect=None):
+    """计算规范化编号的SQL表达式（确定性表达式，可作为持久化计算列并建索引）"""
+    dialect = dialect or get_dialect()
+    expression = f"[{column}]"
+    for ch in _WHITESPACE:
+        char_sql = "' '" if ch == " " else dialect.char(ord(ch))
+        expression = f"REPLACE({expression}, {char_sql}, '')"
+    return dialect.cast_text(f"UPPER({expression})", KEY_LENGTH)
+
+def ensure_sample_id_keys(cursor, table_name, columns=None):
+    """为表中配置的编号列建立规范化列和索引（已存在时跳过）
+
+    Args:
+        cursor: 数据库游标
+        table_name (str): 表名，不在SAMPLE_ID_COLUMNS中时不做任何操作
+        columns (iterable | None): 需要处理的列，为None时处理所有配置的列
+
+    Returns:
+        list: 处理过的编号列
+    """
+    configured = SAMPLE_ID_COLUMNS.get(table_name, ())
+    if not configured:
+        return []
+    dialect = get_dialect()
+    existing = dialect.column_types(cursor, table_name)
+    handled = []
+    for column in configured:
+        if column not in existing or (columns is not None and column not in columns):
+            continue
+        key = key_column(column)
+        if key not in existing:
+            cursor.execute(dialect.add_computed_column(table_name, key, key_expression(column, dialect)))
+        cursor.execute(dialect.create_index(f"IX_{table_name}_{key}", table_name, [key]))
+        handled.append(column)
+    return handled
+
+def ensure_all_sample_id_keys():
+    """为所有已存在的配置表建立规范化列和索引，用于已有数据库的迁移和服务启动时的检查
+
+    成功的编号列记入_available_keys，sample_id_condition据此选择查询方式；
+    某张表迁移失败时只记录错误，该表的查询退回按原编号列比较，而不是因缺少规范化列而全部失败。
+    """
+    with get_db_connection() as conn:
+        cursor = conn.cursor()
+        for table_name, columns in SAMPLE_ID_COLUMNS.items():
+            _available_keys.difference_update((table_name, column) for column in columns)
+            try:
+                handled = ensure_sample_id_keys(cursor, table_name)
+                if not handled:
+                    logger.warning(f"表 {table_name} 不存在，跳过编号规范化")
+                conn.commit()
+                _available_keys.update((table_name, column) for column in handled)
+            except Exception as e:
+                conn.rollback()
+                logger.error(f"为表 {table_name} 建立规范化编号列失败，该表将按原编号列查询: {str(e)}")
+
+def sample_id_condition(table_name, column, sample_id):
+    """按样品编号查找的WHERE条件和参数
+
+    规范化列可用时按规范化编号一次索引查找；否则（迁移失败、服务启动时表还不存在）
+    退回原编号列上的比较，匹配原样输入和去掉空白后的写法。
+
+    Returns:
+        tuple: (条件SQL, 参数元组)
+    """
+    if (table_name, column) in _available_keys:
+        return f"[{key_column(column)}] = ?", (normalize_sample_id(sample_id),)
+    text = str(sample_id)
+    compact = text
+    for ch in _WHITESPACE:
+        compact = compact.replace(ch, "")
+    return f"([{column}] = ? OR [{column}] = ?)", (text, compact)
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO)
+    ensure_all_sample_id_keys()
+    print("规范化编号列和索引已就绪")
@@ -0,0 +1,259 @@
+import datetime
+import re
+from decimal import Decimal, InvalidOperation
+from db_backend import get_dialect
+
+# 标识类列始终按字符串存储（如“007”这样的编号不能变成整数）
+TEXT_KEY_COLUMNS = ("编号", "关联id", "关联类型", "关联实体ID1", "关联实体ID2", "样品编号")
+
+# api_server按这些列查询，建表时为其建立索引
+INDEX_COLUMNS = ("编号", "关联id", "关联类型", "关联实体ID1", "关联实体ID2")
+
+# 字符串列长度档位
+STRING_LENGTHS = (50, 100, 255, 500, 1000, 4000)
+
+# DECIMAL小数位超过该值时改用FLOAT（通常是浮点误差造成的长尾小数）
+MAX_DECIMAL_SCALE = 10
+
+DATE_FORMATS = ("%Y-%m-%d %H:%M:%S", "%Y-%m-%d", "%Y/%m/%d %H:%M:%S", "%Y/%m/%d", "%Y-%m-%dT%H:%M:%S")
+
+_INT_RE = re.compile(r"^[+-]?(0|[1-9]\d*)$")
+_LEADING_ZERO_RE = re.compile(r"^[+-]?0\d")
+_DECIMAL_RE = re.compile(r"^[+-]?(\d+)?(?:\.(\d+))?$")
+_FLOAT_RE = re.compile(r"^[+-]?(\d+\.?\d*|\.\d+)([eE][+-]?\d+)?$")
+
+def _parse_date(text):
+    for fmt in DATE_FORMATS:
+        try:
+            return datetime.datetime.strptime(text, fmt)
+        except ValueError:
+            continue
+    return None
+
+def _string_type(max_length, complete):
+    # 只看了部分数据时预留余量
+    needed = max_length if complete else max_length * 2
+    for length in STRING_LENGTHS:
+        if needed <= length:
+            return f"NVARCHAR({length})"
+    return "NVARCHAR(MAX)"
+
+class ColumnProfile:
+    """逐值累计单列的取值特征（长度、是否都是整数/小数/日期等），不保存值本身
+
+    流式导入可以逐块扫描整个工作表再推断类型，内存占用与行数无关。
+    """
+
+    def __init__(self, name):
+        self.name = name
+        self.present = 0
+        self.has_null = False
+        self.max_length = 0
+        self.leading_zero = False
+        self.largest = 0
+        self.integer_digits = 0
+        self.scale = 0
+        self.has_time = False
+        # 标识类列始终按字符串存储，不必检查数值和日期格式
+        numeric = name not in TEXT_KEY_COLUMNS
+        self.is_int = self.is_decimal = self.is_float = self.is_date = numeric
+
+    def add(self, values):
+        for value in values:
+            text = "" if value is None else (value if isinstance(value, str) else str(value)).strip()
+            if text == "":
+                self.has_null = True
+                continue
+            self.present += 1
+            if len(text) > self.max_length:
+                self.max_length = len(text)
+            if self.leading_zero or not (self.is_int or self.is_decimal or self.is_float or self.is_date):
+                continue
+            if _LEADING_ZERO_RE.match(text):
+                self.leading_zero = True
+                continue
+            if self.is_int:
+                if _INT_RE.match(text):
+                    self.largest = max(self.largest, abs(int(text)))
+                else:
+                    self.is_int = False
+            if self.is_decimal:
+                match = _DECIMAL_RE.match(text)
+                if match and (match.group(1) or match.group(2)):
+                    self.integer_digits = max(self.integer_digits, len((match.group(1) or "").lstrip("0")))
+                    self.scale = max(self.scale, len(match.group(2) or ""))
+                else:
+                    self.is_decimal = False
+            numeric = _FLOAT_RE.match(text)
+            if self.is_float and not numeric:
+                self.is_float = False
+            if self.is_date:
+                date = None if numeric else _parse_date(text)
+                if date is None:
+                    self.is_date = False
+                elif date.time() != datetime.time():
+                    self.has_time = True
+
+    def column(self, complete=True):
+        """能容纳已见全部值的列类型
+
+        Args:
+            complete (bool): 是否已经看过全部行，决定能否设为NOT NULL以及字符串长度余量
+
+        Returns:
+            dict: {"name", "sql_type", "nullable"}
+        """
+        name = self.name
+        nullable = self.has_null or not complete
+        if name.upper() == "ID":
+            return {"name": name, "sql_type": "BIGINT" if self.is_int and self.largest >= 2 ** 31 else "INT",
+                    "nullable": False}
+        if not self.present:
+            return {"name": name, "sql_type": "NVARCHAR(255)", "nullable": True}
+        if self.leading_zero:
+            # 带前导零的数字通常是编码，按字符串保存
+            return {"name": name, "sql_type": _string_type(self.max_length, complete), "nullable": nullable}
+        if self.is_int:
+            largest = self.largest
+            sql_type = "INT" if largest < 2 ** 31 else "BIGINT" if largest < 2 ** 63 else "DECIMAL(38, 0)"
+            return {"name": name, "sql_type": sql_type, "nullable": nullable}
+        if self.is_decimal:
+            integer_digits = self.integer_digits or 1
+            if self.scale <= MAX_DECIMAL_SCALE and integer_digits + self.scale <= 38:
+                # 整数部分预留一位余量
+                precision = min(integer_digits + 1 + self.scale, 38)
+                return {"name": name, "sql_type": f"DECIMAL({precision}, {self.scale})", "nullable": nullable}
+            return {"name": name, "sql_type": "FLOAT", "nullable": nullable}
+        if self.is_float:
+            return {"name": name, "sql_type": "FLOAT", "nullable": nullable}
+        if self.is_date:
+            return {"name": name, "sql_type": "DATETIME2" if self.has_time else "DATE", "nullable": nullable}
+        return {"name": name, "sql_type": _string_type(self.max_length, complete), "nullable": nullable}
+
+def infer_column(name, values, complete=True):
+    """根据采样值推断单列的SQL Server类型
+
+    Args:
+        name (str): 列名
+        values (iterable): 采样值（字符串或None）
+        complete (bool): 采样是否覆盖了全部行，决定能否设为NOT NULL以及字符串长度余量
+
+    Returns:
+        dict: {"name", "sql_type", "nullable"}
+    """
+    profile = ColumnProfile(name)
+    profile.add(values)
+    return profile.column(complete)
+
+def infer_schema(columns, sample_rows, complete=True):
+    """推断整张表的列类型，sample_rows为行元组列表"""
+    return infer_schema_from_chunks(columns, [sample_rows], complete)
+
+def infer_schema_from_chunks(columns, chunks, complete=True):
+    """逐块扫描行数据推断列类型，只保留每列的取值特征，适合流式读取的整个工作表"""
+    profiles = [ColumnProfile(name) for name in columns]
+    for chunk in chunks:
+        for i, profile in enumerate(profiles):
+            profile.add(row[i] for row in chunk)
+    return [profile.column(complete) for profile in profiles]
+
+def build_create_table(schema, table_name):
+    """根据推断结果生成建表语句（表已存在时不做任何修改）"""
+    dialect = get_dialect()
+    columns = []
+    for column in schema:
+        definition = f"[{column['name']}] {dialect.column_type(column['sql_type'])}"
+        if column["name"].upper() == "ID":
+            definition += " PRIMARY KEY"
+        elif not column["nullable"]:
+            definition += " NOT NULL"
+        columns.append(definition)
+    return dialect.create_table(table_name, columns)
+
+def propose_indexes(schema, table_name):
+    """为api_server查询用到的键列生成建索引语句（NVARCHAR(MAX)列无法建索引，跳过）"""
+    dialect = get_dialect()
+    return [
+        dialect.create_index(f"IX_{table_name}_{column['name']}", table_name, [column["name"]])
+        for column in schema
+        if column["name"] in INDEX_COLUMNS and column["sql_type"] != "NVARCHAR(MAX)"
+    ]
+
+def format_schema_preview(table_name, schema, index_statements):
+    """生成便于阅读的表结构预览文本"""
+    lines = [f"表 {table_name}:"]
+    width = max((len(c["name"]) for c in schema), default=0)
+    for column in schema:
+        null_text = "NULL" if column["nullable"] else "NOT NULL"
+        lines.append(f"  {column['name']:<{width}}  {column['sql_type']:<16} {null_text}")
+    for statement in index_statements:
+        text = " ".join(statement.split())
+        lines.append("  " + text[text.index("CREATE INDEX"):])
+    return "\n".join(lines)
+
+def load_column_types(cursor, table_name):
+    """查询表中各列的实际类型：列名 -> (DATA_TYPE, NUMERIC_SCALE)"""
+    return get_dialect().column_types(cursor, table_name)
+
+def _to_int(text):
+    if _INT_RE.match(text):
+        return int(text)
+    value = Decimal(text)
+    if value != value.to_integral_value():
+        raise ValueError(f"{text} is not an integer")
+    return int(value)
+
+def _to_datetime(text):
+    value = _parse_date(text)
+    if value is None:
+        raise ValueError(f"{text} is not a date")
+    return value
+
+_CONVERTERS = {
+    "int": _to_int,
+    "bigint": _to_int,
+    "smallint": _to_int,
+    "tinyint": _to_int,
+    "decimal": Decimal,
+    "numeric": Decimal,
+    "float": float,
+    "real": float,
+    "date": lambda text: _to_datetime(text).date(),
+    "datetime": _to_datetime,
+    "datetime2": _to_datetime,
+    "smalldatetime": _to_datetime,
+    "bit": lambda text: text.strip().lower() in ("1", "true", "是")
+}
+
+def converters_for_table(cursor, table_name, columns):
+    """按目标表实际列类型生成每列的转换函数，字符串列为None（不转换）"""
+    types = load_column_types(cursor, table_name)
+    return [_CONVERTERS.get(types.get(column, ("nvarchar", None))[0]) for column in columns]
+
+def convert_rows(rows, converters, columns):
+    """将字符串行转换为目标列类型
+
+    新建的表按全部行推断类型，所有值都能转换；无法转换说明已有表的列类型与文件不符，
+    此时抛出ValueError（由调用方回滚整个文件），而不是把值悄悄置为空。
+    """
+    if not any(converters):
+        yield from rows
+        return
+    for row in rows:
+        converted = []
+        for i, value in enumerate(row):
+            converter = converters[i]
+            if converter is None or value is None or not isinstance(value, str):
+                converted.append(value)
+                continue
+            text = value.strip()
+            if text == "":
+                converted.append(None)
+                continue
+            try:
+                converted.append(converter(text))
+            except (ValueError, InvalidOperation):
+                raise ValueError(
+                    f"列 '{columns[i]}' 的值 '{text}' 无法转换为表中该列的类型，请检查数据或调整表结构"
+                ) from None
+        yield tuple(converted)
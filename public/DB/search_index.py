@@ -0,0 +1,265 @@
+import logging
+import math
+import re
+import threading
+import time
+import unicodedata
+from collections import defaultdict
+from db_config import execute_query
+from table_versions import get_version_key
+
+logger = logging.getLogger(__name__)
+
+# 参与全文检索的字段及权重
+SEARCH_FIELDS = {
+    "基本名称": 3.0,
+    "主要成分": 2.0,
+    "特殊结构": 1.0,
+    "特殊矿物": 1.0
+}
+
+# 检索结果中返回的列（与/api/rock-samples列表一致）
+RESULT_COLUMNS = """
+    [ID],
+    [系（与组并非等时对应）] as '系',
+    [组段],
+    [基本名称],
+    [颜色],
+    [主要成分],
+    [粒度（主要）] as '粒度',
+    [特殊结构],
+    [特殊矿物],
+    [岩石类别]
+"""
+
+SEARCH_TABLES = ("岩石标本",)
+
+# 完整包含查询串时的额外得分倍数
+PHRASE_BOOST = 2.0
+
+# 超过该数量的候选结果不再转换为ID IN (...)条件
+MAX_ID_FILTER = 1000
+
+_SEGMENT_RE = re.compile(r"\w+")
+
+def normalize(text):
+    """全角转半角、小写化"""
+    return unicodedata.normalize("NFKC", str(text)).lower()
+
+def tokenize(text):
+    """字符一元 + 二元切分，返回词元列表（含重复）
+
+    中文没有空格分词，按字符二元组建立索引即可支持任意子串查询；
+    一元组用于单字查询。
+    """
+    tokens = []
+    for segment in _SEGMENT_RE.findall(normalize(text)):
+        tokens.extend(segment)
+        tokens.extend(segment[i:i + 2] for i in range(len(segment) - 1))
+    return tokens
+
+def query_tokens(text):
+    """查询串的词元：多字时只用二元组，单字时用一元组"""
+    tokens = []
+    for segment in _SEGMENT_RE.findall(normalize(text)):
+        if len(segment) == 1:
+            tokens.append(segment)
+        else:
+            tokens.extend(segment[i:i + 2] for i in range(len(segment) - 1))
+    return list(dict.fromkeys(tokens))
+
+def highlight(text, query, pre="<em>", post="</em>"):
+    """将text中与查询词元匹配的部分用pre/post包裹"""
+    if not text:
+        return text
+    text = str(text)
+    normalized = normalize(text)
+    if len(normalized) != len(text):
+        # NFKC改变了长度（罕见），无法按位置对应，直接返回原文
+        return text
+    marked = [False] * len(text)
+    for token in query_tokens(query):
+        start = normalized.find(token)
+        while start != -1:
+            for i in range(start, start + len(token)):
+                marked[i] = True
+            start = normalized.find(token, start + 1)
+    parts = []
+    i = 0
+    while i < len(text):
+        j = i
+        while j < len(text) and marked[j] == marked[i]:
+            j += 1
+        parts.append(f"{pre}{text[i:j]}{post}" if marked[i] else text[i:j])
+        i = j
+    return "".join(parts)
+
+class _SearchSnapshot:
+    """一次构建的倒排表和文档，构建后不再修改
+
+    refresh整体替换SearchIndex._snapshot这一个属性；查询开始时取一次引用，
+    此后即使发生重建，读到的倒排表、文档和字段长度也始终属于同一版本。
+    """
+
+    def __init__(self, postings=None, docs=None, field_lengths=None, avg_length=None, version_key=None, built_at=None):
+        self.postings = postings or {}
+        self.docs = docs or {}
+        self.field_lengths = field_lengths or {}
+        self.avg_length = avg_length or {}
+        self.version_key = version_key
+        self.built_at = built_at
+
+class SearchIndex:
+    """岩石标本文本字段的倒排索引
+
+    按字符二元组建立 词元 -> {ID: {字段: 词频}} 的倒排表，支持多字段加权排序、
+    子串精确过滤和高亮；岩石标本表版本变化后下次访问时自动重建。
+    """
+
+    def __init__(self):
+        self._snapshot = _SearchSnapshot()
+        self._lock = threading.Lock()
+
+    def is_stale(self):
+        version_key = self._snapshot.version_key
+        return version_key is None or get_version_key(SEARCH_TABLES) != version_key
+
+    def refresh(self, force=False):
+        """重新从数据库构建索引（索引未过期且非强制时跳过）"""
+        with self._lock:
+            if not force and not self.is_stale():
+                return
+            version_key = get_version_key(SEARCH_TABLES)
+            start = time.monotonic()
+            rows = execute_query(f"SELECT {RESULT_COLUMNS} FROM [岩石标本]")
+
+            postings = defaultdict(lambda: defaultdict(dict))
+            docs = {}
+            field_lengths = {}
+            for row in rows:
+                doc_id = row["ID"]
+                docs[doc_id] = row
+                lengths = {}
+                for field in SEARCH_FIELDS:
+                    tokens = tokenize(row.get(field) or "")
+                    lengths[field] = len(tokens)
+                    for token in tokens:
+                        fields = postings[token][doc_id]
+                        fields[field] = fields.get(field, 0) + 1
+                field_lengths[doc_id] = lengths
+
+            count = len(docs) or 1
+            avg_length = {
+                field: sum(l[field] for l in field_lengths.values()) / count or 1.0
+                for field in SEARCH_FIELDS
+            }
+            snapshot = _SearchSnapshot(
+                {token: dict(entries) for token, entries in postings.items()},
+                docs, field_lengths, avg_length, version_key, time.time()
+            )
+            self._snapshot = snapshot
+            logger.info(f"Search index built: {len(docs)} documents, {len(snapshot.postings)} tokens in "
+                        f"{(time.monotonic() - start) * 1000:.1f} ms")
+
+    @staticmethod
+    def _candidates(postings, tokens, fields):
+        """包含全部查询词元（在指定字段中）的文档ID集合"""
+        candidates = None
+        for token in sorted(tokens, key=lambda t: len(postings.get(t, ()))):
+            entries = postings.get(token)
+            if not entries:
+                return set()
+            ids = {doc_id for doc_id, tf in entries.items() if any(f in tf for f in fields)}
+            candidates = ids if candidates is None else candidates & ids
+            if not candidates:
+                return set()
+        return candidates or set()
+
+    def match_ids(self, field, text):
+        """字段包含text子串的文档ID集合（与LIKE '%text%'一致）
+
+        text没有可索引的词元（如只有标点）时逐个文档比较子串，字段为NULL的文档不匹配
+        """
+        snapshot = self._snapshot
+        docs = snapshot.docs
+        tokens = query_tokens(text)
+        if not tokens:
+            needle = normalize(text)
+            return {
+                doc_id for doc_id, doc in docs.items()
+                if doc.get(field) is not None and needle in normalize(doc[field])
+            }
+        needle = normalize(text).strip()
+        return {
+            doc_id for doc_id in self._candidates(snapshot.postings, tokens, (field,))
+            if needle in normalize(docs[doc_id].get(field) or "")
+        }
+
+    def search(self, query, fields=None, limit=20):
+        """多字段检索，按BM25得分排序
+
+        Args:
+            query (str): 查询串
+            fields (iterable, optional): 限定检索的字段，默认全部SEARCH_FIELDS
+            limit (int): 返回结果数上限
+
+        Returns:
+            list: [{"ID", "score", "highlights", 以及RESULT_COLUMNS中的各列}]
+        """
+        fields = [f for f in (fields or SEARCH_FIELDS) if f in SEARCH_FIELDS]
+        tokens = query_tokens(query)
+        if not tokens or not fields:
+            return []
+        needle = normalize(query).strip()
+        snapshot = self._snapshot
+        postings = snapshot.postings
+        total = len(snapshot.docs) or 1
+        k1, b = 1.2, 0.75
+
+        scored = []
+        for doc_id in self._candidates(postings, tokens, fields):
+            doc = snapshot.docs[doc_id]
+            lengths = snapshot.field_lengths[doc_id]
+            score = 0.0
+            matched_fields = []
+            for field in fields:
+                field_score = 0.0
+                for token in tokens:
+                    tf = postings[token][doc_id].get(field, 0) if doc_id in postings[token] else 0
+                    if not tf:
+                        continue
+                    idf = math.log(1 + (total - len(postings[token]) + 0.5) / (len(postings[token]) + 0.5))
+                    norm = k1 * (1 - b + b * lengths[field] / snapshot.avg_length[field])
+                    field_score += idf * tf * (k1 + 1) / (tf + norm)
+                if field_score:
+                    if needle in normalize(doc.get(field) or ""):
+                        field_score *= PHRASE_BOOST
+                    score += SEARCH_FIELDS[field] * field_score
+                    matched_fields.append(field)
+            if score:
+                scored.append((score, doc_id, matched_fields))
+
+        scored.sort(key=lambda item: (-item[0], str(item[1])))
+        results = []
+        for score, doc_id, matched_fields in scored[:limit]:
+            doc = snapshot.docs[doc_id]
+            results.append({
+                **doc,
+                "score": round(score, 4),
+                "highlights": {f: highlight(doc.get(f), query) for f in matched_fields}
+            })
+        return results
+
+    def stats(self):
+        snapshot = self._snapshot
+        return {
+            "documents": len(snapshot.docs),
+            "tokens": len(snapshot.postings),
+            "built_at": snapshot.built_at,
+            "stale": self.is_stale()
+        }
+
+_index = SearchIndex()
+
+def get_search_index():
+    return _index
@@ -0,0 +1,259 @@
+import logging
+import threading
+import time
+import numpy as np
+from db_config import execute_query
+from sample_ids import normalize_sample_id
+from table_versions import get_version_key
+from xrf_analytics import XRF_ELEMENTS
+
+logger = logging.getLogger(__name__)
+
+# 可用于相似检索的特征集：来源表和参与比较的数值列
+SIMILARITY_FEATURES = {
+    "xrf": {"table": "XRF测试结果", "columns": XRF_ELEMENTS},
+    "thin_section": {"table": "薄片鉴定报告", "columns": ("石英含量", "长石含量", "岩屑含量")}
+}
+
+SIMILARITY_METRICS = ("euclidean", "cosine")
+
+# 单次相似检索最多返回的样品数
+MAX_SIMILAR_RESULTS = 200
+
+# 批量检索时距离矩阵分块的最大元素数（控制临时内存，约32MB的float32）
+BLOCK_ELEMENTS = 8_000_000
+
+def parse_number(value):
+    """数值或"35%"之类的文本转为浮点数，无法解析时为NaN"""
+    if isinstance(value, str):
+        value = value.strip().rstrip("%")
+    try:
+        return float(value)
+    except (TypeError, ValueError):
+        return np.nan
+
+def _finite_or_none(value):
+    return None if np.isnan(value) else float(value)
+
+def _read_only(array):
+    array.flags.writeable = False
+    return array
+
+class _SimilaritySnapshot:
+    """一次构建的全部索引数据，构建后不再修改
+
+    build整体替换SimilarityIndex._snapshot这一个属性；检索开始时取一次引用，
+    编号、位置和向量矩阵因此始终属于同一版本，不会在重建过程中错位。
+    """
+
+    def __init__(self, columns, keys=(), labels=(), raw=None, vectors=None, square_norms=None, units=None,
+                 mean=None, scale=None, version_key=None, built_at=None):
+        width = len(columns)
+        self.keys = tuple(keys)
+        self.labels = tuple(labels)
+        self.positions = {k: i for i, k in enumerate(self.keys)}
+        self.raw = _read_only(np.empty((0, width)) if raw is None else raw)
+        self.vectors = _read_only(np.empty((0, width), dtype=np.float32) if vectors is None else vectors)
+        self.square_norms = _read_only(np.empty(0, dtype=np.float32) if square_norms is None else square_norms)
+        self.units = _read_only(np.empty((0, width), dtype=np.float32) if units is None else units)
+        self.mean = mean
+        self.scale = scale
+        self.version_key = version_key
+        self.built_at = built_at
+
+    @property
+    def samples(self):
+        return len(self.keys)
+
+class SimilarityIndex:
+    """按成分向量查找相似样品的内存索引
+
+    同一编号（规范化后）的多条记录取各列均值作为该样品的原始向量，
+    各列按均值/标准差标准化，缺失值按均值（标准化后为0）填补，全部缺失的样品不入索引。
+    检索在float32矩阵上用NumPy批量计算全部距离后取top-k：特征只有几维，
+    暴力矩阵运算在十万级样品上仍为毫秒级，且比KD树更适合批量查询；
+    来源表版本变化后下次访问时自动重建。
+    """
+
+    def __init__(self, feature_set):
+        if feature_set not in SIMILARITY_FEATURES:
+            raise ValueError(f"Unknown feature set: {feature_set}, expected one of {', '.join(SIMILARITY_FEATURES)}")
+        self.feature_set = feature_set
+        self.table = SIMILARITY_FEATURES[feature_set]["table"]
+        self.columns = tuple(SIMILARITY_FEATURES[feature_set]["columns"])
+        self._snapshot = _SimilaritySnapshot(self.columns)
+        self._lock = threading.Lock()
+
+    @property
+    def samples(self):
+        return self._snapshot.samples
+
+    def is_stale(self):
+        version_key = self._snapshot.version_key
+        return version_key is None or get_version_key((self.table,)) != version_key
+
+    def refresh(self, force=False):
+        """重新从数据库加载特征列并构建索引（未过期且非强制时跳过）"""
+        with self._lock:
+            if not force and not self.is_stale():
+                return
+            version_key = get_version_key((self.table,))
+            start = time.monotonic()
+            columns = ("编号",) + self.columns
+            rows = execute_query(f"SELECT {', '.join(f'[{c}]' for c in columns)} FROM [{self.table}]")
+            sample_ids = [row["编号"] for row in rows]
+            matrix = np.array([[parse_number(row[c]) for c in self.columns] for row in rows], dtype=np.float64)
+            self.build(sample_ids, matrix.reshape(len(rows), len(self.columns)), version_key)
+            logger.info(f"Similarity index '{self.feature_set}' rebuilt with {self.samples} samples from "
+                        f"{len(rows)} rows in {(time.monotonic() - start) * 1000:.1f} ms")
+
+    def build(self, sample_ids, matrix, version_key=None):
+        """由编号列表和对应的原始数值矩阵（NaN表示缺失）构建索引
+
+        Args:
+            sample_ids (list): 每行的样品编号
+            matrix (numpy.ndarray): 形状为(行数, 特征列数)的原始值
+            version_key (str, optional): 数据对应的表版本，refresh据此判断是否过期
+        """
+        keys = [normalize_sample_id(s) for s in sample_ids]
+        labels = {}
+        for key, sample_id in zip(keys, sample_ids):
+            if key:
+                labels.setdefault(key, sample_id)
+        valid_rows = np.array([bool(k) for k in keys], dtype=bool) & ~np.isnan(matrix).all(axis=1)
+        matrix = matrix[valid_rows]
+        keys = [k for k, ok in zip(keys, valid_rows) if ok]
+
+        # 同一样品的多条记录按列取均值（忽略缺失值）
+        unique_keys, codes = np.unique(np.array(keys, dtype=object), return_inverse=True) if keys else ([], np.empty(0, dtype=np.int64))
+        present = ~np.isnan(matrix)
+        filled = np.where(present, matrix, 0.0)
+        raw = np.empty((len(unique_keys), matrix.shape[1]))
+        for j in range(matrix.shape[1]):
+            counts = np.bincount(codes, weights=present[:, j], minlength=len(unique_keys))
+            sums = np.bincount(codes, weights=filled[:, j], minlength=len(unique_keys))
+            with np.errstate(invalid="ignore", divide="ignore"):
+                raw[:, j] = sums / counts
+
+        with np.errstate(invalid="ignore"):
+            mean = np.nanmean(raw, axis=0) if len(raw) else np.zeros(raw.shape[1])
+            scale = np.nanstd(raw, axis=0) if len(raw) else np.ones(raw.shape[1])
+        mean = np.nan_to_num(mean)
+        scale = np.where(np.isnan(scale) | (scale == 0), 1.0, scale)
+        vectors = np.nan_to_num((raw - mean) / scale).astype(np.float32)
+        norms = np.linalg.norm(vectors, axis=1)
+
+        keys = [str(k) for k in unique_keys]
+        # 单个属性赋值是原子的，并发的检索要么看到完整的旧快照，要么看到完整的新快照
+        self._snapshot = _SimilaritySnapshot(
+            self.columns,
+            keys=keys,
+            labels=[labels[k] for k in keys],
+            raw=raw,
+            vectors=np.ascontiguousarray(vectors),
+            square_norms=(norms ** 2).astype(np.float32),
+            units=np.ascontiguousarray(vectors / np.where(norms == 0, 1.0, norms)[:, None]).astype(np.float32),
+            mean=mean,
+            scale=scale,
+            version_key=version_key,
+            built_at=time.time()
+        )
+
+    def _check_metric(self, metric):
+        if metric not in SIMILARITY_METRICS:
+            raise ValueError(f"Invalid metric: {metric}, expected one of {', '.join(SIMILARITY_METRICS)}")
+
+    @staticmethod
+    def _distances(snapshot, positions, metric):
+        """若干样品到全部样品的距离矩阵，形状为(len(positions), 样品数)"""
+        if metric == "cosine":
+            return 1.0 - snapshot.units[positions] @ snapshot.units.T
+        square_norms = snapshot.square_norms
+        queries = snapshot.vectors[positions]
+        distances = square_norms[None, :] - 2.0 * (queries @ snapshot.vectors.T) + square_norms[positions][:, None]
+        return np.sqrt(np.maximum(distances, 0.0))
+
+    def _top_k(self, distances, positions, k):
+        """每行取距离最小的k个（排除查询样品自身），返回(位置矩阵, 距离矩阵)"""
+        distances[np.arange(len(positions)), positions] = np.inf
+        k = min(k, distances.shape[1] - 1)
+        if k <= 0:
+            return np.empty((len(positions), 0), dtype=np.int64), np.empty((len(positions), 0))
+        nearest = np.argpartition(distances, k - 1, axis=1)[:, :k]
+        nearest_distances = np.take_along_axis(distances, nearest, axis=1)
+        order = np.argsort(nearest_distances, axis=1, kind="stable")
+        return np.take_along_axis(nearest, order, axis=1), np.take_along_axis(nearest_distances, order, axis=1)
+
+    def search_many(self, sample_ids, k=10, metric="euclidean"):
+        """批量检索：每个编号最相似的k个样品
+
+        Returns:
+            list: 与sample_ids一一对应，每项为[(位置, 距离), ...]，编号不在索引中时为None
+        """
+        return self._search(self._snapshot, sample_ids, k, metric)
+
+    def _search(self, snapshot, sample_ids, k, metric):
+        self._check_metric(metric)
+        found = [snapshot.positions.get(normalize_sample_id(s)) for s in sample_ids]
+        positions = np.array([p for p in found if p is not None], dtype=np.int64)
+        results = {}
+        block = max(1, BLOCK_ELEMENTS // max(snapshot.samples, 1))
+        for start in range(0, len(positions), block):
+            chunk = positions[start:start + block]
+            nearest, distances = self._top_k(self._distances(snapshot, chunk, metric), chunk, k)
+            for position, row_nearest, row_distances in zip(chunk, nearest, distances):
+                results[int(position)] = list(zip(row_nearest.tolist(), row_distances.tolist()))
+        return [None if p is None else results[p] for p in found]
+
+    def _sample(self, snapshot, position):
+        return {
+            "编号": snapshot.labels[position],
+            "values": {c: _finite_or_none(v) for c, v in zip(self.columns, snapshot.raw[position])}
+        }
+
+    def similar(self, sample_id, k=10, metric="euclidean"):
+        """与某样品成分最相似的k个样品
+
+        Args:
+            sample_id (str): 样品编号
+            k (int): 返回的样品数
+            metric (str): euclidean（标准化后的欧氏距离）或cosine（1 - 余弦相似度）
+
+        Returns:
+            dict | None: {"sample", "features", "metric", "results"}，编号不在索引中时为None
+        """
+        snapshot = self._snapshot
+        neighbours = self._search(snapshot, [sample_id], k, metric)[0]
+        if neighbours is None:
+            return None
+        position = snapshot.positions[normalize_sample_id(sample_id)]
+        sample = self._sample(snapshot, position)
+        sample["missing"] = [c for c, v in sample["values"].items() if v is None]
+        return {
+            "sample": sample,
+            "features": self.feature_set,
+            "metric": metric,
+            "results": [{**self._sample(snapshot, p), "distance": float(d)} for p, d in neighbours]
+        }
+
+    def vectors(self):
+        """标准化后的样品向量：(规范化编号元组, 只读float32矩阵)，两者来自同一快照，行一一对应"""
+        snapshot = self._snapshot
+        return snapshot.keys, snapshot.vectors
+
+    def stats(self):
+        snapshot = self._snapshot
+        return {
+            "features": self.feature_set,
+            "columns": list(self.columns),
+            "samples": snapshot.samples,
+            "built_at": snapshot.built_at,
+            "stale": self.is_stale()
+        }
+
+_indexes = {name: SimilarityIndex(name) for name in SIMILARITY_FEATURES}
+
+def get_similarity_index(feature_set="xrf"):
+    if feature_set not in _indexes:
+        raise ValueError(f"Unknown feature set: {feature_set}, expected one of {', '.join(SIMILARITY_FEATURES)}")
+    return _indexes[feature_set]
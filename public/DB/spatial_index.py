@@ -0,0 +1,265 @@
+import heapq
+import json
+import logging
+import math
+import os
+import threading
+import time
+from table_versions import get_version_key
+
+logger = logging.getLogger(__name__)
+
+# 标本多边形来源（database_export导出）
+GEOJSON_PATH = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "mock-models", "NewRegion3D.json")
+
+# database_export重新导出几何文件后递增该键的版本号
+SPATIAL_VERSION_KEY = "NewRegion3D"
+
+# R树每个节点的最大子节点数
+NODE_CAPACITY = 16
+
+# 每纬度对应的米数，用于把经纬度差换算为近似距离
+METERS_PER_DEGREE = 111320.0
+
+def _ring_bbox(coordinates, bbox=None):
+    if coordinates and isinstance(coordinates[0], (int, float)):
+        x, y = coordinates[0], coordinates[1]
+        if bbox is None:
+            return [x, y, x, y]
+        bbox[0] = min(bbox[0], x)
+        bbox[1] = min(bbox[1], y)
+        bbox[2] = max(bbox[2], x)
+        bbox[3] = max(bbox[3], y)
+        return bbox
+    for c in coordinates:
+        bbox = _ring_bbox(c, bbox)
+    return bbox
+
+def _polygons(geometry):
+    """几何对象中的多边形列表，每个多边形为环列表（第一个为外环）"""
+    if not geometry:
+        return []
+    if geometry.get("type") == "Polygon":
+        return [geometry["coordinates"]]
+    if geometry.get("type") == "MultiPolygon":
+        return geometry["coordinates"]
+    return []
+
+def _point_in_ring(x, y, ring):
+    inside = False
+    j = len(ring) - 1
+    for i in range(len(ring)):
+        xi, yi = ring[i][0], ring[i][1]
+        xj, yj = ring[j][0], ring[j][1]
+        if (yi > y) != (yj > y) and x < (xj - xi) * (y - yi) / (yj - yi) + xi:
+            inside = not inside
+        j = i
+    return inside
+
+def point_in_geometry(x, y, geometry):
+    """点是否在多边形内（在外环内且不在任何内环中）"""
+    for rings in _polygons(geometry):
+        if rings and _point_in_ring(x, y, rings[0]) and not any(_point_in_ring(x, y, hole) for hole in rings[1:]):
+            return True
+    return False
+
+def _segment_distance_sq(px, py, ax, ay, bx, by):
+    dx, dy = bx - ax, by - ay
+    length_sq = dx * dx + dy * dy
+    t = 0.0 if length_sq == 0 else max(0.0, min(1.0, ((px - ax) * dx + (py - ay) * dy) / length_sq))
+    cx, cy = ax + t * dx - px, ay + t * dy - py
+    return cx * cx + cy * cy
+
+def geometry_distance(x, y, geometry, lon_scale):
+    """点到多边形的近似距离（米），点在多边形内时为0"""
+    if point_in_geometry(x, y, geometry):
+        return 0.0
+    px = x * lon_scale
+    best = math.inf
+    for rings in _polygons(geometry):
+        for ring in rings:
+            for i in range(len(ring) - 1):
+                d = _segment_distance_sq(px, y, ring[i][0] * lon_scale, ring[i][1], ring[i + 1][0] * lon_scale, ring[i + 1][1])
+                best = min(best, d)
+    return math.sqrt(best) * METERS_PER_DEGREE if best != math.inf else math.inf
+
+def _bbox_distance_sq(x, y, bbox, lon_scale):
+    dx = max(bbox[0] - x, 0.0, x - bbox[2]) * lon_scale
+    dy = max(bbox[1] - y, 0.0, y - bbox[3])
+    return dx * dx + dy * dy
+
+def _intersects(a, b):
+    return a[0] <= b[2] and a[2] >= b[0] and a[1] <= b[3] and a[3] >= b[1]
+
+def _union(boxes):
+    return [min(b[0] for b in boxes), min(b[1] for b in boxes), max(b[2] for b in boxes), max(b[3] for b in boxes)]
+
+def str_pack(entries, capacity=NODE_CAPACITY):
+    """Sort-Tile-Recursive批量构建R树
+
+    Args:
+        entries (list): (bbox, 数据) 列表
+        capacity (int): 每个节点的最大子节点数
+
+    Returns:
+        tuple | None: 根节点 (bbox, is_leaf, children)
+    """
+    if not entries:
+        return None
+    # 叶子层：每个叶节点包含最多capacity个条目
+    level = _pack_level([(bbox, item) for bbox, item in entries], capacity, leaf=True)
+    while len(level) > 1:
+        level = _pack_level([(node[0], node) for node in level], capacity, leaf=False)
+    return level[0]
+
+def _pack_level(items, capacity, leaf):
+    node_count = math.ceil(len(items) / capacity)
+    slice_count = math.ceil(math.sqrt(node_count))
+    slice_size = slice_count * capacity
+    items = sorted(items, key=lambda e: e[0][0] + e[0][2])
+    nodes = []
+    for s in range(0, len(items), slice_size):
+        vertical = sorted(items[s:s + slice_size], key=lambda e: e[0][1] + e[0][3])
+        for n in range(0, len(vertical), capacity):
+            group = vertical[n:n + capacity]
+            children = group if leaf else [child for _, child in group]
+            nodes.append((_union([bbox for bbox, _ in group]), leaf, children))
+    return nodes
+
+class SpatialIndex:
+    """标本多边形的空间索引
+
+    以各要素的外包矩形构建STR打包的R树，支持矩形范围查询、最近邻和点选；
+    database_export重新导出几何文件（或文件被替换）后下次访问时自动重建。
+    """
+
+    def __init__(self, path=GEOJSON_PATH):
+        self.path = path
+        self._root = None
+        self._features = []
+        self._version_key = None
+        self._file_mtime = None
+        self._built_at = None
+        self._lock = threading.Lock()
+
+    def _current_mtime(self):
+        try:
+            return os.stat(self.path).st_mtime_ns
+        except FileNotFoundError:
+            return None
+
+    def is_stale(self):
+        return (self._version_key is None
+                or get_version_key((SPATIAL_VERSION_KEY,)) != self._version_key
+                or self._current_mtime() != self._file_mtime)
+
+    def refresh(self, force=False):
+        """重新读取几何文件并构建R树（索引未过期且非强制时跳过）"""
+        with self._lock:
+            if not force and not self.is_stale():
+                return
+            version_key = get_version_key((SPATIAL_VERSION_KEY,))
+            mtime = self._current_mtime()
+            start = time.monotonic()
+            with open(self.path, "r", encoding="utf-8") as f:
+                data = json.load(f)
+            features = []
+            entries = []
+            for feature in data.get("features", []):
+                bbox = _ring_bbox(feature.get("geometry", {}).get("coordinates", []))
+                if bbox is None:
+                    continue
+                entry = {"bbox": bbox, "feature": feature}
+                features.append(entry)
+                entries.append((bbox, entry))
+            self._root = str_pack(entries)
+            self._features = features
+            self._version_key = version_key
+            self._file_mtime = mtime
+            self._built_at = time.time()
+            logger.info(f"Spatial index rebuilt from {len(features)} features in "
+                        f"{(time.monotonic() - start) * 1000:.1f} ms")
+
+    def query_bbox(self, bbox, limit=None):
+        """外包矩形与bbox=[minx, miny, maxx, maxy]相交的要素
+
+        Returns:
+            tuple: (条目列表, 是否因limit被截断)
+        """
+        results = []
+        if self._root is None:
+            return results, False
+        stack = [self._root]
+        while stack:
+            node_bbox, leaf, children = stack.pop()
+            if not _intersects(node_bbox, bbox):
+                continue
+            if leaf:
+                for child_bbox, entry in children:
+                    if _intersects(child_bbox, bbox):
+                        if limit is not None and len(results) >= limit:
+                            return results, True
+                        results.append(entry)
+            else:
+                stack.extend(children)
+        return results, False
+
+    def nearest(self, x, y, k=1, max_distance=None):
+        """距离点(x, y)最近的k个要素（按到多边形边界的近似距离，点在多边形内时为0）
+
+        Returns:
+            list: (距离米数, 条目) 列表，由近到远
+        """
+        if self._root is None:
+            return []
+        lon_scale = math.cos(math.radians(y))
+        counter = 0
+        heap = [(0.0, counter, False, self._root)]
+        results = []
+        while heap and len(results) < k:
+            distance_sq, _, is_entry, item = heapq.heappop(heap)
+            if is_entry:
+                distance = distance_sq
+                if max_distance is not None and distance > max_distance:
+                    break
+                results.append((distance, item))
+                continue
+            _, leaf, children = item
+            for child_bbox, child in children if leaf else [(c[0], c) for c in children]:
+                counter += 1
+                if leaf:
+                    # 叶子中的要素按精确距离入堆；外包矩形距离是其下界，保证顺序正确
+                    bound = math.sqrt(_bbox_distance_sq(x, y, child_bbox, lon_scale)) * METERS_PER_DEGREE
+                    if max_distance is not None and bound > max_distance:
+                        continue
+                    exact = geometry_distance(x, y, child["feature"].get("geometry"), lon_scale)
+                    heapq.heappush(heap, (exact, counter, True, child))
+                else:
+                    bound = math.sqrt(_bbox_distance_sq(x, y, child_bbox, lon_scale)) * METERS_PER_DEGREE
+                    heapq.heappush(heap, (bound, counter, False, child))
+        return results
+
+    def pick(self, x, y):
+        """包含点(x, y)的要素（点选）"""
+        candidates, _ = self.query_bbox([x, y, x, y])
+        return [entry for entry in candidates if point_in_geometry(x, y, entry["feature"].get("geometry"))]
+
+    def stats(self):
+        return {
+            "features": len(self._features),
+            "built_at": self._built_at,
+            "stale": self.is_stale()
+        }
+
+def feature_summary(entry, include_geometry=False):
+    """接口返回的要素信息：属性、外包矩形，可选几何"""
+    feature = entry["feature"]
+    summary = {**feature.get("properties", {}), "bbox": entry["bbox"]}
+    if include_geometry:
+        summary["geometry"] = feature.get("geometry")
+    return summary
+
+_index = SpatialIndex()
+
+def get_spatial_index():
+    return _index
@@ -0,0 +1,148 @@
+import contextlib
+import json
+import logging
+import os
+import re
+import threading
+import time
+
+try:
+    import fcntl
+except ImportError:  # Windows
+    fcntl = None
+    import msvcrt
+
+logger = logging.getLogger(__name__)
+
+# 数据表版本号文件：导入/更新工具写入，API服务读取，用于跨进程判断缓存是否失效
+VERSION_FILE = os.path.join(os.path.dirname(os.path.abspath(__file__)), "table_versions.json")
+
+# 递增版本号时持有的跨进程锁文件（API服务、导入和导出工具可能同时递增）
+LOCK_FILE = VERSION_FILE + ".lock"
+
+# 两次检查版本文件是否变化的最小间隔（秒）
+CHECK_INTERVAL = 1.0
+
+# 表名未知时使用的通配键，递增它会让所有缓存失效
+ALL_TABLES = "*"
+
+_lock = threading.Lock()
+_versions = {}
+_versions_mtime = None
+_last_check = 0.0
+_listeners = []
+
+_STATEMENT_TABLE_RE = re.compile(
+    r"\b(?:INSERT\s+INTO|UPDATE|DELETE\s+FROM|MERGE\s+INTO|MERGE|TRUNCATE\s+TABLE|DROP\s+TABLE|ALTER\s+TABLE)\s+"
+    r"(?:\[?dbo\]?\.)?\[?([^\s\[\]()]+)\]?",
+    re.IGNORECASE
+)
+
+def tables_in_statement(query):
+    """从写操作SQL语句中提取被修改的表名，无法识别时返回[ALL_TABLES]"""
+    tables = []
+    for name in _STATEMENT_TABLE_RE.findall(query):
+        if name not in tables:
+            tables.append(name)
+    return tables or [ALL_TABLES]
+
+def _read_file():
+    try:
+        with open(VERSION_FILE, "r", encoding="utf-8") as f:
+            return json.load(f)
+    except FileNotFoundError:
+        return {}
+    except (OSError, ValueError) as e:
+        logger.warning(f"Failed to read table versions: {str(e)}")
+        return {}
+
+def _file_mtime():
+    try:
+        return os.stat(VERSION_FILE).st_mtime_ns
+    except FileNotFoundError:
+        return None
+
+def get_table_versions(force=False):
+    """获取所有表的版本号（按CHECK_INTERVAL节流检查文件变化）"""
+    global _versions, _versions_mtime, _last_check
+    with _lock:
+        now = time.monotonic()
+        if force or now - _last_check >= CHECK_INTERVAL:
+            _last_check = now
+            mtime = _file_mtime()
+            if mtime != _versions_mtime:
+                _versions = _read_file()
+                _versions_mtime = mtime
+        return dict(_versions)
+
+def get_version_key(tables):
+    """返回一组表的版本快照，任一表（或ALL_TABLES）变化时快照不同"""
+    versions = get_table_versions()
+    return tuple(versions.get(t, 0) for t in tuple(tables) + (ALL_TABLES,))
+
+@contextlib.contextmanager
+def _process_lock():
+    """跨进程的排他锁：POSIX用flock，Windows用msvcrt.locking锁定锁文件的第一个字节"""
+    with open(LOCK_FILE, "a+b") as f:
+        if fcntl is not None:
+            fcntl.flock(f.fileno(), fcntl.LOCK_EX)
+        else:
+            f.seek(0)
+            while True:
+                try:
+                    # LK_LOCK重试10次（约10秒）后仍失败才抛出，继续等待
+                    msvcrt.locking(f.fileno(), msvcrt.LK_LOCK, 1)
+                    break
+                except OSError:
+                    continue
+        try:
+            yield
+        finally:
+            if fcntl is not None:
+                fcntl.flock(f.fileno(), fcntl.LOCK_UN)
+            else:
+                f.seek(0)
+                msvcrt.locking(f.fileno(), msvcrt.LK_UNLCK, 1)
+
+def bump_table_versions(tables):
+    """递增指定表的版本号并通知本进程内的监听器
+
+    Args:
+        tables (iterable): 发生变化的表名，包含ALL_TABLES时表示全部表
+    """
+    global _versions, _versions_mtime, _last_check
+    tables = [t for t in dict.fromkeys(tables) if t]
+    if not tables:
+        return
+    # 进程内锁之外再持有跨进程锁，保证"读取-递增-替换"不会与其他进程交错而丢失递增
+    with _lock, _process_lock():
+        versions = _read_file()
+        for table in tables:
+            versions[table] = versions.get(table, 0) + 1
+        # 写临时文件后原子替换，避免读取方看到半个文件
+        temp_path = f"{VERSION_FILE}.{os.getpid()}.tmp"
+        with open(temp_path, "w", encoding="utf-8") as f:
+            json.dump(versions, f, ensure_ascii=False)
+        os.replace(temp_path, VERSION_FILE)
+        _versions = versions
+        _versions_mtime = _file_mtime()
+        _last_check = time.monotonic()
+        listeners = list(_listeners)
+    logger.debug(f"Bumped table versions: {tables}")
+    for listener in listeners:
+        try:
+            listener(set(tables))
+        except Exception as e:
+            logger.error(f"Table change listener failed: {str(e)}")
+
+def add_change_listener(listener):
+    """注册本进程内的表变化回调，参数为发生变化的表名集合"""
+    with _lock:
+        _listeners.append(listener)
+
+if __name__ == "__main__":
+    import sys
+    # 手工修改数据库（如在SSMS中编辑）后运行：python table_versions.py 表名 ...，不带参数时使全部表失效
+    logging.basicConfig(level=logging.INFO)
+    bump_table_versions(sys.argv[1:] or [ALL_TABLES])
+    print(json.dumps(get_table_versions(force=True), ensure_ascii=False, indent=2))
@@ -0,0 +1,233 @@
+import asyncio
+import hashlib
+import io
+import logging
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from PIL import Image, UnidentifiedImageError
+from db_config import execute_query, run_in_db_executor
+from media import get_media_info, read_media_blob
+
+logger = logging.getLogger(__name__)
+
+# 缩略图配置
+THUMBNAIL_CONFIG = {
+    "cache_dir": os.path.join(os.path.dirname(os.path.abspath(__file__)), "thumbnail_cache"),
+    "size": (320, 320),                    # 最大宽高，保持原始比例
+    "format": "WEBP",                      # 输出格式，WEBP体积最小；也可用JPEG
+    "quality": 80,
+    "max_cache_bytes": 200 * 1024 * 1024,  # 缓存目录上限，超出时按最近访问时间淘汰
+    "rescan_interval": 600.0,              # 重新扫描目录校正缓存大小的间隔秒数（其他进程也可能写入）
+    "workers": 2                           # 解码/缩放图片的线程数，与数据库查询线程分开
+}
+
+THUMBNAIL_CONTENT_TYPES = {
+    "WEBP": "image/webp",
+    "JPEG": "image/jpeg",
+    "PNG": "image/png"
+}
+
+IMAGE_MEDIA_TYPES = ("png", "jpg", "jpeg", "bmp", "gif", "tif", "tiff", "webp")
+
+class NotAnImageError(Exception):
+    """多媒体文件不是可以生成缩略图的图片"""
+    pass
+
+class ImageTooLargeError(NotAnImageError):
+    """图片像素数超过Pillow的解压炸弹上限，拒绝解码"""
+    pass
+
+_evict_lock = threading.Lock()
+
+# 本进程估计的缓存目录大小：None表示尚未扫描；新增缩略图时累加，超过上限或到期时重新扫描
+_cache_bytes = None
+_last_scan = 0.0
+
+_image_executor = None
+_image_executor_lock = threading.Lock()
+
+def get_image_executor():
+    """解码和缩放图片的线程池，图片处理不占用数据库查询线程和排队名额"""
+    global _image_executor
+    if _image_executor is None:
+        with _image_executor_lock:
+            if _image_executor is None:
+                _image_executor = ThreadPoolExecutor(
+                    max_workers=THUMBNAIL_CONFIG["workers"],
+                    thread_name_prefix="thumbnail"
+                )
+    return _image_executor
+
+def shutdown_image_executor():
+    global _image_executor
+    with _image_executor_lock:
+        if _image_executor is not None:
+            _image_executor.shutdown(wait=True)
+            _image_executor = None
+
+def thumbnail_key(content_hash):
+    """缩略图的内容寻址键：原图哈希 + 缩略图参数"""
+    size = THUMBNAIL_CONFIG["size"]
+    spec = f"{content_hash}:{size[0]}x{size[1]}:{THUMBNAIL_CONFIG['format']}:{THUMBNAIL_CONFIG['quality']}"
+    return hashlib.sha256(spec.encode("utf-8")).hexdigest()
+
+def thumbnail_path(key):
+    extension = THUMBNAIL_CONFIG["format"].lower()
+    return os.path.join(THUMBNAIL_CONFIG["cache_dir"], key[:2], f"{key}.{extension}")
+
+def thumbnail_content_type():
+    return THUMBNAIL_CONTENT_TYPES.get(THUMBNAIL_CONFIG["format"], "application/octet-stream")
+
+def render_thumbnail(data):
+    """将原图字节生成缩略图字节"""
+    try:
+        with Image.open(io.BytesIO(data)) as image:
+            image.thumbnail(THUMBNAIL_CONFIG["size"], Image.LANCZOS)
+            if THUMBNAIL_CONFIG["format"] == "JPEG" and image.mode not in ("RGB", "L"):
+                image = image.convert("RGB")
+            output = io.BytesIO()
+            image.save(output, THUMBNAIL_CONFIG["format"], quality=THUMBNAIL_CONFIG["quality"])
+            return output.getvalue()
+    except Image.DecompressionBombError as e:
+        raise ImageTooLargeError(str(e))
+    except (UnidentifiedImageError, OSError) as e:
+        raise NotAnImageError(str(e))
+
+def find_thumbnail(media_id):
+    """查询多媒体文件并定位其缩略图（数据库部分）
+
+    Returns:
+        tuple | None: (缩略图文件路径, 缓存键, 是否已缓存)，多媒体文件不存在时返回None
+    """
+    info = get_media_info(media_id)
+    if not info or not info.get("文件大小"):
+        return None
+    media_type = (info.get("媒体类型") or "").strip().lower()
+    if media_type and media_type not in IMAGE_MEDIA_TYPES:
+        raise NotAnImageError(f"Media {media_id} has type {media_type}")
+
+    key = thumbnail_key(info["哈希"])
+    path = thumbnail_path(key)
+    if os.path.exists(path):
+        # 更新访问时间，供淘汰时参考
+        try:
+            os.utime(path)
+            return path, key, True
+        except FileNotFoundError:
+            pass  # 刚好被淘汰，重新生成
+    return path, key, False
+
+def store_thumbnail(media_id, data, path):
+    """由原图字节生成缩略图并写入缓存（图片处理部分）"""
+    thumbnail = render_thumbnail(data)
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    # 先写临时文件再原子替换，避免并发请求读到半个文件
+    temp_path = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+    with open(temp_path, "wb") as f:
+        f.write(thumbnail)
+    os.replace(temp_path, path)
+    logger.debug(f"Generated thumbnail for media {media_id}: {len(data)} -> {len(thumbnail)} bytes")
+    _record_thumbnail(len(thumbnail))
+
+def get_or_create_thumbnail(media_id):
+    """获取多媒体文件的缩略图，不存在时生成并写入缓存
+
+    Returns:
+        tuple | None: (缩略图文件路径, 缓存键)，多媒体文件不存在时返回None
+    """
+    found = find_thumbnail(media_id)
+    if found is None:
+        return None
+    path, key, cached = found
+    if not cached:
+        store_thumbnail(media_id, read_media_blob(media_id), path)
+    return path, key
+
+async def get_or_create_thumbnail_async(media_id):
+    """get_or_create_thumbnail的异步版本：数据库读取走查询线程池，解码缩放走图片线程池"""
+    found = await run_in_db_executor(find_thumbnail, media_id)
+    if found is None:
+        return None
+    path, key, cached = found
+    if not cached:
+        data = await run_in_db_executor(read_media_blob, media_id)
+        loop = asyncio.get_running_loop()
+        await loop.run_in_executor(get_image_executor(), store_thumbnail, media_id, data, path)
+    return path, key
+
+def _record_thumbnail(size):
+    """累加新缩略图的大小，估计值超过上限或距上次扫描超过rescan_interval时执行淘汰"""
+    global _cache_bytes
+    with _evict_lock:
+        if _cache_bytes is not None:
+            _cache_bytes += size
+        due = (_cache_bytes is None
+               or _cache_bytes > THUMBNAIL_CONFIG["max_cache_bytes"]
+               or time.monotonic() - _last_scan >= THUMBNAIL_CONFIG["rescan_interval"])
+    if due:
+        evict_thumbnails()
+
+def evict_thumbnails(max_bytes=None):
+    """扫描缓存目录，超过上限时按最近访问时间删除最旧的缩略图，并校正缓存大小估计"""
+    global _cache_bytes, _last_scan
+    if max_bytes is None:
+        max_bytes = THUMBNAIL_CONFIG["max_cache_bytes"]
+    cache_dir = THUMBNAIL_CONFIG["cache_dir"]
+    with _evict_lock:
+        _last_scan = time.monotonic()
+        entries = []
+        total = 0
+        for root, _, files in os.walk(cache_dir):
+            for name in files:
+                if name.endswith(".tmp"):
+                    continue
+                path = os.path.join(root, name)
+                try:
+                    stat = os.stat(path)
+                except FileNotFoundError:
+                    continue
+                entries.append((stat.st_mtime, stat.st_size, path))
+                total += stat.st_size
+        _cache_bytes = total
+        if total <= max_bytes:
+            return 0
+
+        removed = 0
+        for _, size, path in sorted(entries):
+            if total <= max_bytes:
+                break
+            try:
+                os.remove(path)
+            except FileNotFoundError:
+                pass
+            total -= size
+            removed += 1
+        _cache_bytes = total
+        logger.info(f"Evicted {removed} thumbnails, cache size now {total} bytes")
+        return removed
+
+def generate_thumbnails(related_type=None):
+    """为所有图片类多媒体文件预生成缩略图（导入数据后执行）"""
+    query = "SELECT [ID] FROM [多媒体文件] WHERE [文件] IS NOT NULL"
+    params = None
+    if related_type:
+        query += " AND [关联类型] = ?"
+        params = (related_type,)
+    generated = 0
+    skipped = 0
+    for row in execute_query(query, params):
+        try:
+            if get_or_create_thumbnail(row["ID"]):
+                generated += 1
+        except NotAnImageError:
+            skipped += 1
+        except Exception as e:
+            logger.error(f"Error generating thumbnail for media {row['ID']}: {str(e)}")
+            skipped += 1
+    print(f"缩略图生成完成：{generated} 个成功，{skipped} 个跳过")
+    return generated
+
+if __name__ == "__main__":
+    generate_thumbnails()
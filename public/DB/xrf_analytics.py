@@ -0,0 +1,278 @@
+import logging
+import threading
+import time
+import numpy as np
+from db_config import execute_query
+from table_versions import get_version_key
+
+logger = logging.getLogger(__name__)
+
+XRF_TABLES = ("XRF测试结果",)
+
+# 参与统计的元素列
+XRF_ELEMENTS = ("Si", "Mg", "Al", "K", "Ca", "Fe", "Ba")
+
+# 可以作为分组依据的列
+XRF_GROUP_COLUMNS = ("层位", "野外定名")
+
+# 分组统计支持的统计量
+XRF_STATS = ("count", "mean", "std", "min", "max", "median")
+
+DEFAULT_PERCENTILES = (5, 25, 50, 75, 95)
+
+def _to_float(value):
+    try:
+        return float(value)
+    except (TypeError, ValueError):
+        return np.nan
+
+def _finite_list(values):
+    """numpy数组转为列表，NaN转为None（JSON不支持NaN）"""
+    return [None if np.isnan(v) else float(v) for v in values]
+
+def _average_ranks(values):
+    """秩（并列值取平均秩），用于Spearman相关"""
+    _, inverse, counts = np.unique(values, return_inverse=True, return_counts=True)
+    average = np.cumsum(counts) - (counts - 1) / 2.0
+    return average[inverse]
+
+def _read_only(array):
+    array.flags.writeable = False
+    return array
+
+class _XrfSnapshot:
+    """一次加载的全部数据，构建后不再修改
+
+    refresh整体替换XrfStore._snapshot这一个属性；查询开始时取一次引用，
+    此后即使发生重建，读到的数组、分组编码和编号也始终属于同一版本。
+    """
+
+    def __init__(self, values=None, groups=None, sample_ids=(), version_key=None, built_at=None):
+        self.values = values or {}
+        self.groups = groups or {}
+        self.sample_ids = tuple(sample_ids)
+        self.version_key = version_key
+        self.built_at = built_at
+
+    @property
+    def rows(self):
+        return len(self.sample_ids)
+
+class XrfStore:
+    """XRF测试结果的列式内存存储
+
+    每个元素一列float64数组（缺失或无法解析的值为NaN），分组列预先编码为整数，
+    分组统计、直方图、百分位和相关矩阵都在数组上向量化计算；
+    XRF测试结果表版本变化（重新导入）后下次访问时自动重建。
+    """
+
+    def __init__(self):
+        self._snapshot = _XrfSnapshot()
+        self._lock = threading.Lock()
+
+    @property
+    def rows(self):
+        return self._snapshot.rows
+
+    def is_stale(self):
+        version_key = self._snapshot.version_key
+        return version_key is None or get_version_key(XRF_TABLES) != version_key
+
+    def refresh(self, force=False):
+        """重新从数据库加载XRF测试结果（未过期且非强制时跳过）"""
+        with self._lock:
+            if not force and not self.is_stale():
+                return
+            version_key = get_version_key(XRF_TABLES)
+            start = time.monotonic()
+            columns = ("编号",) + XRF_GROUP_COLUMNS + XRF_ELEMENTS
+            rows = execute_query(f"SELECT {', '.join(f'[{c}]' for c in columns)} FROM [XRF测试结果]")
+
+            values = {
+                element: _read_only(
+                    np.fromiter((_to_float(row[element]) for row in rows), dtype=np.float64, count=len(rows))
+                )
+                for element in XRF_ELEMENTS
+            }
+            groups = {}
+            for column in XRF_GROUP_COLUMNS:
+                labels = np.array(["" if row[column] is None else str(row[column]).strip() for row in rows], dtype=object)
+                names, codes = np.unique(labels, return_inverse=True) if len(rows) else (np.array([], dtype=object), np.array([], dtype=np.int64))
+                groups[column] = (_read_only(names), _read_only(codes))
+
+            # 单个属性赋值是原子的，并发的查询要么看到完整的旧快照，要么看到完整的新快照
+            self._snapshot = _XrfSnapshot(values, groups, (row["编号"] for row in rows), version_key, time.time())
+            logger.info(f"XRF store rebuilt from {len(rows)} rows in {(time.monotonic() - start) * 1000:.1f} ms")
+
+    def _check_elements(self, elements):
+        elements = list(elements or XRF_ELEMENTS)
+        unknown = [e for e in elements if e not in XRF_ELEMENTS]
+        if unknown:
+            raise ValueError(f"Unknown elements: {', '.join(unknown)}")
+        return elements
+
+    def _check_group_by(self, group_by):
+        if group_by not in XRF_GROUP_COLUMNS:
+            raise ValueError(f"Invalid group_by: {group_by}, expected one of {', '.join(XRF_GROUP_COLUMNS)}")
+
+    def _mask(self, snapshot, group_by=None, group=None):
+        """按分组取值筛选行，未指定时为全部行"""
+        if group_by is None or group is None:
+            return None
+        self._check_group_by(group_by)
+        names, codes = snapshot.groups[group_by]
+        index = np.searchsorted(names, group)
+        if index >= len(names) or names[index] != group:
+            return np.zeros(snapshot.rows, dtype=bool)
+        return codes == index
+
+    def group_stats(self, group_by, elements=None, stats=XRF_STATS):
+        """按层位或野外定名分组计算各元素的统计量
+
+        Returns:
+            list: 每组一项 {group, rows, 元素: {统计量: 值}}，按组名排序
+        """
+        self._check_group_by(group_by)
+        elements = self._check_elements(elements)
+        unknown = [s for s in stats if s not in XRF_STATS]
+        if unknown:
+            raise ValueError(f"Unknown stats: {', '.join(unknown)}")
+        snapshot = self._snapshot
+        names, codes = snapshot.groups[group_by]
+        group_count = len(names)
+        rows_per_group = np.bincount(codes, minlength=group_count)
+        # 按分组排序后每组是一段连续区间，min/max/median在区间上计算
+        order = np.argsort(codes, kind="stable")
+        bounds = np.concatenate(([0], np.cumsum(rows_per_group)))
+
+        results = [{"group": str(name), "rows": int(n)} for name, n in zip(names, rows_per_group)]
+        for element in elements:
+            values = snapshot.values[element]
+            valid = ~np.isnan(values)
+            count = np.bincount(codes, weights=valid, minlength=group_count)
+            total = np.bincount(codes, weights=np.where(valid, values, 0.0), minlength=group_count)
+            with np.errstate(invalid="ignore", divide="ignore"):
+                mean = total / count
+                square = np.bincount(codes, weights=np.where(valid, values, 0.0) ** 2, minlength=group_count)
+                variance = np.maximum(square / count - mean ** 2, 0.0) * count / (count - 1)
+            computed = {"count": count, "mean": mean, "std": np.sqrt(variance)}
+            if {"min", "max", "median"} & set(stats):
+                sorted_values = values[order]
+                minimum = np.full(group_count, np.nan)
+                maximum = np.full(group_count, np.nan)
+                median = np.full(group_count, np.nan)
+                for i in range(group_count):
+                    segment = sorted_values[bounds[i]:bounds[i + 1]]
+                    segment = segment[~np.isnan(segment)]
+                    if segment.size:
+                        minimum[i] = segment.min()
+                        maximum[i] = segment.max()
+                        median[i] = np.median(segment)
+                computed.update({"min": minimum, "max": maximum, "median": median})
+            for i, result in enumerate(results):
+                result[element] = {
+                    stat: (int(computed[stat][i]) if stat == "count" else _finite_list([computed[stat][i]])[0])
+                    for stat in stats
+                }
+        return results
+
+    def histogram(self, element, bins=20, value_range=None, group_by=None, group=None):
+        """单个元素的直方图
+
+        Returns:
+            dict: {element, edges, counts, missing}
+        """
+        element = self._check_elements([element])[0]
+        snapshot = self._snapshot
+        values = snapshot.values[element]
+        mask = self._mask(snapshot, group_by, group)
+        if mask is not None:
+            values = values[mask]
+        valid = values[~np.isnan(values)]
+        if valid.size == 0:
+            return {"element": element, "edges": [], "counts": [], "missing": int(values.size)}
+        counts, edges = np.histogram(valid, bins=bins, range=value_range)
+        return {
+            "element": element,
+            "edges": edges.tolist(),
+            "counts": counts.tolist(),
+            "missing": int(values.size - valid.size)
+        }
+
+    def percentiles(self, element, q=DEFAULT_PERCENTILES, group_by=None):
+        """单个元素的百分位数，指定group_by时按组分别计算
+
+        Returns:
+            dict: {element, q, overall, groups}
+        """
+        element = self._check_elements([element])[0]
+        q = [float(p) for p in q]
+        if any(p < 0 or p > 100 for p in q):
+            raise ValueError("Percentiles must be between 0 and 100")
+        snapshot = self._snapshot
+        values = snapshot.values[element]
+
+        def compute(subset):
+            subset = subset[~np.isnan(subset)]
+            if subset.size == 0:
+                return [None] * len(q)
+            return _finite_list(np.percentile(subset, q))
+
+        result = {"element": element, "q": q, "overall": compute(values), "groups": None}
+        if group_by is not None:
+            self._check_group_by(group_by)
+            names, codes = snapshot.groups[group_by]
+            order = np.argsort(codes, kind="stable")
+            bounds = np.concatenate(([0], np.cumsum(np.bincount(codes, minlength=len(names)))))
+            sorted_values = values[order]
+            result["groups"] = {
+                str(name): compute(sorted_values[bounds[i]:bounds[i + 1]])
+                for i, name in enumerate(names)
+            }
+        return result
+
+    def correlation(self, elements=None, method="pearson", group_by=None, group=None):
+        """元素间的相关系数矩阵，只使用所选元素全部有值的行
+
+        Args:
+            method (str): pearson或spearman（按秩计算）
+
+        Returns:
+            dict: {elements, method, n, matrix}
+        """
+        elements = self._check_elements(elements)
+        if method not in ("pearson", "spearman"):
+            raise ValueError(f"Invalid method: {method}, expected pearson or spearman")
+        snapshot = self._snapshot
+        matrix = np.vstack([snapshot.values[e] for e in elements]) if elements else np.empty((0, 0))
+        mask = self._mask(snapshot, group_by, group)
+        if mask is not None:
+            matrix = matrix[:, mask]
+        matrix = matrix[:, ~np.isnan(matrix).any(axis=0)]
+        n = matrix.shape[1]
+        if n < 2:
+            return {"elements": elements, "method": method, "n": n, "matrix": None}
+        if method == "spearman":
+            matrix = np.vstack([_average_ranks(row) for row in matrix])
+        with np.errstate(invalid="ignore", divide="ignore"):
+            corr = np.corrcoef(matrix)
+        corr = np.atleast_2d(corr)
+        return {
+            "elements": elements,
+            "method": method,
+            "n": int(n),
+            "matrix": [_finite_list(row) for row in corr]
+        }
+
+    def stats(self):
+        snapshot = self._snapshot
+        return {
+            "rows": snapshot.rows,
+            "built_at": snapshot.built_at,
+            "stale": self.is_stale()
+        }
+
+_store = XrfStore()
+
+def get_xrf_store():
+    return _store
@@ -60,6 +60,20 @@ export const getRelations = async (entityId) => {
     }
 };
 
+//多跳关联：一次返回depth跳以内的 { root, nodes, edges, truncated }
+export const getRelationGraph = async (entityId, { depth = 2, maxNodes = 500, minStrength = null, relationType = null } = {}) => {
+    try {
+        const params = { depth, max_nodes: maxNodes };
+        if (minStrength !== null) params.min_strength = minStrength;
+        if (relationType) params.relation_type = relationType;
+        const response = await api.get(`/relation-graph/${entityId}`, { params });
+        return response.data;
+    } catch (error) {
+        console.error('Error fetching relation graph:', error);
+        throw error;
+    }
+};
+
 //岩石样品-基本信息
 export const getRockSampleDetails = async (sampleId) => {
     try {
@@ -93,6 +107,19 @@ export const getXRFTestResults = async (sampleId) => {
     }
 };
 
+//标本汇总：一次获取基本信息、薄片鉴定、XRF测试和关联关系
+//返回 { id, sections: { sample, thin_section, xrf, relations } }，每部分为 { status, data, detail }
+export const getSpecimenBundle = async (sampleId, sections = null) => {
+    try {
+        const params = sections ? { sections: sections.join(',') } : {};
+        const response = await api.get(`/specimen/${sampleId}`, { params });
+        return response.data;
+    } catch (error) {
+        console.error('Error fetching specimen bundle:', error);
+        throw error;
+    }
+};
+
 //三维模型数据
 export const get3DModels = async () => {
     try {
@@ -158,6 +185,21 @@ export const rockSampleApi = {
     }
   },
 
+  // 分页获取岩石标本列表：返回 { items, total, limit, has_more, next_cursor }
+  // 传入上一页的 next_cursor 获取下一页，fields 为需要的字段数组
+  getRockSamplesPage: async (filters = {}, { cursor = null, limit = 50, fields = null } = {}) => {
+    try {
+      const params = { ...filters, limit };
+      if (cursor) params.cursor = cursor;
+      if (fields) params.fields = fields.join(',');
+      const response = await api.get('/rock-samples', { params });
+      return response.data;
+    } catch (error) {
+      console.error('Error fetching rock samples page:', error);
+      throw error;
+    }
+  },
+
   // 获取过滤选项
   getFilterOptions: async () => {
     try {